@@ -0,0 +1,211 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Health-aware load balancing of requests across Sproxyd endpoints.
+"""
+
+import logging
+import threading
+import time
+
+import scality_sproxyd_client.exceptions
+from scality_sproxyd_client import sproxyd_client
+
+from scality_glance_store import concurrency
+
+
+LOG = logging.getLogger(__name__)
+
+
+class EndpointStats(object):
+    """What the balancer knows about an endpoint."""
+
+    def __init__(self):
+        # Exponentially weighted moving average of the time to get a
+        # response, in seconds. None until the first response.
+        self.latency = None
+        # Requests waiting for a response
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.quarantined = False
+
+    def score(self):
+        """The lower, the better."""
+        return (self.latency or 0.0) * (self.in_flight + 1)
+
+
+class Balancer(object):
+    """
+    Pick the least loaded endpoint for each request.
+
+    The load of an endpoint is its average latency times the number of
+    requests it is serving. After `max_failures` consecutive failures, an
+    endpoint is taken out of rotation until `probe(endpoint)`, called every
+    `probe_interval` seconds from a background worker, returns True.
+    """
+
+    def __init__(self, endpoints, probe, alpha=0.2, max_failures=3,
+                 probe_interval=5.0):
+        self._endpoints = sorted(endpoints)
+        self._probe = probe
+        self._alpha = alpha
+        self._max_failures = max_failures
+        self._probe_interval = probe_interval
+
+        self._stats = dict((endpoint, EndpointStats())
+                           for endpoint in self._endpoints)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def stats(self, endpoint):
+        return self._stats[endpoint]
+
+    def choose(self, candidates):
+        """
+        Choose an endpoint among `candidates`, ignoring the endpoints out of
+        rotation unless they all are. Ties are broken round-robin.
+
+        :raises StopIteration: if there's no candidate
+        """
+        with self._lock:
+            healthy = [endpoint for endpoint in self._endpoints
+                       if endpoint in candidates and
+                       not self._stats[endpoint].quarantined]
+            if not healthy:
+                healthy = [endpoint for endpoint in self._endpoints
+                           if endpoint in candidates]
+            if not healthy:
+                raise StopIteration()
+
+            self._next = (self._next + 1) % len(healthy)
+            rotated = healthy[self._next:] + healthy[:self._next]
+            return min(rotated, key=lambda e: self._stats[e].score())
+
+    def started(self, endpoint):
+        """Record that a request is sent to `endpoint`."""
+        with self._lock:
+            self._stats[endpoint].in_flight += 1
+
+    def finished(self, endpoint, elapsed, failed):
+        """
+        Record the outcome of a request to `endpoint`, which took `elapsed`
+        seconds.
+        """
+        quarantine = False
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats.in_flight -= 1
+            if stats.latency is None:
+                stats.latency = elapsed
+            else:
+                stats.latency += self._alpha * (elapsed - stats.latency)
+
+            if not failed:
+                stats.consecutive_failures = 0
+                return
+
+            stats.consecutive_failures += 1
+            if (stats.consecutive_failures >= self._max_failures and
+                    not stats.quarantined):
+                stats.quarantined = quarantine = True
+
+        if quarantine:
+            LOG.warning("Sproxyd endpoint %s failed %d times in a row, "
+                        "taking it out of rotation", endpoint.geturl(),
+                        self._max_failures)
+            concurrency.spawn(self._probe_until_healthy, endpoint)
+
+    def _probe_until_healthy(self, endpoint):
+        while True:
+            time.sleep(self._probe_interval)
+            try:
+                healthy = self._probe(endpoint)
+            except Exception:
+                LOG.exception("Unexpected exception while probing Sproxyd "
+                              "endpoint %s", endpoint.geturl())
+                healthy = False
+
+            if healthy:
+                break
+
+        LOG.info("Sproxyd endpoint %s is healthy again, putting it back in "
+                 "rotation", endpoint.geturl())
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats.quarantined = False
+            stats.consecutive_failures = 0
+
+
+def _is_endpoint_failure(exc):
+    """Whether `exc` tells something is wrong with the endpoint itself."""
+    if isinstance(exc, scality_sproxyd_client.exceptions.SproxydHTTPException):
+        return exc.http_status >= 500
+    return True
+
+
+class BalancedSproxydClient(sproxyd_client.SproxydClient):
+    """
+    A `SproxydClient` sending each request to the least loaded of its alive
+    endpoints, as chosen by a `Balancer`, instead of round-robin.
+    """
+
+    def __init__(self, endpoints, *args, **kwargs):
+        super(BalancedSproxydClient, self).__init__(endpoints, *args,
+                                                    **kwargs)
+        self._balancer = Balancer(self._endpoints, self._probe)
+        self._local = threading.local()
+
+    def _probe(self, endpoint):
+        return self._ping('%s/.conf' % endpoint.geturl().rstrip('/'))
+
+    def get_next_endpoint(self):
+        return self.get_endpoint_among(self._alive)
+
+    def get_endpoint_among(self, candidates):
+        """Same as `get_next_endpoint`, choosing among `candidates`."""
+        endpoint = self._balancer.choose(candidates)
+        if getattr(self._local, 'tracking', False):
+            self._local.endpoint = endpoint
+            self._balancer.started(endpoint)
+        return endpoint
+
+    def _tracked(self, func, *args, **kwargs):
+        """Call `func`, recording the outcome of its request."""
+        self._local.tracking = True
+        self._local.endpoint = None
+        start = time.time()
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            failed = _is_endpoint_failure(exc)
+            raise
+        finally:
+            endpoint = self._local.endpoint
+            self._local.tracking = False
+            self._local.endpoint = None
+            if endpoint is not None:
+                self._balancer.finished(endpoint, time.time() - start,
+                                        failed)
+
+    def _do_http(self, *args, **kwargs):
+        return self._tracked(
+            super(BalancedSproxydClient, self)._do_http, *args, **kwargs)
+
+    def get_http_conn_for_put(self, *args, **kwargs):
+        return self._tracked(
+            super(BalancedSproxydClient, self).get_http_conn_for_put,
+            *args, **kwargs)
@@ -0,0 +1,246 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Caches used by the Scality store.
+"""
+
+import errno
+import heapq
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+
+class ImageCache(object):
+    """
+    Read-through cache of images in a local directory.
+
+    Images are stored in files named after their image id. A file is only
+    renamed to its final name once the full image has been written, so the
+    directory can be shared by several glance-api processes. The modification
+    time of the files tracks their last access, and the least recently used
+    images are evicted to keep the total size of the cache under `max_size`
+    bytes. Images are never modified once stored in the Ring, so nothing but
+    their deletion invalidates a cached image.
+
+    Images being written count against `max_size` too. Temporary files not
+    written to for `STALE_TMP_AGE` seconds are left by fills which were
+    interrupted (e.g. by a crash), and are deleted when the cache is opened
+    and on evictions.
+    """
+
+    TMP_PREFIX = '.tmp-'
+    STALE_TMP_AGE = 3600
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+        try:
+            os.makedirs(directory)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+        self.evict()
+
+    def _get_path(self, image_id):
+        return os.path.join(self.directory, image_id)
+
+    def open(self, image_id, offset=0, length=None, chunk_size=64 * 1024):
+        """
+        Get an iterator over the cached bytes of `image_id`, starting at
+        `offset` and limited to `length` bytes if it's not None, and the
+        number of bytes it will yield.
+
+        :retval tuple or None if the image isn't in the cache
+        """
+        path = self._get_path(image_id)
+        try:
+            fp = open(path, 'rb')
+        except IOError as exc:
+            if exc.errno == errno.ENOENT:
+                return None
+            raise
+
+        try:
+            # Record the access, for LRU eviction
+            os.utime(path, None)
+            size = os.fstat(fp.fileno()).st_size
+            start = min(offset, size)
+            stop = size if length is None else min(start + length, size)
+            mapping = mmap.mmap(fp.fileno(), 0,
+                                access=mmap.ACCESS_READ) if size else None
+        except Exception:
+            fp.close()
+            raise
+
+        def read():
+            try:
+                for position in xrange(start, stop, chunk_size):
+                    yield mapping[position:min(position + chunk_size, stop)]
+            finally:
+                if mapping is not None:
+                    mapping.close()
+                fp.close()
+
+        LOG.debug("Serving image %s from the cache", image_id)
+        return read(), stop - start
+
+    def fill(self, image_id, chunks, size):
+        """
+        Yield the chunks yielded by `chunks`, writing them in the cache as a
+        side effect. The image is only added to the cache once all of its
+        `size` bytes went through.
+        """
+        if size > self.max_size:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                        prefix=self.TMP_PREFIX)
+        written = 0
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                for chunk in chunks:
+                    fp.write(chunk)
+                    written += len(chunk)
+                    yield chunk
+
+            if written == size:
+                try:
+                    os.rename(tmp_path, self._get_path(image_id))
+                except OSError as exc:
+                    # Taken for stale by an eviction, the fill having
+                    # stalled for too long
+                    if exc.errno != errno.ENOENT:
+                        raise
+                    return
+                tmp_path = None
+                self.evict()
+        finally:
+            if tmp_path is not None:
+                _unlink(tmp_path)
+
+    def evict(self):
+        """
+        Delete stale temporary files, then the least recently used images
+        above `max_size` bytes.
+        """
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Deleted meanwhile
+                continue
+
+            if name.startswith(self.TMP_PREFIX):
+                if now - stat.st_mtime > self.STALE_TMP_AGE:
+                    LOG.info("Deleting %s, left by an interrupted fill of "
+                             "the cache", name)
+                    _unlink(path)
+                else:
+                    # Being written: it can't be evicted, but will be an
+                    # image of the cache soon
+                    total += stat.st_size
+                continue
+
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            LOG.debug("Evicting image %s from the cache", name)
+            self.delete(name)
+            total -= size
+
+    def delete(self, image_id):
+        """Remove `image_id` from the cache, if it's there."""
+        _unlink(self._get_path(image_id))
+
+
+def _unlink(path):
+    """Delete the file at `path`, unless it was deleted already."""
+    try:
+        os.unlink(path)
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+
+
+class TTLCache(object):
+    """
+    In-memory mapping whose entries expire `ttl` seconds after being set.
+
+    At most `max_entries` entries are kept: when full, expired entries are
+    dropped first, then the ones closest to expiring.
+    """
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Maps keys to (expiry time, value)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return default
+            return entry[1]
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            if (key not in self._entries and
+                    len(self._entries) >= self.max_entries):
+                self._make_room(now)
+            self._entries[key] = (now + self.ttl, value)
+
+    def pop(self, key):
+        """Invalidate `key`, if it's there."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _make_room(self, now):
+        for key, (expiry, _) in self._entries.items():
+            if expiry <= now:
+                del self._entries[key]
+
+        # Drop a tenth of the entries at once, not to do this on each set
+        excess = len(self._entries) - self.max_entries + 1
+        if excess > 0:
+            excess = max(excess, self.max_entries // 10)
+            for _, key in heapq.nsmallest(
+                    excess, ((expiry, key) for key, (expiry, _)
+                             in self._entries.iteritems())):
+                del self._entries[key]
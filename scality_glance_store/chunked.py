@@ -0,0 +1,150 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Chunking of image data: chunk sizes, and chunked transfer encoding of
+request bodies.
+"""
+
+import socket
+import time
+
+
+# Linux only. Tells the kernel more data is coming, so that the chunk size
+# line and the chunk payload sent with 2 calls end up in the same segments.
+_MSG_MORE = getattr(socket, 'MSG_MORE', None)
+
+# Below this size, copying a chunk costs less than the extra send call it
+# takes not to copy it.
+_MIN_SPLIT_SIZE = 256 * 1024
+
+
+class ChunkedWriter(object):
+    """
+    Write a request body on an HTTP connection with the chunked transfer
+    encoding, once the request headers have been sent.
+
+    The payload of each chunk is handed as is to the socket: for chunks
+    large enough for it to pay off, the framing is sent with a separate send
+    flagged with MSG_MORE. TLS connections, and platforms without MSG_MORE,
+    fall back to building each frame in a new string.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._sock = conn.sock
+        # Trailing CRLF of the previous chunk, sent along the next size line
+        self._pending = ''
+
+        if hasattr(self._sock, 'getpeercert'):
+            self._write = self._write_concatenated
+        elif _MSG_MORE is not None:
+            self._write = self._write_more
+        else:
+            self._write = self._write_concatenated
+
+    def _write_concatenated(self, chunk):
+        self._conn.send('%x\r\n%s\r\n' % (len(chunk), chunk))
+
+    def _write_more(self, chunk):
+        header = '%s%x\r\n' % (self._pending, len(chunk))
+        if len(chunk) < _MIN_SPLIT_SIZE:
+            self._sock.sendall(header + chunk)
+        else:
+            self._sock.sendall(header, _MSG_MORE)
+            self._sock.sendall(chunk)
+        self._pending = '\r\n'
+
+    def write(self, chunk):
+        """Send `chunk` as one chunk of the body. Empty chunks are skipped."""
+        if chunk:
+            self._write(chunk)
+
+    def close(self):
+        """Send the last chunk, which ends the body."""
+        self._conn.send(self._pending + '0\r\n\r\n')
+        self._pending = ''
+
+
+class ChunkSizer(object):
+    """
+    Adapt a chunk size to the throughput measured during a transfer.
+
+    The time elapsed between two chunks accounts for both producing and
+    consuming a chunk. While it stays under `LOW_WATERMARK`, per-chunk costs
+    (system calls, Python loop iterations) weigh on throughput, so the chunk
+    size doubles. Above `HIGH_WATERMARK`, the transfer is slow compared to
+    the chunk size and the chunk size halves, so as not to hold large
+    buffers for nothing. The chunk size stays between `minimum` and
+    `maximum`, which bounds the memory used by the transfer.
+    """
+
+    LOW_WATERMARK = 0.005
+    HIGH_WATERMARK = 0.05
+
+    def __init__(self, initial, maximum, minimum=None):
+        self.maximum = max(maximum, initial)
+        self.minimum = min(minimum or initial, initial)
+        self.size = initial
+        self._last = None
+
+    def next_size(self):
+        """Return the size of the next chunk."""
+        now = time.time()
+        if self._last is not None:
+            elapsed = now - self._last
+            if elapsed < self.LOW_WATERMARK:
+                self.size = min(self.size * 2, self.maximum)
+            elif elapsed > self.HIGH_WATERMARK:
+                self.size = max(self.size // 2, self.minimum)
+        self._last = now
+        return self.size
+
+
+def adaptive_chunkreadable(fp, sizer):
+    """
+    Same as `glance_store.common.utils.chunkreadable`, with chunk sizes given
+    by `sizer`, a `ChunkSizer`.
+    """
+    if not hasattr(fp, 'read'):
+        return fp
+
+    def chunkiter():
+        while True:
+            chunk = fp.read(sizer.next_size())
+            if not chunk:
+                break
+            yield chunk
+
+    return chunkiter()
+
+
+def coalesce(chunks, sizer):
+    """
+    Regroup the chunks yielded by `chunks` in chunks of about the size given
+    by `sizer`, a `ChunkSizer`. Chunks larger than that are left as is.
+    """
+    buf, buffered = [], 0
+    size = sizer.next_size()
+    for chunk in chunks:
+        buf.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield buf[0] if len(buf) == 1 else ''.join(buf)
+            buf, buffered = [], 0
+            size = sizer.next_size()
+
+    if buffered:
+        yield ''.join(buf)
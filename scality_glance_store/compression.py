@@ -0,0 +1,61 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Streaming compression of the images stored in the Ring.
+"""
+
+import zlib
+
+from scality_glance_store import concurrency
+
+
+# Name of the codec, recorded in the user metadata of compressed objects
+ZLIB = 'zlib'
+
+
+class Compressor(object):
+    """Incremental zlib compression, off the event loop."""
+
+    def __init__(self, level=zlib.Z_DEFAULT_COMPRESSION):
+        self._compressor = zlib.compressobj(level)
+
+    def compress(self, data):
+        """Compress `data`, returning the compressed bytes available."""
+        return concurrency.offload(self._compressor.compress, data)
+
+    def flush(self):
+        """Return the remaining compressed bytes."""
+        return self._compressor.flush()
+
+
+def decompress(chunks, chunk_size):
+    """
+    Yield the data of the zlib stream yielded by `chunks`, in chunks of at
+    most `chunk_size` bytes: a few compressed bytes may stand for a lot of
+    data.
+    """
+    decompressor = zlib.decompressobj()
+    for chunk in chunks:
+        while chunk:
+            data = concurrency.offload(decompressor.decompress, chunk,
+                                       chunk_size)
+            chunk = decompressor.unconsumed_tail
+            if data:
+                yield data
+
+    data = decompressor.flush()
+    if data:
+        yield data
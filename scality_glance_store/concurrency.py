@@ -0,0 +1,162 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Helpers to run work concurrently.
+
+Everything here is built on top of the :mod:`threading` module. Once eventlet
+monkey-patched the process (which is what glance-api does), these are green
+threads, otherwise they are native threads.
+"""
+
+import logging
+import threading
+
+import eventlet.patcher
+from eventlet import tpool
+
+
+LOG = logging.getLogger(__name__)
+
+
+def is_green():
+    """Whether eventlet monkey-patched the process, making threads green."""
+    return eventlet.patcher.is_monkey_patched('thread')
+
+
+def offload(func, *args, **kwargs):
+    """
+    Call `func`, a CPU-bound function, in eventlet's pool of native threads
+    when threads are green, so that it doesn't hold the event loop. Functions
+    releasing the GIL, like hashlib's or zlib's on large buffers, then also
+    run in parallel with the green threads.
+    """
+    if is_green():
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+class Worker(threading.Thread):
+    """A thread running `func` whose outcome can be waited for."""
+
+    def __init__(self, func, *args, **kwargs):
+        super(Worker, self).__init__()
+        self.daemon = True
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._result = None
+        self._exception = None
+
+    def run(self):
+        try:
+            self._result = self._func(*self._args, **self._kwargs)
+        except Exception as exc:
+            LOG.debug("Exception in worker %s", self.name, exc_info=True)
+            self._exception = exc
+        finally:
+            # The arguments may be large (e.g. the part of an image): don't
+            # keep them alive as long as the worker is referenced
+            self._func = self._args = self._kwargs = None
+
+    @property
+    def failed(self):
+        return self._exception is not None
+
+    def wait(self):
+        """
+        Wait for the worker to finish, and return the value returned by its
+        function or re-raise the exception it raised.
+        """
+        self.join()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+def spawn(func, *args, **kwargs):
+    """Start a `Worker` running `func(*args, **kwargs)`."""
+    worker = Worker(func, *args, **kwargs)
+    worker.start()
+    return worker
+
+
+class WorkerPool(object):
+    """Run functions in workers, at most `size` of them at the same time."""
+
+    def __init__(self, size):
+        self._semaphore = threading.BoundedSemaphore(max(size, 1))
+        self._lock = threading.Lock()
+        # Workers still running, by index
+        self._running = {}
+        # Results of the workers, by index (the order they were spawned in)
+        self._results = []
+        # Exception raised by the first worker which failed
+        self._exception = None
+
+    def _run(self, index, func, *args, **kwargs):
+        try:
+            self._results[index] = func(*args, **kwargs)
+        except Exception as exc:
+            with self._lock:
+                if self._exception is None:
+                    self._exception = exc
+            raise
+        finally:
+            # Finished workers aren't kept, nor what they reference
+            with self._lock:
+                del self._running[index]
+            self._semaphore.release()
+
+    def spawn(self, func, *args, **kwargs):
+        """
+        Run `func(*args, **kwargs)` in a new worker, blocking until a slot is
+        free in the pool.
+
+        If a previous worker of the pool failed, its exception is raised
+        instead, so that callers stop feeding a pool which is bound to fail.
+        """
+        self._semaphore.acquire()
+        if self._exception is not None:
+            self._semaphore.release()
+            raise self._exception
+
+        with self._lock:
+            index = len(self._results)
+            self._results.append(None)
+            worker = Worker(self._run, index, func, *args, **kwargs)
+            self._running[index] = worker
+        worker.start()
+        return worker
+
+    def waitall(self):
+        """
+        Wait for all the workers of the pool and return their results, in
+        the order they were spawned.
+
+        The first exception raised by a worker is re-raised, once every
+        worker has finished.
+        """
+        while True:
+            with self._lock:
+                running = list(self._running.values())
+            if not running:
+                break
+            for worker in running:
+                worker.join()
+
+        if self._exception is not None:
+            raise self._exception
+        return list(self._results)
@@ -0,0 +1,144 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Tuning of the pools of keep-alive connections to the Sproxyd endpoints.
+"""
+
+import logging
+import time
+
+
+LOG = logging.getLogger(__name__)
+
+
+class IdleTimeoutMixin(object):
+    """
+    Mixin for urllib3 connection pools which closes the connections that
+    stayed idle in the pool for more than `idle_timeout` seconds before
+    handing them out: the server is likely to close them at any time, maybe
+    while an image is being sent. Closed connections reconnect when used.
+
+    Connections dropped by the server are already detected by urllib3.
+    """
+
+    idle_timeout = None
+
+    def _get_conn(self, timeout=None):
+        conn = super(IdleTimeoutMixin, self)._get_conn(timeout)
+        idle_since = getattr(conn, 'idle_since', None)
+        conn.idle_since = None
+        if (idle_since is not None and conn.sock is not None and
+                time.time() - idle_since > self.idle_timeout):
+            LOG.debug("Closing connection to %s idle for too long",
+                      self.host)
+            conn.close()
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.time()
+        super(IdleTimeoutMixin, self)._put_conn(conn)
+
+
+def configure(client, maxsize, idle_timeout=0):
+    """
+    Keep at most `maxsize` idle connections to each endpoint of `client`, a
+    `SproxydClient`, and close connections idle for more than `idle_timeout`
+    seconds unless it is 0.
+    """
+    pool_manager = client._pool_manager
+    pool_manager.connection_pool_kw['maxsize'] = maxsize
+
+    if idle_timeout:
+        pool_classes = getattr(pool_manager, 'pool_classes_by_scheme', None)
+        if pool_classes is None:
+            LOG.warning("This version of urllib3 doesn't allow closing idle "
+                        "connections to Sproxyd")
+        else:
+            pool_manager.pool_classes_by_scheme = dict(
+                (scheme, type(pool_class.__name__,
+                              (IdleTimeoutMixin, pool_class),
+                              {'idle_timeout': idle_timeout}))
+                for scheme, pool_class in pool_classes.items())
+
+    # Pools created so far, if any, don't have the new settings
+    pool_manager.clear()
+
+
+class _ResponseIterator(object):
+    """
+    Iterator over the data of a response to a GET, `chunks`, which also
+    closes `response` when closed before its end, so that the connection
+    isn't left with unread data nor kept out of its pool.
+    """
+
+    def __init__(self, chunks, response):
+        self._chunks = chunks
+        self._response = response
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            # The connection went back to its pool
+            self._response = None
+            raise
+
+    def close(self):
+        response, self._response = self._response, None
+        self._chunks.close()
+        if response is not None:
+            # The connection can't be reused, it's reopened when needed
+            response.close()
+            response.release_conn()
+
+
+class ReleasingClientMixin(object):
+    """
+    Mixin for `SproxydClient` classes whose `get_object` returns data
+    iterators closing their connection when closed before their end.
+    `SproxydClient` only gives connections back to the pool once the data
+    was read.
+    """
+
+    def _do_http(self, caller_name, handlers, *args, **kwargs):
+        if caller_name == 'get_object':
+            def releasing(handler):
+                def wrapper(response):
+                    (headers, chunks), release = handler(response)
+                    return ((headers, _ResponseIterator(chunks, response)),
+                            release)
+                return wrapper
+
+            handlers = dict((status, releasing(handler))
+                            for status, handler in handlers.items())
+        return super(ReleasingClientMixin, self)._do_http(
+            caller_name, handlers, *args, **kwargs)
+
+
+_releasing_classes = {}
+
+
+def releasing(client_class):
+    """The subclass of `client_class` with `ReleasingClientMixin`."""
+    if client_class not in _releasing_classes:
+        _releasing_classes[client_class] = type(
+            'Releasing' + client_class.__name__,
+            (ReleasingClientMixin, client_class), {})
+    return _releasing_classes[client_class]
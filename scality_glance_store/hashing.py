@@ -0,0 +1,82 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and
+#    limitations under the License.
+
+"""
+Hash algorithms computed on images, behind the `hashlib` interface.
+"""
+
+import hashlib
+import zlib
+
+
+class ChecksumHash(object):
+    """
+    A `zlib` checksum (adler32 or crc32): much cheaper than cryptographic
+    hashes, but only fit to detect accidental changes.
+    """
+
+    def __init__(self, name, func):
+        self.name = name
+        self._func = func
+        self._value = func('')
+
+    def update(self, data):
+        self._value = self._func(data, self._value)
+
+    def hexdigest(self):
+        return '%08x' % (self._value & 0xffffffff)
+
+
+_CHECKSUMS = {
+    'adler32': zlib.adler32,
+    'crc32': zlib.crc32,
+}
+
+
+def new(name):
+    """
+    Get a new hasher for algorithm `name`, either a `hashlib` algorithm or
+    one of 'adler32' and 'crc32'.
+
+    :raises ValueError: for unknown algorithms
+    """
+    if name in _CHECKSUMS:
+        return ChecksumHash(name, _CHECKSUMS[name])
+    return hashlib.new(name)
+
+
+class MultiHash(object):
+    """
+    A hasher computing several algorithms at once: each chunk of data is
+    handed over to all of them as it goes. It's a drop-in replacement for the
+    hasher of its first algorithm.
+    """
+
+    def __init__(self, *names):
+        self.names = names
+        self._hashers = dict((name, new(name)) for name in names)
+        self._update_funcs = [self._hashers[name].update for name in names]
+
+    def update(self, data):
+        for update in self._update_funcs:
+            update(data)
+
+    def hexdigest(self, name=None):
+        """The digest of algorithm `name`, the first one by default."""
+        return self._hashers[name or self.names[0]].hexdigest()
+
+    def hexdigests(self):
+        return dict((name, hasher.hexdigest())
+                    for name, hasher in self._hashers.items())
@@ -0,0 +1,214 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Hedged requests: a request which didn't get a response in time is sent
+again, and the first response wins.
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+
+from scality_glance_store import concurrency
+
+
+LOG = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """
+    Allows an action for at most `ratio` of the events, with bursts of at
+    most `burst` actions.
+    """
+
+    def __init__(self, ratio, burst=10):
+        self._ratio = ratio
+        self._burst = burst
+        self._tokens = 1.0
+        self._lock = threading.Lock()
+
+    def add(self):
+        """Record an event."""
+        with self._lock:
+            self._tokens = min(self._tokens + self._ratio, self._burst)
+
+    def take(self):
+        """Whether the action is allowed, recording it if so."""
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Race(object):
+    """Calls of the same function, the first one to succeed winning."""
+
+    def __init__(self, func, cancel, on_latency):
+        self._func = func
+        self._cancel = cancel
+        self._on_latency = on_latency
+        self._lock = threading.Lock()
+        self._over = threading.Event()
+        self._running = 0
+        self._winner = None
+        self._exception = None
+
+    def start(self, primary=False):
+        """
+        Start a call. The latency of the `primary` one is recorded whether
+        it wins or not, so that hedged calls, which answer faster, don't bias
+        the latencies recorded.
+        """
+        with self._lock:
+            if self._over.is_set():
+                return
+            self._running += 1
+        concurrency.spawn(self._run, primary)
+
+    def _run(self, primary):
+        start = time.time()
+        try:
+            result = self._func()
+        except Exception as exc:
+            with self._lock:
+                self._running -= 1
+                if self._exception is None:
+                    self._exception = exc
+                # The race is lost when all the calls failed
+                if not self._running and self._winner is None:
+                    self._over.set()
+            return
+
+        with self._lock:
+            self._running -= 1
+            won = self._winner is None
+            if won:
+                self._winner = (result,)
+                self._over.set()
+        if primary:
+            self._on_latency(time.time() - start)
+        if not won:
+            self._cancel(result)
+
+    def wait(self, timeout=None):
+        """Whether the race is over, waiting at most `timeout` seconds."""
+        self._over.wait(timeout)
+        return self._over.is_set()
+
+    def result(self):
+        """The result of the winner, or the first exception raised."""
+        self._over.wait()
+        if self._winner is None:
+            raise self._exception
+        return self._winner[0]
+
+
+class Hedger(object):
+    """
+    Sends requests again if they didn't get a response after `delay`
+    seconds, or after the `percentile` of the latency of the last `window`
+    requests if it's not 0 (once `window` latencies are known).
+
+    At most `max_ratio` of the requests are hedged, so that a slow cluster
+    doesn't get twice as much load.
+    """
+
+    def __init__(self, delay, percentile=0, max_ratio=0.05, window=100):
+        self._delay = delay
+        self._percentile = percentile
+        self._window = window
+        self._latencies = collections.deque(maxlen=window)
+        self._bucket = TokenBucket(max_ratio)
+
+    def get_delay(self):
+        """The time after which a request is sent again."""
+        if not self._percentile or len(self._latencies) < self._window:
+            return self._delay
+        latencies = sorted(self._latencies)
+        index = int(len(latencies) * self._percentile / 100.0)
+        return latencies[min(index, len(latencies) - 1)]
+
+    def call(self, func, cancel):
+        """
+        Return the result of `func`, a request, calling it again in parallel
+        if it's too slow. `cancel` is called with the result of the call
+        which lost, to release its resources.
+        """
+        self._bucket.add()
+        race = _Race(func, cancel, self._latencies.append)
+        race.start(primary=True)
+        if not race.wait(self.get_delay()) and self._bucket.take():
+            LOG.debug("Hedging a request")
+            race.start()
+        return race.result()
+
+
+class EndpointAvoidingClientMixin(object):
+    """
+    Mixin for `SproxydClient` classes, letting the requests of a thread
+    avoid the endpoints other requests were sent to: see `avoiding`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._avoiding = threading.local()
+        super(EndpointAvoidingClientMixin, self).__init__(*args, **kwargs)
+
+    @contextlib.contextmanager
+    def avoiding(self, used):
+        """
+        Send the requests of the block to endpoints not in `used`, a set of
+        endpoints (unless no other endpoint is alive), and add the endpoints
+        they are sent to to `used`.
+        """
+        self._avoiding.used = used
+        try:
+            yield
+        finally:
+            self._avoiding.used = None
+
+    def get_next_endpoint(self):
+        parent = super(EndpointAvoidingClientMixin, self)
+        used = getattr(self._avoiding, 'used', None)
+        candidates = self._alive.difference(used) if used else None
+        if not candidates:
+            endpoint = parent.get_next_endpoint()
+        elif hasattr(parent, 'get_endpoint_among'):
+            endpoint = parent.get_endpoint_among(candidates)
+        else:
+            # Round-robin: skip the endpoints to avoid
+            for _i in range(len(self._alive)):
+                endpoint = parent.get_next_endpoint()
+                if endpoint in candidates:
+                    break
+
+        if used is not None:
+            used.add(endpoint)
+        return endpoint
+
+
+_avoiding_classes = {}
+
+
+def endpoint_avoiding(client_class):
+    """The subclass of `client_class` with `EndpointAvoidingClientMixin`."""
+    if client_class not in _avoiding_classes:
+        _avoiding_classes[client_class] = type(
+            'Avoiding' + client_class.__name__,
+            (EndpointAvoidingClientMixin, client_class), {})
+    return _avoiding_classes[client_class]
@@ -0,0 +1,327 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Metrics of the store, handed over to a pluggable sink.
+
+Nothing is measured unless a sink is configured: the store checks whether it
+has one before measuring anything.
+"""
+
+import BaseHTTPServer
+import bisect
+import logging
+import threading
+import time
+
+try:
+    from oslo_utils import importutils
+except ImportError:
+    from oslo.utils import importutils
+
+import scality_sproxyd_client.exceptions
+
+
+LOG = logging.getLogger(__name__)
+
+# Labelled by operation: get, add or delete
+OPERATION_SECONDS = 'scality_operation_duration_seconds'
+OPERATION_ERRORS = 'scality_operation_errors_total'
+BYTES = 'scality_bytes_total'
+FIRST_BYTE_SECONDS = 'scality_first_byte_seconds'
+
+UPLOAD_HASH_SECONDS = 'scality_upload_hash_seconds_total'
+UPLOAD_SEND_SECONDS = 'scality_upload_send_seconds_total'
+
+# Labelled by method and status
+SPROXYD_RESPONSES = 'scality_sproxyd_responses_total'
+# Labelled by endpoint
+SPROXYD_IN_FLIGHT = 'scality_sproxyd_requests_in_flight'
+
+DESCRIPTIONS = {
+    OPERATION_SECONDS: "Duration of the operations on images, until their "
+                       "data is fully read for gets.",
+    OPERATION_ERRORS: "Operations on images which failed, by exception.",
+    BYTES: "Bytes of images read or written.",
+    FIRST_BYTE_SECONDS: "Time until the first byte of an image is read.",
+    UPLOAD_HASH_SECONDS: "Time spent hashing images being uploaded.",
+    UPLOAD_SEND_SECONDS: "Time spent sending images to Sproxyd.",
+    SPROXYD_RESPONSES: "Responses of Sproxyd, by HTTP status ('error' when "
+                       "no response came).",
+    SPROXYD_IN_FLIGHT: "Requests waiting for a response of each Sproxyd "
+                       "endpoint.",
+}
+
+
+class Sink(object):
+    """
+    Receives the metrics of the store, from any thread. This one discards
+    them: subclasses send them somewhere.
+
+    Metrics are identified by a name and labels, a dict of strings.
+    """
+
+    def increment(self, name, value=1, labels=None):
+        """Add `value` to counter `name`."""
+
+    def observe(self, name, value, labels=None):
+        """Record `value` in histogram `name`."""
+
+    def add(self, name, delta, labels=None):
+        """Add `delta`, which may be negative, to gauge `name`."""
+
+
+class PrometheusSink(Sink):
+    """
+    Keeps metrics in memory, to be scraped by Prometheus in its text
+    exposition format (see `render` and `serve`).
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    # Upper bounds of the buckets of histograms, in seconds: image transfers
+    # can last minutes.
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+               60, 120, 300, 600)
+
+    def __init__(self, buckets=None):
+        self._buckets = tuple(buckets or self.BUCKETS)
+        self._lock = threading.Lock()
+        # Name -> 'counter', 'gauge' or 'histogram'
+        self._types = {}
+        # Name -> {labels: value}, histogram values being lists of per-bucket
+        # counts followed by the sum and count of values
+        self._values = {}
+
+    def _get_values(self, name, metric_type):
+        values = self._values.get(name)
+        if values is None:
+            self._types[name] = metric_type
+            values = self._values[name] = {}
+        return values
+
+    def increment(self, name, value=1, labels=None):
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._get_values(name, 'counter')
+            values[key] = values.get(key, 0) + value
+
+    def add(self, name, delta, labels=None):
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._get_values(name, 'gauge')
+            values[key] = values.get(key, 0) + delta
+
+    def observe(self, name, value, labels=None):
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            values = self._get_values(name, 'histogram')
+            histogram = values.get(key)
+            if histogram is None:
+                histogram = values[key] = [0] * (len(self._buckets) + 3)
+            histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                metric_type = self._types[name]
+                if name in DESCRIPTIONS:
+                    lines.append('# HELP %s %s' % (name, DESCRIPTIONS[name]))
+                lines.append('# TYPE %s %s' % (name, metric_type))
+
+                for key, value in sorted(self._values[name].items()):
+                    if metric_type == 'histogram':
+                        lines.extend(self._render_histogram(name, key, value))
+                    else:
+                        lines.append(_render_sample(name, key, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def _render_histogram(self, name, key, histogram):
+        cumulated = 0
+        bounds = [repr(float(bound)) for bound in self._buckets] + ['+Inf']
+        for bound, count in zip(bounds, histogram):
+            cumulated += count
+            yield _render_sample(name + '_bucket', key + (('le', bound),),
+                                 cumulated)
+        yield _render_sample(name + '_sum', key, histogram[-2])
+        yield _render_sample(name + '_count', key, histogram[-1])
+
+    def serve(self, port, host=''):
+        """
+        Serve the metrics over HTTP on `port`, from a daemon thread.
+
+        :retval the HTTP server
+        """
+        server = BaseHTTPServer.HTTPServer((host, port), _MetricsHandler)
+        server.sink = self
+        thread = threading.Thread(target=server.serve_forever,
+                                  name='scality-metrics')
+        thread.daemon = True
+        thread.start()
+        return server
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        body = self.server.sink.render()
+        self.send_response(200)
+        self.send_header('Content-Type', PrometheusSink.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _render_sample(name, key, value):
+    if key:
+        name += '{%s}' % ','.join(
+            '%s="%s"' % (label, str(label_value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+            for label, label_value in key)
+    return '%s %s' % (name, repr(float(value)))
+
+
+def load_sink(name):
+    """
+    Get a new sink: 'prometheus' for a `PrometheusSink`, otherwise the import
+    path of a `Sink` class.
+
+    :raises ImportError: if the class can't be imported
+    """
+    if name == 'prometheus':
+        return PrometheusSink()
+    return importutils.import_class(name)()
+
+
+def timed(func, sink, name):
+    """Wrap `func`, adding the time spent in it to counter `name`."""
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sink.increment(name, time.time() - start)
+    return wrapper
+
+
+class TimedHasher(object):
+    """A hasher adding the time spent hashing to counter `name`."""
+
+    def __init__(self, hasher, sink, name):
+        self.update = timed(hasher.update, sink, name)
+
+
+def metered(chunks, sink, operation, start):
+    """
+    Wrap `chunks`, the data of `operation` started at `start`, recording its
+    time to first byte, and its size and duration once it's over.
+    """
+    labels = {'operation': operation}
+    size = 0
+    first = True
+    try:
+        for chunk in chunks:
+            if first:
+                sink.observe(FIRST_BYTE_SECONDS, time.time() - start, labels)
+                first = False
+            size += len(chunk)
+            yield chunk
+    except Exception as exc:
+        sink.increment(OPERATION_ERRORS,
+                       labels={'operation': operation,
+                               'error': type(exc).__name__})
+        raise
+    finally:
+        sink.increment(BYTES, size, labels)
+        sink.observe(OPERATION_SECONDS, time.time() - start, labels)
+
+
+class InstrumentedClientMixin(object):
+    """
+    Mixin for `SproxydClient` classes counting the responses of Sproxyd and
+    the requests waiting for them, in the sink given as the `sink` keyword
+    argument.
+
+    Chunked PUTs aren't covered: the store sees their response.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._sink = kwargs.pop('sink')
+        self._requests = threading.local()
+        super(InstrumentedClientMixin, self).__init__(*args, **kwargs)
+
+    def get_next_endpoint(self):
+        endpoint = super(InstrumentedClientMixin, self).get_next_endpoint()
+        if getattr(self._requests, 'tracking', False):
+            self._requests.endpoint = endpoint.geturl()
+            self._sink.add(SPROXYD_IN_FLIGHT, 1,
+                           {'endpoint': self._requests.endpoint})
+        return endpoint
+
+    def _do_http(self, caller_name, handlers, method, *args, **kwargs):
+        requests = self._requests
+
+        def record_status(status, handler):
+            def wrapper(response):
+                requests.status = status
+                return handler(response)
+            return wrapper
+
+        handlers = dict((status, record_status(status, handler))
+                        for status, handler in handlers.items())
+        requests.tracking = True
+        requests.endpoint = None
+        requests.status = 'error'
+        try:
+            return super(InstrumentedClientMixin, self)._do_http(
+                caller_name, handlers, method, *args, **kwargs)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            # Unexpected statuses have no handler
+            if requests.status == 'error' and exc.http_status:
+                requests.status = exc.http_status
+            raise
+        finally:
+            requests.tracking = False
+            if requests.endpoint is not None:
+                self._sink.add(SPROXYD_IN_FLIGHT, -1,
+                               {'endpoint': requests.endpoint})
+            self._sink.increment(SPROXYD_RESPONSES,
+                                 labels={'method': method,
+                                         'status': requests.status})
+
+
+_instrumented_classes = {}
+
+
+def instrumented(client_class):
+    """The subclass of `client_class` with `InstrumentedClientMixin`."""
+    if client_class not in _instrumented_classes:
+        _instrumented_classes[client_class] = type(
+            'Instrumented' + client_class.__name__,
+            (InstrumentedClientMixin, client_class), {})
+    return _instrumented_classes[client_class]
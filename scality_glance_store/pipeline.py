@@ -0,0 +1,170 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Hashing of the chunks of an image being uploaded.
+
+Chunks are fed to 'hashers', objects with an `update` method such as the
+MD5 checksum of the image or the verifier of its signature.
+"""
+
+import Queue
+
+import eventlet.queue
+from eventlet import tpool
+
+from scality_glance_store import concurrency
+
+
+# Marks the end of the stream of chunks in the queues
+_END = object()
+
+
+def hashing_stage(chunks, hashers, depth=0):
+    """
+    Return an iterable over `chunks` which feeds each chunk to `hashers`.
+
+    If `depth` is 0, chunks are hashed inline. Otherwise chunks go through a
+    pipeline with at most `depth` chunks waiting in each of its queues.
+    """
+    if depth:
+        return PipelinedHashing(chunks, hashers, depth)
+    return InlineHashing(chunks, hashers)
+
+
+class InlineHashing(object):
+    """Hash each chunk before handing it over."""
+
+    def __init__(self, chunks, hashers):
+        self._chunks = chunks
+        self._hashers = hashers
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for hasher in self._hashers:
+                hasher.update(chunk)
+            yield chunk
+
+    def close(self):
+        """Wait for all the chunks to be hashed."""
+
+    def abort(self):
+        """Stop reading chunks."""
+
+
+class PipelinedHashing(object):
+    """
+    Three stages connected by bounded queues, all working on the same chunk
+    objects: a reader pulling chunks from `chunks`, a worker hashing them,
+    and the consumer of this iterable, typically sending them over the
+    network.
+
+    The stages run in green threads when eventlet monkey-patched the process
+    (glance-api does). Hashing is then handed to eventlet's pool of native
+    threads, where it does not hold the event loop: hashlib and cryptography
+    release the GIL while hashing large buffers, so hashing and sending
+    really overlap. Without eventlet, stages run in native threads.
+    """
+
+    # How long the reader waits for room in the queue of the consumer before
+    # checking whether the upload was aborted
+    PUT_TIMEOUT = 0.1
+
+    def __init__(self, chunks, hashers, depth):
+        self._chunks = chunks
+        self._hashers = hashers
+        self._aborted = False
+
+        if concurrency.is_green():
+            queue_class = eventlet.queue.Queue
+            self._hash_batch = self._hash_batch_in_tpool
+        else:
+            queue_class = Queue.Queue
+        self._hash_queue = queue_class(depth)
+        self._send_queue = queue_class(depth)
+
+        self._reader = concurrency.spawn(self._read)
+        self._hasher = concurrency.spawn(self._hash)
+
+    def _put_for_consumer(self, item):
+        while not self._aborted:
+            try:
+                self._send_queue.put(item, timeout=self.PUT_TIMEOUT)
+                return
+            except (Queue.Full, eventlet.queue.Full):
+                pass
+
+    def _read(self):
+        try:
+            for chunk in self._chunks:
+                if self._aborted:
+                    break
+                self._hash_queue.put(chunk)
+                self._put_for_consumer(chunk)
+        finally:
+            self._hash_queue.put(_END)
+            self._put_for_consumer(_END)
+
+    def _hash_batch(self, batch):
+        for chunk in batch:
+            for hasher in self._hashers:
+                hasher.update(chunk)
+
+    def _hash_batch_in_tpool(self, batch):
+        tpool.execute(PipelinedHashing._hash_batch, self, batch)
+
+    def _hash(self):
+        exception = None
+        done = False
+        while not done:
+            batch = [self._hash_queue.get()]
+            # Hash whatever is already queued in one go, to make up for the
+            # cost of handing work over to another thread
+            while batch[-1] is not _END and not self._hash_queue.empty():
+                batch.append(self._hash_queue.get())
+            if batch[-1] is _END:
+                batch.pop()
+                done = True
+
+            # Keep consuming after a failure, not to block the reader
+            if exception is None and batch:
+                try:
+                    self._hash_batch(batch)
+                except Exception as exc:
+                    exception = exc
+
+        if exception is not None:
+            raise exception
+
+    def __iter__(self):
+        while True:
+            chunk = self._send_queue.get()
+            if chunk is _END:
+                # Raise the exception which stopped the reader, if any: the
+                # upload must not be committed.
+                self._reader.wait()
+                return
+            yield chunk
+
+    def close(self):
+        """
+        Wait for all the chunks to be hashed, and raise the exception raised
+        by a hasher if any.
+        """
+        self._hasher.wait()
+
+    def abort(self):
+        """Stop reading chunks, without waiting for the stages to finish."""
+        self._aborted = True
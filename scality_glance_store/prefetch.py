@@ -0,0 +1,130 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Reading of images ahead of their consumer.
+"""
+
+import collections
+import threading
+
+from scality_glance_store import concurrency
+
+
+class _Buffer(object):
+    """
+    Chunks read ahead, shared between the reader worker and the consumer.
+
+    The reader waits while the buffer holds `depth` chunks or `max_bytes`
+    bytes (0 for no limit), but always makes room for one chunk.
+    """
+
+    def __init__(self, depth, max_bytes):
+        self._depth = max(depth, 1)
+        self._max_bytes = max_bytes
+        self._chunks = collections.deque()
+        self._size = 0
+        self._done = False
+        self._closed = False
+        self._exception = None
+        self._cond = threading.Condition()
+
+    def _is_full(self):
+        return self._chunks and (
+            len(self._chunks) >= self._depth or
+            (self._max_bytes and self._size >= self._max_bytes))
+
+    def fill(self, chunks):
+        """Read `chunks` into the buffer, until the consumer is gone."""
+        try:
+            for chunk in chunks:
+                with self._cond:
+                    while self._is_full() and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        break
+                    self._chunks.append(chunk)
+                    self._size += len(chunk)
+                    self._cond.notify_all()
+        except Exception as exc:
+            with self._cond:
+                self._exception = exc
+        finally:
+            # Release the resources of the source, e.g. its connection
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def pop(self):
+        """
+        Get the next chunk, waiting for the reader if needed.
+
+        :raises StopIteration: once all the chunks were read
+        """
+        with self._cond:
+            while not self._chunks and not self._done:
+                self._cond.wait()
+
+            if self._chunks:
+                chunk = self._chunks.popleft()
+                self._size -= len(chunk)
+                self._cond.notify_all()
+                return chunk
+
+            if self._exception is not None:
+                exception, self._exception = self._exception, None
+                raise exception
+            raise StopIteration()
+
+    def close(self):
+        """Drop the chunks read, and stop the reader."""
+        with self._cond:
+            self._closed = True
+            self._chunks.clear()
+            self._size = 0
+            self._cond.notify_all()
+
+
+class ReadAhead(object):
+    """
+    An iterator over `chunks` reading them in a worker ahead of its
+    consumer, so that reading the image from Sproxyd and sending it to its
+    consumer overlap. At most `depth` chunks and about `max_bytes` bytes
+    (unless 0) are held in memory: the worker then waits for the consumer.
+
+    The worker stops when the iterator is closed or garbage collected.
+    """
+
+    def __init__(self, chunks, depth, max_bytes=0):
+        # The worker only references the buffer, so that dropping this
+        # iterator stops it
+        self._buffer = _Buffer(depth, max_bytes)
+        self._reader = concurrency.spawn(self._buffer.fill, chunks)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self._buffer.pop()
+
+    __next__ = next
+
+    def close(self):
+        self._buffer.close()
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,202 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Checkpoints of resumable multi-part uploads.
+
+A resumable upload records each part it uploaded in a checkpoint object, so
+that when it fails, a retried upload of the same image skips the parts whose
+data didn't change.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import scality_sproxyd_client.exceptions
+
+from scality_glance_store import concurrency
+
+
+LOG = logging.getLogger(__name__)
+
+
+def get_checkpoint_key(key):
+    """Key of the checkpoint of the upload of `key`."""
+    return '%s.checkpoint' % key
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+class Checkpoint(object):
+    """
+    The parts committed by an upload of `key` split in parts of `part_size`
+    bytes, as {index: [part key, size, md5]}, stored as JSON along with the
+    time of the last commit. `upload_id` is part of the keys of the parts,
+    and is reused when the upload is resumed.
+
+    Parts are committed from the workers uploading them. The checkpoint is
+    written outside of the lock of the parts, and a write of the latest
+    parts covers the commits waiting for it.
+    """
+
+    def __init__(self, client, key, part_size, upload_id, parts=None,
+                 timestamp=None):
+        self.key = key
+        self.part_size = part_size
+        self.upload_id = upload_id
+        self.parts = parts or {}
+        self.timestamp = timestamp or time.time()
+        self._client = client
+        self._lock = threading.Lock()
+        # Serializes the writes of the checkpoint
+        self._write_lock = threading.Lock()
+        # Number of commits so far, and when the checkpoint was last written
+        self._version = 0
+        self._written = 0
+
+    @classmethod
+    def load(cls, client, key):
+        """
+        Get the checkpoint of the upload of `key`, or None if there's none.
+
+        A corrupt checkpoint (e.g. truncated) is deleted, as if there was
+        none. The parts it lists can't be known, and are left behind.
+        """
+        checkpoint_key = get_checkpoint_key(key)
+        try:
+            _, data_iterator = client.get_object(checkpoint_key)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            if exc.http_status == 404:
+                return None
+            raise
+
+        try:
+            state = json.loads(''.join(data_iterator))
+            parts = dict((int(index), list(part))
+                         for index, part in state['parts'].items())
+            return cls(client, key, state['part_size'], state['upload_id'],
+                       parts, state['timestamp'])
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            LOG.warning("Deleting the corrupt checkpoint of the upload of "
+                        "%s: %r", key, exc)
+
+        try:
+            client.del_object(checkpoint_key)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            LOG.error("Failed to delete the checkpoint of the upload of %s: "
+                      "%r", key, exc)
+        return None
+
+    def is_expired(self, ttl):
+        return time.time() - self.timestamp > ttl
+
+    def is_committed(self, index, key, data):
+        """Whether part `index` was committed under `key` with `data`."""
+        part = self.parts.get(index)
+        return (part is not None and part[0] == key and
+                part[1] == len(data) and
+                part[2] == concurrency.offload(_md5, data))
+
+    def get_committed_keys(self):
+        with self._lock:
+            return set(part[0] for part in self.parts.values())
+
+    def commit(self, index, key, data):
+        """Record that `data` was uploaded under `key` as part `index`."""
+        md5 = concurrency.offload(_md5, data)
+        with self._lock:
+            self.parts[index] = [key, len(data), md5]
+            self.timestamp = time.time()
+            self._version += 1
+            version = self._version
+
+        with self._write_lock:
+            if self._written >= version:
+                # Written by a later commit while this one was waiting
+                return
+            with self._lock:
+                version = self._version
+                body = json.dumps({
+                    'part_size': self.part_size,
+                    'upload_id': self.upload_id,
+                    'parts': self.parts,
+                    'timestamp': self.timestamp,
+                })
+            self._client.put_object(get_checkpoint_key(self.key), body)
+            self._written = version
+
+    def delete(self, keep=()):
+        """Delete the checkpoint, and its parts not in `keep`."""
+        for key in self.get_committed_keys():
+            if key in keep:
+                continue
+            try:
+                self._client.del_object(key)
+            except scality_sproxyd_client.exceptions.SproxydException as exc:
+                LOG.error("Failed to delete part %s of a resumable upload: "
+                          "%r", key, exc)
+        self._client.del_object(get_checkpoint_key(self.key))
+
+
+class Collector(object):
+    """
+    Garbage collection of the checkpoints of failed uploads, with their
+    parts, once they were not updated for `ttl` seconds.
+
+    Sproxyd can't list objects, so a collector only knows about the
+    checkpoints left by the uploads of its process. Checkpoints left by
+    other processes are collected when an upload of the same image finds
+    them expired.
+    """
+
+    def __init__(self, ttl):
+        self._ttl = ttl
+        # Key -> time the upload of the key failed
+        self._failed = {}
+        self._lock = threading.Lock()
+
+    def track(self, key):
+        with self._lock:
+            self._failed[key] = time.time()
+
+    def forget(self, key):
+        with self._lock:
+            self._failed.pop(key, None)
+
+    def collect(self, client):
+        """Delete the checkpoints of this process which expired."""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, failed in self._failed.items()
+                       if now - failed > self._ttl]
+            for key in expired:
+                del self._failed[key]
+
+        for key in expired:
+            try:
+                checkpoint = Checkpoint.load(client, key)
+                # The upload may have been resumed by another process since
+                if checkpoint is not None and checkpoint.is_expired(self._ttl):
+                    LOG.info("Deleting the expired checkpoint of the upload "
+                             "of %s", key)
+                    checkpoint.delete()
+            except Exception:
+                LOG.exception("Failed to collect the checkpoint of the "
+                              "upload of %s", key)
@@ -0,0 +1,274 @@
+# Copyright (c) 2015 Scality
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Sharing of a single upstream stream between concurrent readers of an image.
+"""
+
+import collections
+import logging
+import threading
+
+
+LOG = logging.getLogger(__name__)
+
+
+class SharedStream(object):
+    """
+    An image read once from upstream on behalf of several readers.
+
+    The stream is opened lazily by the first reader, with `opener`, which
+    returns an iterator over the image and its size. Chunks read from
+    upstream go to a buffer in which each reader has its own cursor: chunks
+    are dropped once all the readers went past them, or when the buffer
+    holds more than `max_buffered` bytes. The start of the stream is kept as
+    long as it fits in the buffer though, so that readers coming later can
+    still join the stream. Whichever reader needs a chunk not
+    read yet pulls it from upstream, while the others wait for it. A reader
+    lagging so far behind that the chunks it needs were dropped from the
+    buffer goes on with a stream of its own, from `fallback(offset)`.
+
+    The upstream iterator is closed once all the readers are gone.
+    """
+
+    def __init__(self, opener, fallback, max_buffered, on_done=None):
+        self._opener = opener
+        self._fallback = fallback
+        self._max_buffered = max_buffered
+        self._on_done = on_done
+
+        self.size = None
+        self._chunks = None
+        self._exception = None
+        self._eof = False
+        self._abandoned = False
+
+        self._buffer = collections.deque()
+        self._buffered = 0
+        # Index in the whole stream of the first chunk of the buffer
+        self._base = 0
+        # Reader -> index of the next chunk it reads
+        self._cursors = {}
+
+        # Protects the state of the stream
+        self._lock = threading.Lock()
+        # Held while opening the stream or pulling a chunk from upstream
+        self._fetch_lock = threading.Lock()
+
+    def joinable(self):
+        """Whether a new reader can still read the stream from its start."""
+        with self._lock:
+            return (self._base == 0 and self._exception is None and
+                    not self._abandoned)
+
+    def open(self):
+        """Open the stream if needed, and return the size of the image."""
+        with self._fetch_lock:
+            if self._chunks is None and self._exception is None:
+                try:
+                    chunks, self.size = self._opener()
+                    self._chunks = iter(chunks)
+                except Exception as exc:
+                    self._exception = exc
+                    self._done()
+
+        if self._exception is not None:
+            raise self._exception
+        return self.size
+
+    def _done(self):
+        if self._on_done:
+            self._on_done(self)
+
+    def _pull(self, index):
+        """Read chunks from upstream until chunk `index` is buffered."""
+        with self._fetch_lock:
+            while (self._exception is None and not self._eof and
+                   not self._abandoned and
+                   index >= self._base + len(self._buffer)):
+                try:
+                    chunk = next(self._chunks)
+                except StopIteration:
+                    self._eof = True
+                    self._done()
+                    break
+                except Exception as exc:
+                    self._exception = exc
+                    self._done()
+                    break
+
+                if not chunk:
+                    continue
+
+                with self._lock:
+                    self._buffer.append(chunk)
+                    self._buffered += len(chunk)
+                    while (self._buffered > self._max_buffered and
+                           len(self._buffer) > 1):
+                        self._drop()
+
+    def _drop(self):
+        self._buffered -= len(self._buffer.popleft())
+        self._base += 1
+
+    def _trim(self):
+        """
+        Drop the chunks all the readers went past, unless they're the start
+        of a stream still being read.
+        """
+        if self._cursors:
+            if self._base == 0 and not self._eof:
+                # New readers can join
+                return
+            lowest = min(self._cursors.values())
+        else:
+            lowest = self._base + len(self._buffer)
+        while self._buffer and self._base < lowest:
+            self._drop()
+
+    def _get(self, index):
+        """
+        Get chunk `index` of the stream.
+
+        :retval the chunk, '' at the end of the stream, or None if the chunk
+                was dropped from the buffer
+        """
+        while True:
+            with self._lock:
+                if index < self._base:
+                    return None
+                if index < self._base + len(self._buffer):
+                    return self._buffer[index - self._base]
+                if self._exception is not None:
+                    raise self._exception
+                if self._eof:
+                    return ''
+
+            self._pull(index)
+
+    def _advance(self, reader, index):
+        with self._lock:
+            self._cursors[reader] = index
+            self._trim()
+
+    def _leave(self, reader):
+        with self._lock:
+            self._cursors.pop(reader, None)
+            self._trim()
+            abandoned = (not self._cursors and not self._eof and
+                         self._exception is None and not self._abandoned)
+            if abandoned:
+                self._abandoned = True
+
+        if abandoned:
+            # Nobody reads the stream anymore: release the upstream
+            # connection, and don't let a new reader join
+            with self._fetch_lock:
+                close = getattr(self._chunks, 'close', None)
+                if close is not None:
+                    close()
+            self._done()
+
+    def read(self):
+        """Get an iterator over the chunks of the image, for a new reader."""
+        with self._lock:
+            if not self._abandoned:
+                reader = _Reader(self)
+                self._cursors[reader] = 0
+                return reader
+
+        # Abandoned after this reader found it
+        return iter(self._fallback(0))
+
+
+class _Reader(object):
+    """An iterator over a `SharedStream`, for one of its readers."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._index = 0
+        self._offset = 0
+        self._fallback = None
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        if self._fallback is not None:
+            return next(self._fallback)
+        if self._closed:
+            raise StopIteration()
+
+        try:
+            chunk = self._stream._get(self._index)
+        except Exception:
+            self.close()
+            raise
+
+        if chunk is None:
+            LOG.debug("Reader lagging behind at offset %d, falling back to "
+                      "its own stream", self._offset)
+            self.close()
+            self._fallback = iter(self._stream._fallback(self._offset))
+            return next(self._fallback)
+        if not chunk:
+            self.close()
+            raise StopIteration()
+
+        self._index += 1
+        self._offset += len(chunk)
+        self._stream._advance(self, self._index)
+        return chunk
+
+    __next__ = next
+
+    def close(self):
+        if self._fallback is not None and hasattr(self._fallback, 'close'):
+            self._fallback.close()
+        if not self._closed:
+            self._closed = True
+            self._stream._leave(self)
+
+    def __del__(self):
+        self.close()
+
+
+class SharedStreams(object):
+    """Registry of the `SharedStream` being read, by key."""
+
+    def __init__(self, max_buffered):
+        self._max_buffered = max_buffered
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, opener, fallback):
+        """
+        Get the stream being read for `key`, or a new one if there's none
+        which can be joined.
+        """
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None or not stream.joinable():
+                stream = SharedStream(
+                    opener, fallback, self._max_buffered,
+                    on_done=lambda done: self._remove(key, done))
+                self._streams[key] = stream
+            return stream
+
+    def _remove(self, key, stream):
+        with self._lock:
+            if self._streams.get(key) is stream:
+                del self._streams[key]
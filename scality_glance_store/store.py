@@ -13,8 +13,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import collections
+import functools
 import hashlib
+import httplib
+import itertools
+import json
 import logging
+import mmap
+import os
+import pickle
+import re
+import socket
+import stat
+import threading
+import time
+import uuid
 
 from glance_store import backend
 
@@ -35,7 +50,7 @@ except ImportError:
 from glance_store.common import utils
 from glance_store import driver
 from glance_store import exceptions
-from glance_store.i18n import _, _LI, _LE
+from glance_store.i18n import _, _LI, _LE, _LW
 from glance_store import location
 
 # For compability with OpenStack Glance Store Juno
@@ -58,6 +73,20 @@ import scality_sproxyd_client.exceptions
 from scality_sproxyd_client import sproxyd_client
 import scality_sproxyd_client.utils
 
+from scality_glance_store import balancer
+from scality_glance_store import cache
+from scality_glance_store import chunked
+from scality_glance_store import compression
+from scality_glance_store import concurrency
+from scality_glance_store import connpool
+from scality_glance_store import hashing
+from scality_glance_store import hedging
+from scality_glance_store import metrics
+from scality_glance_store import pipeline
+from scality_glance_store import prefetch
+from scality_glance_store import resumable
+from scality_glance_store import singleflight
+
 
 LOG = logging.getLogger(__name__)
 logging.getLogger('urllib3.util.retry').level = logging.INFO
@@ -67,10 +96,256 @@ _SPROXYD_OPTS = [
                 help=_("Comma-separated list of Sproxyd endpoints which "
                        "accept queries 'by path' (e.g. 'http://10.5.9.2:81/"
                        "proxy/chord_path/')")),
+    cfg.IntOpt('scality_sproxyd_pool_size', default=32,
+               help=_("Maximum number of idle keep-alive connections kept "
+                      "open to each Sproxyd endpoint.")),
+    cfg.IntOpt('scality_sproxyd_idle_timeout', default=0,
+               help=_("Close the keep-alive connections to Sproxyd which "
+                      "stayed idle for more than this number of seconds, "
+                      "rather than reusing them. Set it below the "
+                      "keep-alive timeout of the Sproxyd endpoints. 0 "
+                      "reuses connections regardless of their idle "
+                      "time.")),
+    cfg.BoolOpt('scality_sproxyd_load_balancing', default=False,
+                help=_("Send each request to the Sproxyd endpoint with the "
+                       "lowest load, measured from its latency and number "
+                       "of pending requests, instead of round-robin. "
+                       "Endpoints failing repeatedly are taken out of "
+                       "rotation until they answer health checks again.")),
+    cfg.IntOpt('scality_upload_chunk_size', default=64 * units.Ki, min=1,
+               help=_("Size in bytes of the chunks read from an image being "
+                      "uploaded.")),
+    cfg.IntOpt('scality_download_chunk_size', default=64 * units.Ki, min=1,
+               help=_("Size in bytes of the chunks of an image handed to "
+                      "Glance when it's downloaded. Sproxyd data is read "
+                      "64 KiB at a time, larger values regroup these "
+                      "reads.")),
+    cfg.BoolOpt('scality_adaptive_chunk_size', default=False,
+                help=_("Grow (or shrink) the chunk sizes during each "
+                       "transfer, depending on the measured throughput. "
+                       "The chunk size options above are then the "
+                       "initial sizes.")),
+    cfg.IntOpt('scality_max_chunk_size', default=4 * units.Mi,
+               help=_("Maximum size in bytes of a chunk when adaptive "
+                      "chunk sizes are enabled. This bounds the memory "
+                      "used by each transfer.")),
+    cfg.BoolOpt('scality_file_uploads', default=False,
+                help=_("Upload images backed by a regular file, whose size "
+                       "is known, with a PUT of known length sending the "
+                       "file from a memory mapping, and hash the file in "
+                       "parallel. Ignored for multi-part, compressed or "
+                       "deduplicated uploads.")),
+    cfg.IntOpt('scality_upload_part_size', default=0,
+               help=_("Size in megabytes of the parts an image is split "
+                      "into to be uploaded in parallel. Each part is stored "
+                      "under its own key and a manifest listing the parts "
+                      "is stored under the image id. 0 disables multi-part "
+                      "uploads.")),
+    cfg.BoolOpt('scality_sparse_uploads', default=False,
+                help=_("Don't upload the regions of images made of zeros, "
+                       "only record them in the manifest of multi-part "
+                       "images. Ignored unless multi-part uploads are "
+                       "enabled.")),
+    cfg.BoolOpt('scality_resumable_uploads', default=False,
+                help=_("Keep the parts of a multi-part upload which failed, "
+                       "recording them in a checkpoint object, so that a "
+                       "retried upload of the same image only sends the "
+                       "parts it doesn't have. Ignored unless multi-part "
+                       "uploads are enabled.")),
+    cfg.IntOpt('scality_checkpoint_ttl', default=86400,
+               help=_("Number of seconds after which the parts kept for a "
+                      "failed upload, and its checkpoint, are deleted if "
+                      "the upload was not retried.")),
+    cfg.IntOpt('scality_upload_concurrency', default=4,
+               help=_("Maximum number of parts of an image being uploaded "
+                      "at the same time when multi-part uploads are "
+                      "enabled.")),
+    cfg.IntOpt('scality_upload_pipeline_depth', default=0,
+               help=_("When greater than 0, images being uploaded are read, "
+                      "hashed and sent by separate workers, connected by "
+                      "queues holding at most this number of chunks, so "
+                      "that checksum and signature computations overlap "
+                      "network transfers. 0 hashes chunks inline.")),
+    cfg.IntOpt('scality_download_segment_size', default=0,
+               help=_("Size in megabytes of the byte ranges an image is "
+                      "split into to be downloaded in parallel from the "
+                      "Sproxyd endpoints. 0 disables segmented downloads.")),
+    cfg.IntOpt('scality_download_concurrency', default=4,
+               help=_("Maximum number of segments of an image being "
+                      "downloaded (and held in memory) at the same time "
+                      "when segmented downloads are enabled.")),
+    cfg.IntOpt('scality_read_ahead_depth', default=0,
+               help=_("Number of chunks of an image read from Sproxyd ahead "
+                      "of Glance, by a background worker, so that reading "
+                      "and sending the image overlap. 0 disables read "
+                      "ahead.")),
+    cfg.IntOpt('scality_read_ahead_max_size', default=8,
+               help=_("Maximum size in megabytes of the chunks read ahead "
+                      "for each image being downloaded.")),
+    cfg.IntOpt('scality_read_retries', default=0,
+               help=_("Number of times a download is resumed when its "
+                      "connection to Sproxyd breaks, by requesting the "
+                      "rest of the object from the next Sproxyd endpoint. "
+                      "0 disables it.")),
+    cfg.FloatOpt('scality_hedge_delay', default=0,
+                 help=_("Number of seconds after which a GET request to "
+                        "Sproxyd which got no response is sent again to "
+                        "the next Sproxyd endpoint, the first response "
+                        "being used. 0 disables hedged requests.")),
+    cfg.IntOpt('scality_hedge_percentile', default=0,
+               help=_("When not 0, GET requests are hedged after this "
+                      "percentile of the latency of the recent requests, "
+                      "rather than after 'scality_hedge_delay' (which is "
+                      "still used until enough requests were made).")),
+    cfg.FloatOpt('scality_hedge_max_ratio', default=0.05,
+                 help=_("Maximum ratio of the GET requests which are "
+                        "hedged, so that hedging doesn't overload a slow "
+                        "cluster.")),
+    cfg.StrOpt('scality_cache_dir',
+               help=_("Local directory where the images read from the Ring "
+                      "are cached, to serve the following reads. The cache "
+                      "is disabled when not set.")),
+    cfg.IntOpt('scality_cache_max_size', default=10 * units.Ki,
+               help=_("Maximum size in megabytes of the image cache. The "
+                      "least recently used images are evicted first.")),
+    cfg.BoolOpt('scality_coalesce_reads', default=False,
+                help=_("Serve concurrent full reads of the same image from "
+                       "a single stream from the Ring.")),
+    cfg.IntOpt('scality_coalesce_buffer_size', default=64,
+               help=_("Size in megabytes of the buffer shared by the "
+                      "readers of a coalesced stream. A reader lagging "
+                      "further behind the fastest one switches to a stream "
+                      "of its own.")),
+    cfg.BoolOpt('scality_conditional_delete', default=False,
+                help=_("Delete images with a single conditional DELETE "
+                       "request instead of a HEAD followed by a DELETE. "
+                       "Sproxyd must then answer 404 or 412 for images "
+                       "which do not exist. Multi-part and deduplicated "
+                       "images are only detected by the HEAD, so this is "
+                       "ignored when multi-part uploads or dedupe are "
+                       "enabled, and must not be enabled if such images "
+                       "were ever stored: the parts of multi-part images "
+                       "would not be deleted, and the reference counts of "
+                       "deduplicated content would not be decremented, so "
+                       "that this content would never be deleted.")),
+    cfg.IntOpt('scality_not_found_cache_ttl', default=0,
+               help=_("How long in seconds to remember that an image does "
+                      "not exist in the Ring, so that deleting it again, or "
+                      "getting its size, fails without a request to "
+                      "Sproxyd. 0 disables this cache.")),
+    cfg.IntOpt('scality_size_cache_ttl', default=0,
+               help=_("How long in seconds to remember the size of an "
+                      "image, so that getting it again needs no request to "
+                      "Sproxyd. Images are never modified, but an image "
+                      "deleted through another glance-api process may "
+                      "still have a size for that long. 0 disables this "
+                      "cache.")),
+    cfg.IntOpt('scality_size_cache_max_entries', default=4096,
+               help=_("Maximum number of image sizes remembered.")),
+    cfg.StrOpt('scality_hash_algorithm',
+               help=_("Hash algorithm computed on images being uploaded, in "
+                      "the same pass as their MD5 checksum: any algorithm "
+                      "of Python's hashlib (e.g. sha256, sha512), or adler32 "
+                      "or crc32 for fast non-cryptographic checksums. Its "
+                      "name and value are returned in the location "
+                      "metadata of the image, as 'hash_algo' and "
+                      "'hash_value'. Not computed when not set.")),
+    cfg.BoolOpt('scality_compression', default=False,
+                help=_("Compress images stored as single objects with zlib "
+                       "while uploading them, and decompress them when "
+                       "they are read. Images are read whole to serve "
+                       "partial reads.")),
+    cfg.IntOpt('scality_compression_level', default=1,
+               help=_("zlib compression level, from 1 (fastest) to 9 "
+                      "(smallest).")),
+    cfg.BoolOpt('scality_dedupe', default=False,
+                help=_("Store the content of identical images once. Each "
+                       "image is then a reference to content addressed by "
+                       "its SHA-256 digest, deleted with the last image "
+                       "referencing it.")),
+    cfg.BoolOpt('scality_verify_uploads', default=False,
+                help=_("Check the MD5 checksum of an uploaded image against "
+                       "the ETag returned by Sproxyd, if any, and record "
+                       "its checksum and size in the metadata of the "
+                       "object, so that `Store.verify` can check it without "
+                       "reading it back.")),
+    cfg.IntOpt('scality_delete_concurrency', default=16,
+               help=_("Maximum number of images deleted at the same time "
+                      "by a bulk deletion.")),
+    cfg.StrOpt('scality_metrics_sink',
+               help=_("Where to send the metrics of the store: "
+                      "'prometheus', or the import path of a subclass of "
+                      "scality_glance_store.metrics.Sink. No metrics are "
+                      "collected by default.")),
+    cfg.IntOpt('scality_metrics_port', default=0,
+               help=_("Port serving the metrics to Prometheus over HTTP, "
+                      "with the 'prometheus' sink. 0 doesn't serve them.")),
 ]
 
 SCALITY_SCHEME = 'scality'
 
+# Header in which Sproxyd stores the user metadata of an object
+USERMD_HEADER = 'X-Scal-Usermd'
+
+# Value of the 'layout' user metadata of a multi-part image manifest
+MANIFEST_LAYOUT = 'manifest'
+
+# Value of the 'layout' user metadata of an image referencing deduplicated
+# content
+REFERENCE_LAYOUT = 'reference'
+
+# Hash algorithm addressing deduplicated content
+DEDUPE_ALGORITHM = 'sha256'
+
+# An ETag which is an MD5 checksum
+_MD5_RE = re.compile('^[0-9a-f]{32}$')
+
+# Errors of a connection broken while an object is read
+_TRANSPORT_ERRORS = (sproxyd_client.urllib3.exceptions.HTTPError,
+                     httplib.HTTPException, socket.error)
+
+# Outcomes of the deletion of an image by `Store.delete_many`
+DELETED = 'deleted'
+NOT_FOUND = 'not found'
+ERROR = 'error'
+
+DeleteResult = collections.namedtuple('DeleteResult',
+                                      ['image_id', 'status', 'error'])
+
+
+def _metered(operation, streamed=False):
+    """
+    Decorator of the `Store` method implementing `operation`, recording its
+    duration and errors in the metrics of the store, if any. The duration of
+    `streamed` operations is recorded once their data is read (see
+    `metrics.metered`), unless they fail right away.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            sink = self._metrics
+            if sink is None:
+                return func(self, *args, **kwargs)
+
+            labels = {'operation': operation}
+            start = time.time()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as exc:
+                sink.increment(metrics.OPERATION_ERRORS,
+                               labels={'operation': operation,
+                                       'error': type(exc).__name__})
+                sink.observe(metrics.OPERATION_SECONDS, time.time() - start,
+                             labels)
+                raise
+
+            if not streamed:
+                sink.observe(metrics.OPERATION_SECONDS, time.time() - start,
+                             labels)
+            return result
+        return wrapper
+    return decorator
+
 
 class ResponseIndexable(backend.Indexable):
     def another(self):
@@ -80,6 +355,309 @@ class ResponseIndexable(backend.Indexable):
             return ''
 
 
+def _get_range_header(offset, chunk_size):
+    """Build the value of an HTTP `Range` header for a partial read."""
+    if chunk_size:
+        return 'bytes=%d-%d' % (offset, offset + chunk_size - 1)
+    return 'bytes=%d-' % offset
+
+
+def _slice_iterator(iterator, offset, length):
+    """
+    Skip the first `offset` bytes of `iterator` then yield at most `length`
+    bytes (or everything left if `length` is None).
+    """
+    for chunk in iterator:
+        if offset:
+            if offset >= len(chunk):
+                offset -= len(chunk)
+                continue
+            chunk = chunk[offset:]
+            offset = 0
+        if length is not None:
+            if length <= 0:
+                break
+            chunk = chunk[:length]
+            length -= len(chunk)
+        yield chunk
+
+
+def _get_response_range(headers):
+    """
+    The range of the object returned in a response to a GET, as a (start,
+    stop) tuple.
+    """
+    content_range = headers.get('Content-Range')
+    if content_range:
+        start, end = content_range.split()[-1].split('/')[0].split('-')
+        return int(start), int(end) + 1
+    return 0, int(headers['Content-Length'])
+
+
+def _is_whole_object(headers):
+    """Whether a response to a GET, of which `headers` are the headers,
+    holds the whole object."""
+    content_range = headers.get('Content-Range')
+    if not content_range:
+        return True
+    size = int(content_range.rsplit('/', 1)[1])
+    return _get_response_range(headers) == (0, size)
+
+
+def _close(data_iterator):
+    """
+    Close `data_iterator`, the data of a response, which drops the connection
+    of the response unless it was read to its end.
+    """
+    close = getattr(data_iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+def _resume_on_error(key, chunks, start, stop, reopen, retries):
+    """
+    Yield the bytes of `chunks`, the range [start, stop) of object `key`. If
+    the connection breaks, or the data ends before `stop`, `reopen(offset)`
+    is called to get the rest of the object from `offset` on, at most
+    `retries` times.
+    """
+    offset = start
+    try:
+        while True:
+            try:
+                for chunk in chunks:
+                    offset += len(chunk)
+                    yield chunk
+                if offset >= stop:
+                    return
+                # urllib3 doesn't check the Content-Length of responses: a
+                # connection closed early just ends the body
+                raise httplib.IncompleteRead('', stop - offset)
+            except _TRANSPORT_ERRORS as exc:
+                if offset >= stop:
+                    return
+                if not retries:
+                    raise
+                LOG.warning(_LW("Connection broken while reading %(key)s, "
+                                "resuming at byte %(offset)d: %(exc)r"),
+                            dict(key=key, offset=offset, exc=exc))
+
+            _close(chunks)
+            while True:
+                retries -= 1
+                try:
+                    chunks = reopen(offset)
+                    break
+                except scality_sproxyd_client.exceptions.SproxydException \
+                        as exc:
+                    if not retries:
+                        raise
+                    LOG.warning(_LW("Could not resume reading %(key)s: "
+                                    "%(exc)r"), dict(key=key, exc=exc))
+    finally:
+        # Also drops the connection if the reader stopped early
+        _close(chunks)
+
+
+def _iter_views(mapping, offset, size, chunk_size):
+    """
+    Yield buffers over `size` bytes of `mapping` from `offset`, of
+    `chunk_size` bytes at most, without copying them.
+    """
+    for start in xrange(offset, offset + size, chunk_size):
+        yield buffer(mapping, start, min(chunk_size, offset + size - start))
+
+
+def _send_file(sock, mapping, offset, size, chunk_size):
+    """
+    Send `size` bytes of `mapping`, the memory mapping of a file, from
+    `offset` over `sock`.
+    """
+    for view in _iter_views(mapping, offset, size, chunk_size):
+        sock.sendall(view)
+
+
+def _hash_file(mapping, offset, size, hashers, chunk_size, cancelled):
+    """
+    Feed `size` bytes of `mapping`, the memory mapping of a file, from
+    `offset` to `hashers`, until `cancelled` (an Event) is set.
+    """
+    for view in _iter_views(mapping, offset, size, chunk_size):
+        if cancelled.is_set():
+            return
+        for hasher in hashers:
+            hasher.update(view)
+
+
+class _CopyingHasher(object):
+    """
+    Feed `hasher` with a string copy of the data it's given, for hashers
+    which don't accept buffers (e.g. signature verifiers).
+    """
+
+    def __init__(self, hasher):
+        self._hasher = hasher
+
+    def update(self, data):
+        self._hasher.update(str(data))
+
+
+def _iter_parts(chunks, part_size):
+    """
+    Regroup the chunks yielded by `chunks` in parts of `part_size` bytes. The
+    last part may be smaller.
+    """
+    buf, buffered = [], 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buffered += len(chunk)
+        if buffered >= part_size:
+            data = ''.join(buf)
+            while len(data) >= part_size:
+                yield data[:part_size]
+                data = data[part_size:]
+            buf, buffered = [data], len(data)
+
+    if buffered:
+        yield ''.join(buf)
+
+
+# Runs of zeros shorter than this are uploaded anyway by sparse uploads, not to
+# split images in too many parts
+SPARSE_MIN_HOLE_SIZE = units.Mi
+
+# Strings of zeros, by length, to tell which chunks are made of zeros
+_ZEROS = {}
+
+
+def _is_zero(chunk):
+    """Whether `chunk` is made of zeros."""
+    zeros = _ZEROS.get(len(chunk))
+    if zeros is None:
+        zeros = '\0' * len(chunk)
+        # Chunks mostly have the same size
+        if len(_ZEROS) < 16:
+            _ZEROS[len(chunk)] = zeros
+    return chunk == zeros
+
+
+def _iter_extents(chunks, part_size, min_hole_size):
+    """
+    Same as `_iter_parts`, but runs of chunks made of zeros at least
+    `min_hole_size` bytes long are yielded as holes, which end the current
+    part. Shorter runs are kept in the parts.
+
+    :retval iterator over (part, size) tuples, part being None for holes
+    """
+    buf, buffered = [], 0
+    hole = 0
+    # None marks the end of the chunks, to deal with a trailing hole
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is not None and _is_zero(chunk):
+            hole += len(chunk)
+            continue
+
+        if hole >= min_hole_size:
+            for part in _iter_parts(buf, part_size):
+                yield part, len(part)
+            buf, buffered = [], 0
+            yield None, hole
+        elif hole:
+            buf.append('\0' * hole)
+            buffered += hole
+        hole = 0
+
+        if chunk is not None:
+            buf.append(chunk)
+            buffered += len(chunk)
+        if buffered >= part_size:
+            data = ''.join(buf)
+            while len(data) >= part_size:
+                yield data[:part_size], part_size
+                data = data[part_size:]
+            buf, buffered = [data], len(data)
+
+    if buffered:
+        yield ''.join(buf), buffered
+
+
+def _split_range(key, start, stop, segment_size):
+    """
+    Split the byte range [`start`, `stop`) of the object stored under `key`
+    in segments of at most `segment_size` bytes.
+    """
+    for segment_start in xrange(start, stop, segment_size):
+        yield key, segment_start, min(segment_start + segment_size, stop)
+
+
+def _get_manifest_ranges(parts, offset, length):
+    """
+    Find which bytes of which parts of a multi-part image must be read to get
+    `length` bytes starting at `offset`.
+
+    :retval list of (key, start, stop, part_size) tuples
+    """
+    end = offset + length
+    ranges = []
+    part_start = 0
+    for key, part_size in parts:
+        part_end = part_start + part_size
+        if part_start >= end:
+            break
+
+        if part_end > offset:
+            ranges.append((key, max(offset - part_start, 0),
+                           min(end, part_end) - part_start, part_size))
+
+        part_start = part_end
+
+    return ranges
+
+
+def _new_upload_id():
+    """
+    A new identifier of a multi-part upload, which sets the keys of its
+    parts apart from the ones of other uploads of the same image.
+    """
+    return uuid.uuid4().hex[:12]
+
+
+def _get_part_key(image_id, upload_id, index):
+    """
+    Key under which part number `index` of an image is stored by upload
+    `upload_id`.
+    """
+    return '%s.%s.part%05d' % (image_id, upload_id, index)
+
+
+def _get_blob_key(image_id):
+    """Key under which the content of an image is uploaded, with dedupe."""
+    return '%s.blob' % image_id
+
+
+def _get_dedupe_key(digest):
+    """Key of the index object of the content with SHA-256 `digest`."""
+    return 'dedupe-%s-%s' % (DEDUPE_ALGORITHM, digest)
+
+
+def _encode_usermd(metadata):
+    """Encode user metadata the same way `SproxydClient.put_meta` does."""
+    return base64.b64encode(pickle.dumps(metadata))
+
+
+def _decode_usermd(headers):
+    """
+    Decode the user metadata found in the headers of a Sproxyd response, the
+    same way `SproxydClient.get_meta` does.
+    """
+    usermd = headers.get(USERMD_HEADER)
+    if not usermd:
+        return {}
+
+    metadata = pickle.loads(base64.b64decode(usermd))
+    return metadata if isinstance(metadata, dict) else {}
+
+
 class StoreLocation(location.StoreLocation):
     """
     Class describing a relative Sproxyd URI.
@@ -110,6 +688,7 @@ class Store(driver.Store):
 
     if capabilities:
         _CAPABILITIES = (capabilities.BitMasks.RW_ACCESS |
+                         capabilities.BitMasks.READ_RANDOM |
                          capabilities.BitMasks.DRIVER_REUSABLE)
     CHUNKSIZE = 64 * units.Ki
     OPTIONS = _SPROXYD_OPTS
@@ -123,13 +702,149 @@ class Store(driver.Store):
             LOG.error(msg)
             raise exceptions.BadStoreConfiguration(store_name='scality',
                                                    reason=msg)
-        self._sproxyd_client = sproxyd_client.SproxydClient(endpoints)
+        glance_conf = self.conf.glance_store
+
+        self._metrics = None
+        if glance_conf.scality_metrics_sink:
+            self._metrics = self._load_metrics_sink(
+                glance_conf.scality_metrics_sink,
+                glance_conf.scality_metrics_port)
+
+        self._hedger = None
+        if glance_conf.scality_hedge_delay:
+            if len(endpoints) < 2:
+                LOG.warning(_LW("Hedged requests are disabled, as they "
+                                "require several Sproxyd endpoints"))
+            else:
+                self._hedger = hedging.Hedger(
+                    glance_conf.scality_hedge_delay,
+                    glance_conf.scality_hedge_percentile,
+                    glance_conf.scality_hedge_max_ratio)
+
+        if glance_conf.scality_sproxyd_load_balancing:
+            client_class = balancer.BalancedSproxydClient
+        else:
+            client_class = sproxyd_client.SproxydClient
+        # Data left unread drops its connection
+        client_class = connpool.releasing(client_class)
+        if self._hedger is not None:
+            # Hedged requests are sent to another endpoint
+            client_class = hedging.endpoint_avoiding(client_class)
+        if self._metrics is not None:
+            client_class = metrics.instrumented(client_class)
+            self._sproxyd_client = client_class(endpoints, sink=self._metrics)
+        else:
+            self._sproxyd_client = client_class(endpoints)
+        connpool.configure(self._sproxyd_client,
+                           glance_conf.scality_sproxyd_pool_size,
+                           glance_conf.scality_sproxyd_idle_timeout)
+
+        self._upload_chunk_size = glance_conf.scality_upload_chunk_size
+        self._file_uploads = glance_conf.scality_file_uploads
+        self._download_chunk_size = glance_conf.scality_download_chunk_size
+        self._adaptive_chunk_size = glance_conf.scality_adaptive_chunk_size
+        self._max_chunk_size = glance_conf.scality_max_chunk_size
+        self._upload_part_size = (glance_conf.scality_upload_part_size *
+                                  units.Mi)
+        self._upload_concurrency = glance_conf.scality_upload_concurrency
+        self._sparse_uploads = glance_conf.scality_sparse_uploads
+        if self._sparse_uploads and not self._upload_part_size:
+            LOG.warning(_LW("Sparse uploads are disabled, as they require "
+                            "multi-part uploads"))
+            self._sparse_uploads = False
+        self._resumable_uploads = glance_conf.scality_resumable_uploads
+        if self._resumable_uploads and not self._upload_part_size:
+            LOG.warning(_LW("Resumable uploads are disabled, as they "
+                            "require multi-part uploads"))
+            self._resumable_uploads = False
+        self._checkpoint_ttl = glance_conf.scality_checkpoint_ttl
+        self._checkpoints = resumable.Collector(self._checkpoint_ttl)
+        self._upload_pipeline_depth = (
+            glance_conf.scality_upload_pipeline_depth)
+        self._download_segment_size = (
+            glance_conf.scality_download_segment_size * units.Mi)
+        self._download_concurrency = glance_conf.scality_download_concurrency
+        self._read_retries = glance_conf.scality_read_retries
+        self._read_ahead_depth = glance_conf.scality_read_ahead_depth
+        self._read_ahead_max_size = (glance_conf.scality_read_ahead_max_size *
+                                     units.Mi)
+
+        self._cache = None
+        if glance_conf.scality_cache_dir:
+            self._cache = cache.ImageCache(
+                glance_conf.scality_cache_dir,
+                glance_conf.scality_cache_max_size * units.Mi)
+
+        self._shared_streams = None
+        if glance_conf.scality_coalesce_reads:
+            self._shared_streams = singleflight.SharedStreams(
+                glance_conf.scality_coalesce_buffer_size * units.Mi)
+
+        self._compression = glance_conf.scality_compression
+        self._compression_level = glance_conf.scality_compression_level
+        self._dedupe = glance_conf.scality_dedupe
+
+        self._conditional_delete = glance_conf.scality_conditional_delete
+        if self._conditional_delete and (self._upload_part_size or
+                                         self._dedupe):
+            LOG.warning(_LW("Conditional deletes are disabled, as they "
+                            "can't be used with multi-part uploads or "
+                            "dedupe"))
+            self._conditional_delete = False
+
+        self._hash_algorithm = glance_conf.scality_hash_algorithm
+        if self._hash_algorithm:
+            self._hash_algorithm = self._hash_algorithm.lower()
+            try:
+                hashing.new(self._hash_algorithm)
+            except ValueError:
+                msg = (_("Unsupported 'scality_hash_algorithm' %s in "
+                         "glance-api.conf") % self._hash_algorithm)
+                LOG.error(msg)
+                raise exceptions.BadStoreConfiguration(store_name='scality',
+                                                       reason=msg)
+
+        self._verify_uploads = glance_conf.scality_verify_uploads
+        self._delete_concurrency = glance_conf.scality_delete_concurrency
+
+        self._not_found = None
+        if glance_conf.scality_not_found_cache_ttl:
+            self._not_found = cache.TTLCache(
+                glance_conf.scality_not_found_cache_ttl)
+
+        self._sizes = None
+        if glance_conf.scality_size_cache_ttl:
+            self._sizes = cache.TTLCache(
+                glance_conf.scality_size_cache_ttl,
+                glance_conf.scality_size_cache_max_entries)
+
+    @staticmethod
+    def _load_metrics_sink(name, port):
+        try:
+            sink = metrics.load_sink(name)
+        except ImportError:
+            msg = (_("Can't import 'scality_metrics_sink' %s in "
+                     "glance-api.conf") % name)
+            LOG.error(msg)
+            raise exceptions.BadStoreConfiguration(store_name='scality',
+                                                   reason=msg)
+
+        if port and isinstance(sink, metrics.PrometheusSink):
+            try:
+                sink.serve(port)
+            except socket.error as exc:
+                # Another worker process may serve its own metrics there
+                LOG.warning(_LW("Could not serve the metrics of the store on "
+                                "port %(port)d: %(exc)s"),
+                            dict(port=port, exc=exc))
+        return sink
 
     @staticmethod
     def get_schemes():
         return (SCALITY_SCHEME,)
 
     @capabilities_check
+    @_metered('get', streamed=True)
     def get(self, location, offset=0, chunk_size=None, context=None):
         """
         Takes a `glance_store.location.Location` object that indicates
@@ -138,24 +853,348 @@ class Store(driver.Store):
 
         :param location `glance_store.location.Location` object, supplied
                         from glance_store.location.get_location_from_uri()
+        :param offset: offset to start reading
+        :param chunk_size: size to read, or None to get all the image
         """
 
+        start = time.time()
         image = location.store_location.image_id
 
+        if self._cache:
+            cached = self._cache.open(image, offset, chunk_size or None,
+                                      self._download_chunk_size)
+            if cached:
+                data_iterator, content_length = cached
+                return self._respond(data_iterator, content_length, start)
+
+        if offset or chunk_size:
+            data_iterator, content_length = self._read(image, offset,
+                                                       chunk_size)
+        elif self._shared_streams is not None:
+            stream = self._shared_streams.get(
+                image, lambda: self._read_full(image),
+                lambda offset: self._read(image, offset)[0])
+            content_length = stream.open()
+            data_iterator = stream.read()
+        else:
+            data_iterator, content_length = self._read_full(image)
+
+        if self._adaptive_chunk_size:
+            sizer = chunked.ChunkSizer(self._download_chunk_size,
+                                       self._max_chunk_size)
+            data_iterator = chunked.coalesce(data_iterator, sizer)
+        elif self._download_chunk_size > self.CHUNKSIZE:
+            sizer = chunked.ChunkSizer(self._download_chunk_size,
+                                       self._download_chunk_size)
+            data_iterator = chunked.coalesce(data_iterator, sizer)
+
+        return self._respond(data_iterator, content_length, start)
+
+    def _respond(self, data_iterator, content_length, start):
+        """The response to a get started at `start`."""
+        if self._read_ahead_depth:
+            data_iterator = prefetch.ReadAhead(data_iterator,
+                                               self._read_ahead_depth,
+                                               self._read_ahead_max_size)
+        if self._metrics is not None:
+            data_iterator = metrics.metered(data_iterator, self._metrics,
+                                            'get', start)
+        return (ResponseIndexable(data_iterator, content_length),
+                content_length)
+
+    def _read_full(self, image):
+        """Same as `_read` for a full image, filling the cache if any."""
+        data_iterator, content_length = self._read(image)
+        if self._cache:
+            data_iterator = self._cache.fill(image, data_iterator,
+                                             content_length)
+
+        return data_iterator, content_length
+
+    def _read(self, key, offset=0, chunk_size=None):
+        """
+        Returns an iterator over the bytes stored under `key`, starting at
+        `offset` and limited to `chunk_size` bytes if it's not None, and the
+        number of bytes the iterator will yield.
+
+        Manifests of multi-part images are followed transparently.
+        """
+        segment_size = self._download_segment_size
+        request_headers = None
+        if segment_size:
+            # Only get the first segment, and learn the object size
+            request_headers = {'Range': _get_range_header(
+                offset, min(segment_size, chunk_size or segment_size))}
+        elif offset or chunk_size:
+            request_headers = {'Range': _get_range_header(offset, chunk_size)}
+
         try:
-            headers, data_iterator = self._sproxyd_client.get_object(image)
+            headers, data_iterator = self._get_object(key, request_headers)
         except scality_sproxyd_client.exceptions.SproxydException as exc:
+            if getattr(exc, 'http_status', None) == 416:
+                # The requested range starts beyond the end of the object.
+                # This object may be a (small) manifest or reference though.
+                usermd = self._get_usermd(key)
+                if usermd.get('layout') == MANIFEST_LAYOUT:
+                    return self._read_manifest(key, offset, chunk_size)
+                if usermd.get('layout') == REFERENCE_LAYOUT:
+                    return self._read(usermd['target'], offset, chunk_size)
+                if usermd.get('codec'):
+                    return self._read_compressed(key, usermd, offset,
+                                                 chunk_size)
+
+                LOG.info(_LI("Offset %(offset)d is beyond the end of "
+                             "image %(iid)s"), dict(offset=offset, iid=key))
+                return iter([]), 0
+
             reason = _LE("Remote server where the image %r is present "
                          "is unavailable : %r")
-            LOG.error(reason, image, exc)
+            LOG.error(reason, key, exc)
             raise exceptions.RemoteServiceUnavailable()
 
-        content_length = headers['Content-Length']
+        usermd = _decode_usermd(headers)
+        if usermd.get('layout') in (MANIFEST_LAYOUT, REFERENCE_LAYOUT) or \
+                usermd.get('codec'):
+            # Manifests and compressed objects are read from their start, so
+            # a ranged response is only of use if it holds the whole object
+            if not _is_whole_object(headers):
+                _close(data_iterator)
+                data_iterator = None
+        if usermd.get('layout') == MANIFEST_LAYOUT:
+            return self._read_manifest(key, offset, chunk_size,
+                                       data_iterator)
+        if usermd.get('layout') == REFERENCE_LAYOUT:
+            if data_iterator is not None:
+                _close(data_iterator)
+            return self._read(usermd['target'], offset, chunk_size)
+        if usermd.get('codec'):
+            return self._read_compressed(key, usermd, offset, chunk_size,
+                                         data_iterator)
 
-        return (ResponseIndexable(data_iterator, content_length),
-                content_length)
+        content_length = int(headers['Content-Length'])
+
+        if request_headers and 'Content-Range' not in headers:
+            # Sproxyd ignored the Range header and answered 200 with the
+            # full object, so we have to do the slicing ourself.
+            content_length = max(content_length - offset, 0)
+            if chunk_size:
+                content_length = min(content_length, chunk_size)
+            data_iterator = _slice_iterator(data_iterator, offset,
+                                            content_length)
+        elif segment_size:
+            size = int(headers['Content-Range'].rsplit('/', 1)[1])
+            start = offset + content_length
+            stop = min(offset + chunk_size, size) if chunk_size else size
+            if start < stop:
+                data_iterator = itertools.chain(
+                    data_iterator,
+                    self._iter_segments(_split_range(key, start, stop,
+                                                     segment_size)))
+            content_length = max(stop - offset, 0)
+
+        return data_iterator, content_length
+
+    def _read_compressed(self, key, usermd, offset, chunk_size,
+                         data_iterator=None):
+        """
+        Same as `_read` for a compressed object, of which `usermd` is the
+        user metadata. A partial read still has to read and decompress the
+        object from its start.
+        """
+        if 'size' not in usermd:
+            if data_iterator is not None:
+                _close(data_iterator)
+            raise self._incomplete_image(key)
+        if data_iterator is None:
+            _, data_iterator = self._get_object(key)
+        data_iterator = compression.decompress(data_iterator,
+                                               self._download_chunk_size)
+
+        content_length = max(usermd['size'] - offset, 0)
+        if chunk_size:
+            content_length = min(content_length, chunk_size)
+        if offset or content_length < usermd['size']:
+            data_iterator = _slice_iterator(data_iterator, offset,
+                                            content_length)
+
+        return data_iterator, content_length
+
+    def _get_usermd(self, key):
+        try:
+            headers = self._sproxyd_client.head(key)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            reason = _LE("Remote server where the image %r is present "
+                         "is unavailable : %r")
+            LOG.error(reason, key, exc)
+            raise exceptions.RemoteServiceUnavailable()
+
+        return _decode_usermd(headers)
+
+    def _load_manifest(self, key, data_iterator=None):
+        """Read and decode the manifest of a multi-part image."""
+        if data_iterator is None:
+            _, data_iterator = self._get_object(key)
+
+        return json.loads(''.join(data_iterator))
+
+    def _read_manifest(self, key, offset, chunk_size, data_iterator=None):
+        """Same as `_read` for a multi-part image manifest."""
+        try:
+            manifest = self._load_manifest(key, data_iterator)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            reason = _LE("Remote server where the image %r is present "
+                         "is unavailable : %r")
+            LOG.error(reason, key, exc)
+            raise exceptions.RemoteServiceUnavailable()
+
+        content_length = max(manifest['size'] - offset, 0)
+        if chunk_size:
+            content_length = min(content_length, chunk_size)
+
+        ranges = _get_manifest_ranges(manifest['parts'], offset,
+                                      content_length)
+
+        if self._download_segment_size:
+            return self._iter_manifest_segments(ranges), content_length
+
+        return self._iter_manifest(ranges), content_length
+
+    def _iter_zeros(self, size):
+        """Yield `size` zeros, standing for a hole of a sparse image."""
+        chunk_size = self._download_chunk_size
+        zeros = '\0' * min(chunk_size, size)
+        for _chunk in xrange(size // chunk_size):
+            yield zeros
+        if size % chunk_size:
+            yield zeros[:size % chunk_size]
+
+    def _iter_manifest_segments(self, ranges):
+        """
+        Same as `_iter_manifest`, downloading the parts in segments (see
+        `_iter_segments`).
+        """
+        for is_hole, group in itertools.groupby(ranges,
+                                                lambda r: r[0] is None):
+            if is_hole:
+                for _key, start, stop, _part_size in group:
+                    for chunk in self._iter_zeros(stop - start):
+                        yield chunk
+                continue
+
+            segments = itertools.chain.from_iterable(
+                _split_range(key, start, stop, self._download_segment_size)
+                for key, start, stop, _part_size in group)
+            for chunk in self._iter_segments(segments):
+                yield chunk
+
+    def _iter_manifest(self, ranges):
+        """
+        Yield the bytes of a multi-part image found in `ranges` (as returned
+        by `_get_manifest_ranges`), reading the parts one after the other.
+        """
+        for key, start, stop, part_size in ranges:
+            if key is None:
+                for chunk in self._iter_zeros(stop - start):
+                    yield chunk
+                continue
+
+            headers = None
+            if (start, stop) != (0, part_size):
+                headers = {'Range': _get_range_header(start, stop - start)}
+
+            _, data_iterator = self._get_object(key, headers)
+            for chunk in data_iterator:
+                yield chunk
+
+    def _get_segment(self, key, start, stop, cancelled=None):
+        """
+        Get the bytes of object `key` from `start` to `stop`, as a list of
+        chunks, or None if `cancelled` (an Event) was set in the meantime.
+        """
+        if cancelled is not None and cancelled.is_set():
+            return None
+        headers = {'Range': _get_range_header(start, stop - start)}
+        _, data_iterator = self._get_object(key, headers)
+        chunks = []
+        for chunk in data_iterator:
+            if cancelled is not None and cancelled.is_set():
+                # The consumer is gone: drop the connection rather than
+                # reading the rest of the segment
+                _close(data_iterator)
+                return None
+            chunks.append(chunk)
+        return chunks
+
+    def _get_object(self, key, headers=None):
+        """
+        Same as `SproxydClient.get_object`, but the data is read again from
+        where it stopped if the connection breaks, up to
+        `scality_read_retries` times. The request is hedged if it's slow to
+        answer and hedging is enabled.
+        """
+        if self._hedger is not None:
+            # Endpoints the request was sent to, which a hedged request
+            # avoids
+            used = set()
+
+            def request():
+                with self._sproxyd_client.avoiding(used):
+                    return self._sproxyd_client.get_object(key, headers)
+
+            response_headers, data_iterator = self._hedger.call(
+                request, lambda response: _close(response[1]))
+        else:
+            response_headers, data_iterator = \
+                self._sproxyd_client.get_object(key, headers)
+        if self._read_retries:
+            start, stop = _get_response_range(response_headers)
+            data_iterator = _resume_on_error(
+                key, data_iterator, start, stop,
+                lambda offset: self._reopen_object(key, offset, stop),
+                self._read_retries)
+        return response_headers, data_iterator
+
+    def _reopen_object(self, key, offset, stop):
+        """Get the bytes of object `key` from `offset` to `stop`."""
+        headers = {'Range': _get_range_header(offset, stop - offset)}
+        response_headers, data_iterator = self._sproxyd_client.get_object(
+            key, headers)
+        if 'Content-Range' not in response_headers:
+            data_iterator = _slice_iterator(data_iterator, offset,
+                                            stop - offset)
+        return data_iterator
+
+    def _iter_segments(self, segments):
+        """
+        Yield the bytes of `segments`, (key, start, stop) tuples, in order.
+
+        Up to `scality_download_concurrency` segments are downloaded at the
+        same time, each from the next Sproxyd endpoint. Segments downloaded
+        ahead of the one being yielded wait in a bounded reorder buffer.
+        Downloads still running are cancelled when the iterator is closed.
+        """
+        cancelled = threading.Event()
+        segments = iter(segments)
+        pending = collections.deque(
+            concurrency.spawn(self._get_segment, *segment,
+                              cancelled=cancelled)
+            for segment in itertools.islice(segments,
+                                            self._download_concurrency))
+
+        try:
+            while pending:
+                chunks = pending.popleft().wait()
+                for segment in itertools.islice(segments, 1):
+                    pending.append(concurrency.spawn(
+                        self._get_segment, *segment, cancelled=cancelled))
+
+                for chunk in chunks:
+                    yield chunk
+        finally:
+            cancelled.set()
 
     @capabilities_check
+    @_metered('add')
     def add(self, image_id, image_file, image_size, context=None,
             verifier=None):
         """
@@ -173,15 +1212,136 @@ class Store(driver.Store):
                 existed
         """
 
+        if self._not_found:
+            self._not_found.pop(image_id)
+        if self._sizes:
+            self._sizes.pop(image_id)
+
         store_location = StoreLocation({'image_id': image_id}, self.conf)
-        checksum = hashlib.md5()
+        checksum = self._new_checksum()
+
+        if self._dedupe:
+            actual_image_size = self._add_deduplicated(image_id, image_file,
+                                                       checksum, verifier)
+        else:
+            actual_image_size = self._upload(image_id, image_file, checksum,
+                                             verifier, image_size)
+
+        if self._metrics is not None:
+            self._metrics.increment(metrics.BYTES, actual_image_size,
+                                    {'operation': 'add'})
+
+        return (store_location.get_uri(), actual_image_size,
+                checksum.hexdigest(), self._get_hash_metadata(checksum))
+
+    def _upload(self, key, image_file, checksum, verifier, image_size=0):
+        """
+        Upload an image under `key`, feeding its data to `checksum` (and
+        `verifier` if any).
+
+        :retval the size of the image
+        """
+        if self._upload_part_size:
+            return self._add_multipart(key, image_file, checksum, verifier)
+        if self._can_upload_file(image_file, image_size):
+            return self._add_file(key, image_file, image_size, checksum,
+                                  verifier)
+        return self._add_single(key, image_file, checksum, verifier)
+
+    def _can_upload_file(self, image_file, image_size):
+        """
+        Whether `image_file` is a regular file with `image_size` bytes left,
+        which `_add_file` can upload.
+        """
+        if not (self._file_uploads and image_size > 0) or self._compression:
+            return False
+
+        try:
+            file_stat = os.fstat(image_file.fileno())
+            position = image_file.tell()
+        except (AttributeError, EnvironmentError, ValueError):
+            return False
+        return (stat.S_ISREG(file_stat.st_mode) and
+                file_stat.st_size - position >= image_size)
+
+    def _add_file(self, image_id, image_file, image_size, checksum,
+                  verifier):
+        """
+        Upload the next `image_size` bytes of `image_file`, a regular file,
+        as a single object with a PUT of known length. The file is sent from
+        a memory mapping, and hashed from the same mapping by a worker at the
+        same time, without copying it to strings.
+        """
+        offset = image_file.tell()
+        mapping = mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(mapping) < offset + image_size:
+                raise IOError("Only %d bytes out of %d could be read from the "
+                              "file of the image" %
+                              (max(len(mapping) - offset, 0), image_size))
+            return self._add_mapping(image_id, mapping, offset, image_size,
+                                     checksum, verifier)
+        finally:
+            mapping.close()
 
+    def _add_mapping(self, image_id, mapping, offset, image_size, checksum,
+                     verifier):
+        """Same as `_add_file`, with `mapping`, the memory mapping of the
+        file."""
+        headers = {
+            'Content-Length': str(image_size),
+            'If-None-Match': '*'
+        }
+        try:
+            conn, release_conn = \
+                self._sproxyd_client.get_http_conn_for_put(image_id, headers)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            LOG.error(_LE("Error while trying to get an HTTP connection : "
+                          "%r"), exc)
+            raise
+
+        if verifier:
+            verifier = _CopyingHasher(verifier)
+        cancelled = threading.Event()
+        hashing = concurrency.spawn(
+            concurrency.offload, _hash_file, mapping, offset, image_size,
+            self._get_hashers(checksum, verifier), self._upload_chunk_size,
+            cancelled)
+        try:
+            conn.sock.settimeout(conn.timeout)
+            send = _send_file
+            if self._metrics is not None:
+                send = metrics.timed(send, self._metrics,
+                                     metrics.UPLOAD_SEND_SECONDS)
+            send(conn.sock, mapping, offset, image_size,
+                 self._upload_chunk_size)
+            hashing.wait()
+            resp = conn.getresponse()
+        except Exception:
+            # The mapping is closed once the worker is done with it
+            cancelled.set()
+            hashing.join()
+            conn.close()
+            LOG.exception(_LE("Error during upload of image %s to Sproxyd"),
+                          image_id)
+            with excutils.save_and_reraise_exception():
+                self._sproxyd_client.del_object(image_id)
+
+        self._check_put_response(image_id, resp, release_conn, checksum,
+                                 image_size)
+        return image_size
+
+    def _add_single(self, image_id, image_file, checksum, verifier):
+        """Upload an image as a single object, with a chunked PUT."""
         headers = {
             'transfer-encoding': 'chunked',
             # Exclusive PUT - return 412 Precondition Failed if any object with
             # the requested key already exists in the Ring.
             'If-None-Match': '*'
         }
+        if self._compression:
+            headers[USERMD_HEADER] = _encode_usermd(
+                {'codec': compression.ZLIB})
         try:
             conn, release_conn = \
                 self._sproxyd_client.get_http_conn_for_put(image_id, headers)
@@ -196,21 +1356,40 @@ class Store(driver.Store):
         # Content-Length so image_size will be 0. Let's calculate the image
         # size ourself
         actual_image_size = 0
+        # Size of the compressed data
+        stored_size = 0
 
+        hashing = None
         try:
             conn.sock.settimeout(conn.timeout)
-            for chunk in utils.chunkreadable(image_file, self.CHUNKSIZE):
-                chunk_length = len(chunk)
-                actual_image_size += chunk_length
-                conn.send('%x\r\n%s\r\n' % (chunk_length, chunk))
-                checksum.update(chunk)
-
-                if verifier:
-                    verifier.update(chunk)
+            writer = chunked.ChunkedWriter(conn)
+            write = writer.write
+            if self._metrics is not None:
+                write = metrics.timed(write, self._metrics,
+                                      metrics.UPLOAD_SEND_SECONDS)
+            hashing = self._hashing_stage(
+                self._chunkreadable(image_file),
+                checksum, verifier)
+            compressor = None
+            if self._compression:
+                compressor = compression.Compressor(self._compression_level)
+            for chunk in hashing:
+                actual_image_size += len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                    stored_size += len(chunk)
+                write(chunk)
+            if compressor:
+                chunk = compressor.flush()
+                stored_size += len(chunk)
+                write(chunk)
 
-            conn.send('0\r\n\r\n')
+            hashing.close()
+            writer.close()
             resp = conn.getresponse()
         except Exception:
+            if hashing:
+                hashing.abort()
             conn.close()
             conn = None
             LOG.exception(_LE("Error during upload of image %s to Sproxyd"),
@@ -220,10 +1399,31 @@ class Store(driver.Store):
             with excutils.save_and_reraise_exception():
                 self._sproxyd_client.del_object(image_id)
 
+        self._check_put_response(image_id, resp, release_conn, checksum,
+                                 actual_image_size, stored_size)
+        return actual_image_size
+
+    def _check_put_response(self, image_id, resp, release_conn, checksum,
+                            actual_image_size, stored_size=None):
+        """
+        Check the response to the PUT of an image as a single object, and
+        record what needs to be in the metadata of the object. `stored_size`
+        is the size of the data sent, for compressed images.
+
+        :raises `glance_store.exceptions.Duplicate` if the image already
+                existed
+        """
+        store_location = StoreLocation({'image_id': image_id}, self.conf)
+
         # Drain connection
         resp.read()
         release_conn()
 
+        if self._metrics is not None:
+            self._metrics.increment(metrics.SPROXYD_RESPONSES,
+                                    labels={'method': 'PUT',
+                                            'status': resp.status})
+
         if resp.status == 200:
             LOG.info(_LI("Uploaded image %(iid)s, md5 %(md)s, length %(len)d, "
                          "chord key %(key)s to Sproxyd"),
@@ -255,10 +1455,473 @@ class Store(driver.Store):
                 pass
             raise exceptions.BackendException()
 
-        return (store_location.get_uri(), actual_image_size,
-                checksum.hexdigest(), {})
+        if self._compression:
+            # The ETag, if any, is the one of the compressed data
+            self._record_compression(image_id, checksum.hexdigest(),
+                                     actual_image_size, stored_size)
+        elif self._verify_uploads:
+            self._record_integrity(image_id, resp.getheader('ETag'),
+                                   checksum.hexdigest(), actual_image_size)
+
+    def _record_compression(self, image_id, md5, size, compressed_size):
+        """
+        Record the size of a compressed image in the metadata of its object,
+        along with the size of the compressed data, and its checksum if
+        uploads are verified. Readers need the size.
+        """
+        usermd = {'codec': compression.ZLIB, 'size': size,
+                  'compressed_size': compressed_size}
+        if self._verify_uploads:
+            usermd['md5'] = md5
+
+        try:
+            self._sproxyd_client.put_meta(image_id, usermd)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            LOG.error(_LE("Could not record the size of compressed image "
+                          "%(iid)s in Sproxyd: %(exc)r"),
+                      dict(iid=image_id, exc=exc))
+            try:
+                self._sproxyd_client.del_object(image_id)
+            except scality_sproxyd_client.exceptions.SproxydException:
+                pass
+            raise exceptions.BackendException()
+
+    def _record_integrity(self, image_id, etag, md5, size):
+        """
+        Check `md5` against `etag`, if it's an MD5 checksum, and record the
+        checksum and size of an image in the metadata of its object.
+        """
+        etag = (etag or '').strip('"').lower()
+        if _MD5_RE.match(etag) and etag != md5:
+            LOG.error(_LE("Image %(iid)s was corrupted during its upload to "
+                          "Sproxyd: md5 %(md)s, ETag %(etag)s"),
+                      dict(iid=image_id, md=md5, etag=etag))
+            try:
+                self._sproxyd_client.del_object(image_id)
+            except scality_sproxyd_client.exceptions.SproxydException:
+                pass
+            raise exceptions.BackendException()
+
+        try:
+            self._sproxyd_client.put_meta(image_id, {'md5': md5,
+                                                     'size': size})
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            # The image itself is fine
+            LOG.warning(_LW("Could not record the checksum of image %(iid)s "
+                            "in Sproxyd: %(exc)r"),
+                        dict(iid=image_id, exc=exc))
+
+    def _chunkreadable(self, image_file):
+        if self._adaptive_chunk_size:
+            sizer = chunked.ChunkSizer(self._upload_chunk_size,
+                                       self._max_chunk_size)
+            return chunked.adaptive_chunkreadable(image_file, sizer)
+
+        return utils.chunkreadable(image_file, self._upload_chunk_size)
+
+    def _new_checksum(self):
+        """A hasher computing the MD5 checksum, and any other hash."""
+        names = ['md5']
+        for name in [self._hash_algorithm,
+                     DEDUPE_ALGORITHM if self._dedupe else None]:
+            if name and name not in names:
+                names.append(name)
+
+        # The hash algorithm may be md5 itself, whose digest is still looked
+        # up by name
+        if len(names) > 1 or self._hash_algorithm:
+            return hashing.MultiHash(*names)
+        return hashlib.md5()
+
+    def _get_hash_metadata(self, checksum):
+        if not self._hash_algorithm:
+            return {}
+        return {
+            'hash_algo': self._hash_algorithm,
+            'hash_value': checksum.hexdigest(self._hash_algorithm),
+        }
+
+    def _get_hashers(self, checksum, verifier):
+        hashers = [checksum]
+        if verifier:
+            hashers.append(verifier)
+        if self._metrics is not None:
+            hashers = [metrics.TimedHasher(hasher, self._metrics,
+                                           metrics.UPLOAD_HASH_SECONDS)
+                       for hasher in hashers]
+        return hashers
+
+    def _hashing_stage(self, chunks, checksum, verifier):
+        return pipeline.hashing_stage(chunks,
+                                      self._get_hashers(checksum, verifier),
+                                      self._upload_pipeline_depth)
+
+    def _put_part(self, key, data, exclusive=True):
+        # Exclusive PUT, a part is never overwritten, except by resumable
+        # uploads which may have left a part uncommitted
+        headers = {'If-None-Match': '*'} if exclusive else None
+        self._sproxyd_client.put_object(key, data, headers)
+
+    def _put_committed_part(self, put_part, checkpoint, index, key, data):
+        put_part(key, data, exclusive=False)
+        checkpoint.commit(index, key, data)
+
+    def _open_checkpoint(self, image_id):
+        """
+        Get the checkpoint of the last upload of `image_id` to resume it, if
+        it's still valid, or a new checkpoint.
+        """
+        try:
+            checkpoint = resumable.Checkpoint.load(self._sproxyd_client,
+                                                   image_id)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            LOG.warning(_LW("Could not load the checkpoint of image %(iid)s, "
+                            "uploading it from scratch: %(exc)r"),
+                        dict(iid=image_id, exc=exc))
+            checkpoint = None
+
+        if checkpoint is not None:
+            if (checkpoint.part_size == self._upload_part_size and
+                    not checkpoint.is_expired(self._checkpoint_ttl)):
+                LOG.info(_LI("Resuming the upload of image %(iid)s, "
+                             "%(parts)d parts were committed"),
+                         dict(iid=image_id, parts=len(checkpoint.parts)))
+                return checkpoint
+            self._delete_checkpoint(checkpoint)
+
+        return resumable.Checkpoint(self._sproxyd_client, image_id,
+                                    self._upload_part_size,
+                                    _new_upload_id())
+
+    def _delete_checkpoint(self, checkpoint, keep=()):
+        self._checkpoints.forget(checkpoint.key)
+        try:
+            checkpoint.delete(keep)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            LOG.error(_LE("Failed to delete the checkpoint of image "
+                          "%(iid)s : %(exc)r"),
+                      dict(iid=checkpoint.key, exc=exc))
+
+    def _abort_multipart(self, image_id, parts, checkpoint):
+        """
+        Clean up after a failed multi-part upload: delete its parts, except
+        the committed ones of a resumable upload.
+        """
+        if checkpoint is None:
+            self._delete_parts(parts)
+            return
+
+        committed = checkpoint.get_committed_keys()
+        self._delete_parts([part for part in parts
+                            if part[0] not in committed])
+        if committed:
+            LOG.info(_LI("The upload of image %(iid)s can be resumed, "
+                         "%(parts)d parts were committed"),
+                     dict(iid=image_id, parts=len(committed)))
+            self._checkpoints.track(image_id)
+
+    def _delete_parts(self, parts):
+        for key, _size in parts:
+            if key is None:
+                # A hole
+                continue
+            try:
+                self._sproxyd_client.del_object(key)
+            except scality_sproxyd_client.exceptions.SproxydException as exc:
+                LOG.error(_LE("Failed to delete image part %(key)s : "
+                              "%(exc)r"), dict(key=key, exc=exc))
+
+    def _check_absent(self, image_id):
+        """
+        Raise `Duplicate` if there's an object under `image_id`, for uploads
+        where it is written last.
+        """
+        try:
+            self._sproxyd_client.head(image_id)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            if exc.http_status != 404:
+                raise
+        else:
+            LOG.error(_LE("Uploading image %s to Sproxyd failed. There's "
+                          "already an object with this key"), image_id)
+            store_location = StoreLocation({'image_id': image_id}, self.conf)
+            raise exceptions.Duplicate(image=store_location.get_uri())
+
+    def _add_multipart(self, image_id, image_file, checksum, verifier):
+        """
+        Upload an image split in parts uploaded in parallel under their own
+        keys. A manifest listing the parts is then stored under the image id.
+
+        The keys of the parts are unique to the upload, so that cleaning up
+        after a failure never deletes the parts of another upload of the
+        same image, and parts left over by a crashed upload don't get in the
+        way of the next one.
+        """
+
+        store_location = StoreLocation({'image_id': image_id}, self.conf)
+
+        # The manifest is written last, so make sure we won't upload all the
+        # parts of an image which already exists.
+        self._check_absent(image_id)
+
+        checkpoint = None
+        if self._resumable_uploads:
+            self._checkpoints.collect(self._sproxyd_client)
+            checkpoint = self._open_checkpoint(image_id)
+            upload_id = checkpoint.upload_id
+        else:
+            upload_id = _new_upload_id()
+
+        actual_image_size = 0
+        parts = []
+        pool = concurrency.WorkerPool(self._upload_concurrency)
+        put_part = self._put_part
+        if self._metrics is not None:
+            put_part = metrics.timed(put_part, self._metrics,
+                                     metrics.UPLOAD_SEND_SECONDS)
+
+        hashing = None
+        try:
+            hashing = self._hashing_stage(
+                self._chunkreadable(image_file),
+                checksum, verifier)
+            if self._sparse_uploads:
+                extents = _iter_extents(hashing, self._upload_part_size,
+                                        SPARSE_MIN_HOLE_SIZE)
+            else:
+                extents = ((part, len(part)) for part in
+                           _iter_parts(hashing, self._upload_part_size))
+
+            index = 0
+            for part, size in extents:
+                actual_image_size += size
+                if part is None:
+                    # A hole, nothing to upload
+                    parts.append([None, size])
+                    continue
+
+                key = _get_part_key(image_id, upload_id, index)
+                parts.append([key, size])
+                if checkpoint is None:
+                    pool.spawn(put_part, key, part)
+                elif not checkpoint.is_committed(index, key, part):
+                    pool.spawn(self._put_committed_part, put_part,
+                               checkpoint, index, key, part)
+                index += 1
+
+            hashing.close()
+            pool.waitall()
+        except Exception:
+            LOG.exception(_LE("Error during multi-part upload of image %s "
+                              "to Sproxyd"), image_id)
+            with excutils.save_and_reraise_exception():
+                if hashing:
+                    hashing.abort()
+                # Let the uploads in progress finish before cleaning up
+                try:
+                    pool.waitall()
+                except Exception:
+                    pass
+                self._abort_multipart(image_id, parts, checkpoint)
+
+        manifest = {
+            'size': actual_image_size,
+            'part_size': self._upload_part_size,
+            'parts': parts,
+        }
+        headers = {
+            'If-None-Match': '*',
+            USERMD_HEADER: _encode_usermd({
+                'layout': MANIFEST_LAYOUT,
+                'md5': checksum.hexdigest(),
+                'size': actual_image_size,
+            }),
+        }
+        try:
+            self._sproxyd_client.put_object(image_id, json.dumps(manifest),
+                                            headers)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            if getattr(exc, 'http_status', None) == 412:
+                self._delete_parts(parts)
+                if checkpoint is not None:
+                    self._delete_checkpoint(checkpoint)
+                LOG.error(_LE("Uploading image %s to Sproxyd failed. There's "
+                              "already an object with this key"), image_id)
+                raise exceptions.Duplicate(image=store_location.get_uri())
+
+            self._abort_multipart(image_id, parts, checkpoint)
+            LOG.error(_LE("Uploading the manifest of image %(iid)s to "
+                          "Sproxyd failed : %(exc)r"),
+                      dict(iid=image_id, exc=exc))
+            raise exceptions.BackendException()
+
+        if checkpoint is not None:
+            # Parts of the previous attempts not in the image any more, if
+            # it was smaller or sparser, go with the checkpoint
+            self._delete_checkpoint(checkpoint,
+                                    keep=set(key for key, _ in parts))
+
+        LOG.info(_LI("Uploaded image %(iid)s, md5 %(md)s, length %(len)d, "
+                     "in %(parts)d parts to Sproxyd"),
+                 dict(iid=image_id, md=checksum.hexdigest(),
+                      len=actual_image_size, parts=len(parts)))
+
+        return actual_image_size
+
+    def _add_deduplicated(self, image_id, image_file, checksum, verifier):
+        """
+        Upload an image under its blob key, then store a reference to its
+        content under the image id. If the same content was already stored,
+        the new copy is deleted and the existing one is referenced instead.
+
+        The digest of the content is only known once it's fully uploaded, so
+        duplicates are still transferred.
+
+        :retval the size of the image
+        """
+        # The reference is written last
+        self._check_absent(image_id)
+
+        blob_key = _get_blob_key(image_id)
+        size = self._upload(blob_key, image_file, checksum, verifier)
+        index_key = _get_dedupe_key(checksum.hexdigest(DEDUPE_ALGORITHM))
+
+        try:
+            target = self._acquire_content(index_key, blob_key, size)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._delete_key(blob_key)
+
+        if target != blob_key:
+            LOG.info(_LI("Image %(iid)s has the same content as %(key)s"),
+                     dict(iid=image_id, key=target))
+            self._delete_key(blob_key)
+
+        headers = {
+            'If-None-Match': '*',
+            USERMD_HEADER: _encode_usermd({
+                'layout': REFERENCE_LAYOUT,
+                'index': index_key,
+                'target': target,
+                'md5': checksum.hexdigest(),
+                'size': size,
+            }),
+        }
+        try:
+            self._sproxyd_client.put_object(image_id, '', headers)
+        except scality_sproxyd_client.exceptions.SproxydException as exc:
+            self._release_content(index_key)
+            if getattr(exc, 'http_status', None) == 412:
+                LOG.error(_LE("Uploading image %s to Sproxyd failed. There's "
+                              "already an object with this key"), image_id)
+                store_location = StoreLocation({'image_id': image_id},
+                                               self.conf)
+                raise exceptions.Duplicate(image=store_location.get_uri())
+
+            LOG.error(_LE("Uploading the reference of image %(iid)s to "
+                          "Sproxyd failed : %(exc)r"),
+                      dict(iid=image_id, exc=exc))
+            raise exceptions.BackendException()
+
+        return size
+
+    def _acquire_content(self, index_key, blob_key, size):
+        """
+        Take a reference on the content indexed by `index_key`, indexing
+        `blob_key` (`size` bytes) under it if there's no such content yet.
+
+        Reference counts are updated with a read-modify-write of the user
+        metadata of the index object, which Sproxyd can't do atomically.
+
+        :retval the key under which the content is stored
+        """
+        for _attempt in xrange(3):
+            headers = {
+                'If-None-Match': '*',
+                USERMD_HEADER: _encode_usermd({
+                    'target': blob_key,
+                    'size': size,
+                    'refcount': 1,
+                }),
+            }
+            try:
+                self._sproxyd_client.put_object(index_key, '', headers)
+                return blob_key
+            except scality_sproxyd_client.exceptions.SproxydHTTPException \
+                    as exc:
+                if exc.http_status != 412:
+                    raise
+
+            index = self._sproxyd_client.get_meta(index_key)
+            if index is None:
+                # Deleted meanwhile, try to index our copy again
+                continue
+
+            index['refcount'] += 1
+            self._sproxyd_client.put_meta(index_key, index)
+            return index['target']
+
+        raise exceptions.BackendException()
+
+    def _release_content(self, index_key):
+        """
+        Drop a reference on the content indexed by `index_key`, deleting it
+        with its index object once nothing references it.
+        """
+        index = self._sproxyd_client.get_meta(index_key)
+        if index is None:
+            LOG.warning(_LW("Deduplicated content %s is already gone"),
+                        index_key)
+            return
+
+        index['refcount'] -= 1
+        if index['refcount'] > 0:
+            self._sproxyd_client.put_meta(index_key, index)
+            return
+
+        self._delete_key(index['target'])
+        self._sproxyd_client.del_object(index_key)
+        LOG.info(_LI("Deleted the deduplicated content %s, which is not "
+                     "referenced anymore"), index_key)
+
+    def _delete_key(self, key, headers=None):
+        """
+        Delete the object under `key`, and the parts of a multi-part image.
+
+        :param headers: the headers of the object, if they are known
+        """
+        if headers is None:
+            try:
+                headers = self._sproxyd_client.head(key)
+            except scality_sproxyd_client.exceptions.SproxydHTTPException \
+                    as exc:
+                if exc.http_status == 404:
+                    return
+                raise
+
+        if _decode_usermd(headers).get('layout') == MANIFEST_LAYOUT:
+            self._delete_parts(self._load_manifest(key)['parts'])
+
+        self._sproxyd_client.del_object(key)
+
+    def _image_not_found(self, image):
+        """Remember that `image` doesn't exist, and build the exception."""
+        if self._not_found:
+            self._not_found.set(image, True)
+        msg = _("Image %s does not exist in the Ring") % image
+        return exceptions.NotFound(message=msg)
+
+    def _incomplete_image(self, key):
+        """
+        Build the exception for the compressed image under `key` whose size
+        wasn't recorded: its upload failed after sending the data.
+        """
+        LOG.error(_LE("Compressed image %s is incomplete, its size wasn't "
+                      "recorded"), key)
+        return exceptions.BackendException()
 
     @capabilities_check
+    @_metered('delete')
     def delete(self, location, context=None):
         """
         Takes a `glance_store.location.Location` object that indicates
@@ -271,17 +1934,208 @@ class Store(driver.Store):
         """
         image = location.store_location.image_id
 
+        if self._cache:
+            self._cache.delete(image)
+        if self._sizes:
+            self._sizes.pop(image)
+
+        if self._not_found and self._not_found.get(image):
+            raise self._image_not_found(image)
+
+        if self._conditional_delete:
+            try:
+                self._sproxyd_client.del_object(image,
+                                                headers={'If-Match': '*'})
+            except scality_sproxyd_client.exceptions.SproxydHTTPException \
+                    as exc:
+                if exc.http_status in (404, 412):
+                    raise self._image_not_found(image)
+                raise
+            LOG.info(_LI("The image %s was deleted from the Ring"), image)
+            return
+
         # Deleting an object that didn't exist returns a '200'
         # To be able to raise a NotFound, we need to do a HEAD just before
         # the DELETE.
         try:
-            self._sproxyd_client.head(image)
+            headers = self._sproxyd_client.head(image)
         except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
             if exc.http_status == 404:
-                msg = _("Image %s does not exist in the Ring") % image
-                raise exceptions.NotFound(message=msg)
+                raise self._image_not_found(image)
             else:
                 raise
 
-        self._sproxyd_client.del_object(image)
+        usermd = _decode_usermd(headers)
+        if usermd.get('layout') == REFERENCE_LAYOUT:
+            self._sproxyd_client.del_object(image)
+            self._release_content(usermd['index'])
+        else:
+            self._delete_key(image, headers)
         LOG.info(_LI("The image %s was deleted from the Ring"), image)
+
+    def get_size(self, location, context=None):
+        """
+        Takes a `glance_store.location.Location` object that indicates
+        where to find the image file, and returns its size, from the
+        metadata of its object: the image itself isn't read.
+
+        :location `glance_store.location.Location` object, supplied
+                  from glance_store.location.get_location_from_uri()
+        :raises NotFound if image does not exist
+        """
+        image = location.store_location.image_id
+
+        if self._sizes:
+            size = self._sizes.get(image)
+            if size is not None:
+                return size
+        if self._not_found and self._not_found.get(image):
+            raise self._image_not_found(image)
+
+        try:
+            headers = self._sproxyd_client.head(image)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            if exc.http_status == 404:
+                raise self._image_not_found(image)
+            raise
+
+        size = self._get_image_size(image, headers)
+        if self._sizes:
+            self._sizes.set(image, size)
+        return size
+
+    def _get_image_size(self, key, headers):
+        """The size of the image under `key`, from the `headers` of a HEAD."""
+        usermd = _decode_usermd(headers)
+        # Recorded for compressed objects, references, and the manifests and
+        # verified objects uploaded by recent versions
+        if 'size' in usermd:
+            return usermd['size']
+        if usermd.get('codec'):
+            raise self._incomplete_image(key)
+        if usermd.get('layout') == MANIFEST_LAYOUT:
+            return self._load_manifest(key)['size']
+        return int(headers['Content-Length'])
+
+    def verify(self, location, checksum=None, context=None):
+        """
+        Check the integrity of an image from the metadata of its object(s),
+        without reading it: its size, and its MD5 checksum if `checksum` is
+        given. Only what was recorded at upload time can be checked (see the
+        `scality_verify_uploads` option). For compressed images, the size of
+        the compressed data is checked instead of the size of the image.
+
+        :location `glance_store.location.Location` object, supplied
+                  from glance_store.location.get_location_from_uri()
+        :checksum the expected MD5 checksum of the image, e.g. from Glance
+        :retval True if the image looks intact
+        :raises NotFound if image does not exist
+        """
+        image = location.store_location.image_id
+        try:
+            headers = self._sproxyd_client.head(image)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            if exc.http_status == 404:
+                raise self._image_not_found(image)
+            raise
+
+        return self._verify_key(image, headers, checksum)
+
+    def _verify_key(self, key, headers, checksum):
+        """Same as `verify` for the object under `key`, and its `headers`."""
+        usermd = _decode_usermd(headers)
+        recorded_md5 = usermd.get('md5')
+        if checksum and recorded_md5 and checksum != recorded_md5:
+            LOG.error(_LE("Image %(iid)s has md5 %(md)s in the Ring instead "
+                          "of %(expected)s"),
+                      dict(iid=key, md=recorded_md5, expected=checksum))
+            return False
+
+        if usermd.get('layout') == REFERENCE_LAYOUT:
+            try:
+                target_headers = self._sproxyd_client.head(usermd['target'])
+            except scality_sproxyd_client.exceptions.SproxydHTTPException \
+                    as exc:
+                if exc.http_status != 404:
+                    raise
+                LOG.error(_LE("The content of image %(iid)s, %(key)s, is "
+                              "missing"), dict(iid=key, key=usermd['target']))
+                return False
+            return self._verify_key(usermd['target'], target_headers,
+                                    checksum)
+
+        if usermd.get('layout') == MANIFEST_LAYOUT:
+            manifest = self._load_manifest(key)
+            size = manifest['size']
+            for part_key, part_size in manifest['parts']:
+                if part_key is None:
+                    # A hole
+                    continue
+                if self._get_object_size(part_key) != part_size:
+                    LOG.error(_LE("Part %(key)s of image %(iid)s is missing "
+                                  "or has the wrong size"),
+                              dict(key=part_key, iid=key))
+                    return False
+        elif usermd.get('codec'):
+            if 'size' not in usermd:
+                LOG.error(_LE("Compressed image %s is incomplete, its size "
+                              "wasn't recorded"), key)
+                return False
+            # The original size can't be checked without decompressing the
+            # image, the size of the compressed data is (when recorded)
+            stored_size = int(headers['Content-Length'])
+            if usermd.get('compressed_size', stored_size) != stored_size:
+                LOG.error(_LE("Compressed image %(iid)s has %(size)d bytes "
+                              "in the Ring instead of %(expected)d"),
+                          dict(iid=key, size=stored_size,
+                               expected=usermd['compressed_size']))
+                return False
+            return True
+        else:
+            size = int(headers['Content-Length'])
+
+        if usermd.get('size', size) != size:
+            LOG.error(_LE("Image %(iid)s has %(size)d bytes in the Ring "
+                          "instead of %(expected)d"),
+                      dict(iid=key, size=size, expected=usermd['size']))
+            return False
+
+        return True
+
+    def _get_object_size(self, key):
+        """The size of object `key`, or None if it doesn't exist."""
+        try:
+            headers = self._sproxyd_client.head(key)
+        except scality_sproxyd_client.exceptions.SproxydHTTPException as exc:
+            if exc.http_status == 404:
+                return None
+            raise
+        return int(headers['Content-Length'])
+
+    def _delete_one(self, location, context):
+        image = location.store_location.image_id
+        try:
+            self.delete(location, context=context)
+        except exceptions.NotFound:
+            return DeleteResult(image, NOT_FOUND, None)
+        except Exception as exc:
+            LOG.error(_LE("Failed to delete image %(image)s: %(exc)s"),
+                      dict(image=image, exc=exc))
+            return DeleteResult(image, ERROR, exc)
+        return DeleteResult(image, DELETED, None)
+
+    def delete_many(self, locations, context=None):
+        """
+        Delete the images at `locations`, several at a time.
+
+        A failure to delete an image doesn't stop the deletion of the others.
+
+        :locations iterable of `glance_store.location.Location` objects
+        :retval list of `DeleteResult`, one per location in the same order,
+                whose status is `DELETED`, `NOT_FOUND` or `ERROR` (and then
+                `error` is the exception raised)
+        """
+        pool = concurrency.WorkerPool(self._delete_concurrency)
+        for image_location in locations:
+            pool.spawn(self._delete_one, image_location, context)
+        return pool.waitall()
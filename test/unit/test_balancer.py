@@ -0,0 +1,147 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.balancer"""
+
+import mock
+import unittest
+import urlparse
+
+import scality_sproxyd_client.exceptions
+
+from scality_glance_store import balancer
+
+
+A = urlparse.urlparse('http://a:81/proxy/')
+B = urlparse.urlparse('http://b:81/proxy/')
+
+
+class TestBalancer(unittest.TestCase):
+    """Tests for scality_glance_store.balancer.Balancer"""
+
+    def setUp(self):
+        self.probe = mock.Mock(return_value=True)
+        self.balancer = balancer.Balancer([A, B], self.probe,
+                                          max_failures=2, probe_interval=0)
+
+    def test_round_robin_without_measures(self):
+        chosen = set(self.balancer.choose([A, B]) for _ in range(2))
+        self.assertEqual(set([A, B]), chosen)
+
+    def test_choose_among_candidates(self):
+        for _ in range(2):
+            self.assertEqual(B, self.balancer.choose([B]))
+
+    def test_no_candidate(self):
+        self.assertRaises(StopIteration, self.balancer.choose, [])
+
+    def test_lowest_latency(self):
+        self.balancer.started(A)
+        self.balancer.finished(A, 0.5, False)
+        self.balancer.started(B)
+        self.balancer.finished(B, 0.1, False)
+
+        for _ in range(2):
+            self.assertEqual(B, self.balancer.choose([A, B]))
+
+    def test_in_flight_requests(self):
+        for endpoint in [A, B]:
+            self.balancer.started(endpoint)
+            self.balancer.finished(endpoint, 0.1, False)
+        for _ in range(3):
+            self.balancer.started(B)
+
+        self.assertEqual(3, self.balancer.stats(B).in_flight)
+        self.assertEqual(A, self.balancer.choose([A, B]))
+
+    @mock.patch('scality_glance_store.concurrency.spawn')
+    def test_quarantine(self, spawn):
+        for _ in range(2):
+            self.balancer.started(A)
+            self.balancer.finished(A, 0.01, True)
+
+        self.assertTrue(self.balancer.stats(A).quarantined)
+        spawn.assert_called_once_with(self.balancer._probe_until_healthy, A)
+        for _ in range(2):
+            self.assertEqual(B, self.balancer.choose([A, B]))
+
+        # Better a quarantined endpoint than none
+        self.assertEqual(A, self.balancer.choose([A]))
+
+    @mock.patch('scality_glance_store.concurrency.spawn')
+    def test_success_resets_failures(self, spawn):
+        for failed in [True, False, True]:
+            self.balancer.started(A)
+            self.balancer.finished(A, 0.01, failed)
+
+        self.assertFalse(self.balancer.stats(A).quarantined)
+        self.assertFalse(spawn.called)
+
+    def test_probe_until_healthy(self):
+        self.probe.side_effect = [False, Exception('boom'), True]
+        self.balancer.stats(A).quarantined = True
+
+        self.balancer._probe_until_healthy(A)
+
+        self.assertEqual(3, self.probe.call_count)
+        self.assertFalse(self.balancer.stats(A).quarantined)
+
+
+@mock.patch('eventlet.spawn', mock.Mock())
+class TestBalancedSproxydClient(unittest.TestCase):
+    """Tests for scality_glance_store.balancer.BalancedSproxydClient"""
+
+    def setUp(self):
+        self.client = balancer.BalancedSproxydClient(['http://h0:81/proxy/'])
+        self.endpoint, = self.client._endpoints
+        self.stats = self.client._balancer.stats(self.endpoint)
+
+    def do_http(self, exc=None):
+        def fake_do_http(client, *args, **kwargs):
+            client.get_url_for_object('obj')
+            self.assertEqual(1, self.stats.in_flight)
+            if exc:
+                raise exc
+            return 'result'
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient._do_http', fake_do_http):
+            return self.client._do_http('get_object', {}, 'GET', 'obj')
+
+    def test_request_recorded(self):
+        self.assertEqual('result', self.do_http())
+
+        self.assertEqual(0, self.stats.in_flight)
+        self.assertIsNotNone(self.stats.latency)
+        self.assertEqual(0, self.stats.consecutive_failures)
+
+    def test_server_error_is_a_failure(self):
+        exc = scality_sproxyd_client.exceptions.SproxydHTTPException(
+            'error', http_status=503)
+        self.assertRaises(type(exc), self.do_http, exc)
+
+        self.assertEqual(0, self.stats.in_flight)
+        self.assertEqual(1, self.stats.consecutive_failures)
+
+    def test_client_error_is_not_a_failure(self):
+        exc = scality_sproxyd_client.exceptions.SproxydHTTPException(
+            'error', http_status=404)
+        self.assertRaises(type(exc), self.do_http, exc)
+
+        self.assertEqual(0, self.stats.consecutive_failures)
+
+    def test_untracked_endpoint_lookup(self):
+        self.assertEqual(self.endpoint, self.client.get_next_endpoint())
+        self.assertEqual(0, self.stats.in_flight)
@@ -0,0 +1,168 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.cache"""
+
+import mock
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from scality_glance_store import cache
+
+
+class TestImageCache(unittest.TestCase):
+    """Tests for scality_glance_store.cache.ImageCache"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = cache.ImageCache(os.path.join(self.directory, 'cache'),
+                                      100)
+
+    def fill(self, image_id, data):
+        chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+        self.assertEqual(chunks, list(self.cache.fill(image_id, iter(chunks),
+                                                      len(data))))
+
+    def read(self, image_id, *args, **kwargs):
+        chunks, size = self.cache.open(image_id, *args, **kwargs)
+        data = ''.join(chunks)
+        self.assertEqual(size, len(data))
+        return data
+
+    def test_open_missing(self):
+        self.assertIsNone(self.cache.open('image'))
+
+    def test_fill_and_open(self):
+        data = ''.join(chr(ord('a') + i % 26) for i in range(50))
+        self.fill('image', data)
+
+        self.assertEqual(data, self.read('image'))
+        self.assertEqual(data[10:30], self.read('image', 10, 20))
+        self.assertEqual(data[40:], self.read('image', 40, 20))
+        self.assertEqual('', self.read('image', 60))
+
+        chunks, _ = self.cache.open('image', chunk_size=16)
+        self.assertEqual([16, 16, 16, 2], [len(chunk) for chunk in chunks])
+
+    def test_fill_empty_image(self):
+        self.fill('image', '')
+
+        self.assertEqual('', self.read('image'))
+
+    def test_partial_fill_is_not_cached(self):
+        chunks = self.cache.fill('image', iter(['abc', 'def']), 6)
+        next(chunks)
+        chunks.close()
+
+        self.assertIsNone(self.cache.open('image'))
+        self.assertEqual([], os.listdir(self.cache.directory))
+
+    def test_truncated_fill_is_not_cached(self):
+        list(self.cache.fill('image', iter(['abc']), 6))
+
+        self.assertIsNone(self.cache.open('image'))
+
+    def test_image_too_large_is_not_cached(self):
+        list(self.cache.fill('image', iter(['a' * 101]), 101))
+
+        self.assertIsNone(self.cache.open('image'))
+
+    def test_evict_least_recently_used(self):
+        for image_id in ['image0', 'image1']:
+            self.fill(image_id, 'x' * 40)
+        os.utime(self.cache._get_path('image0'), (0, 0))
+        os.utime(self.cache._get_path('image1'), (1, 1))
+
+        # Reading image0 makes image1 the least recently used
+        self.read('image0')
+        self.fill('image2', 'x' * 40)
+
+        self.assertIsNone(self.cache.open('image1'))
+        self.assertEqual(40, len(self.read('image0')))
+        self.assertEqual(40, len(self.read('image2')))
+
+    def make_tmp_file(self, size, mtime):
+        fd, path = tempfile.mkstemp(dir=self.cache.directory,
+                                    prefix=cache.ImageCache.TMP_PREFIX)
+        os.write(fd, 'x' * size)
+        os.close(fd)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_stale_tmp_files_are_deleted(self):
+        stale = self.make_tmp_file(10, 0)
+        fresh = self.make_tmp_file(10, time.time())
+
+        cache.ImageCache(self.cache.directory, 100)
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(fresh))
+
+        stale = self.make_tmp_file(10, 0)
+        self.fill('image', 'data')
+
+        self.assertFalse(os.path.exists(stale))
+
+    def test_tmp_files_count_against_max_size(self):
+        self.make_tmp_file(70, time.time())
+
+        self.fill('image', 'x' * 40)
+
+        self.assertIsNone(self.cache.open('image'))
+
+    def test_delete(self):
+        self.fill('image', 'data')
+        self.cache.delete('image')
+        self.cache.delete('image')
+
+        self.assertIsNone(self.cache.open('image'))
+
+
+class TestTTLCache(unittest.TestCase):
+    """Tests for scality_glance_store.cache.TTLCache"""
+
+    @mock.patch('time.time', return_value=1000)
+    def test_expiry(self, mock_time):
+        ttl_cache = cache.TTLCache(10)
+        ttl_cache.set('key', 'value')
+        self.assertEqual('value', ttl_cache.get('key'))
+
+        mock_time.return_value = 1010
+        self.assertIsNone(ttl_cache.get('key'))
+        self.assertEqual('default', ttl_cache.get('key', 'default'))
+
+    def test_pop(self):
+        ttl_cache = cache.TTLCache(10)
+        ttl_cache.set('key', 'value')
+        ttl_cache.pop('key')
+        ttl_cache.pop('missing')
+
+        self.assertIsNone(ttl_cache.get('key'))
+
+    @mock.patch('time.time')
+    def test_max_entries(self, mock_time):
+        ttl_cache = cache.TTLCache(10, max_entries=3)
+        for now, key in enumerate(['a', 'b', 'c', 'd']):
+            mock_time.return_value = now
+            ttl_cache.set(key, key)
+
+        # The entry closest to expiring made room for the new one
+        self.assertIsNone(ttl_cache.get('a'))
+        for key in ['b', 'c', 'd']:
+            self.assertEqual(key, ttl_cache.get(key))
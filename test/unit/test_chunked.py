@@ -0,0 +1,152 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.chunked"""
+
+import mock
+import socket
+import StringIO
+import unittest
+
+from scality_glance_store import chunked
+
+
+class FakeConnection(object):
+    def __init__(self, sock):
+        self.sock = sock
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+
+def recv_all(sock):
+    data = []
+    while True:
+        buf = sock.recv(65536)
+        if not buf:
+            return ''.join(data)
+        data.append(buf)
+
+
+class TestChunkedWriter(unittest.TestCase):
+    """Tests for scality_glance_store.chunked.ChunkedWriter"""
+
+    EXPECTED = '3\r\nabc\r\n5\r\ndefgh\r\n0\r\n\r\n'
+
+    def write_chunks(self, writer):
+        for chunk in ['abc', '', 'defgh']:
+            writer.write(chunk)
+        writer.close()
+
+    def test_write_on_socket(self):
+        sock, peer = socket.socketpair()
+        try:
+            self.write_chunks(chunked.ChunkedWriter(FakeConnection(sock)))
+            sock.shutdown(socket.SHUT_WR)
+
+            self.assertEqual(self.EXPECTED, recv_all(peer))
+        finally:
+            sock.close()
+            peer.close()
+
+    @mock.patch('scality_glance_store.chunked._MIN_SPLIT_SIZE', 4)
+    def test_write_split_on_socket(self):
+        sock, peer = socket.socketpair()
+        try:
+            self.write_chunks(chunked.ChunkedWriter(FakeConnection(sock)))
+            sock.shutdown(socket.SHUT_WR)
+
+            self.assertEqual(self.EXPECTED, recv_all(peer))
+        finally:
+            sock.close()
+            peer.close()
+
+    @mock.patch('scality_glance_store.chunked._MSG_MORE', None)
+    def test_write_without_socket_support(self):
+        sock, peer = socket.socketpair()
+        try:
+            self.write_chunks(chunked.ChunkedWriter(FakeConnection(sock)))
+            sock.shutdown(socket.SHUT_WR)
+
+            self.assertEqual(self.EXPECTED, recv_all(peer))
+        finally:
+            sock.close()
+            peer.close()
+
+    def test_write_on_tls_connection(self):
+        conn = mock.Mock()
+        self.write_chunks(chunked.ChunkedWriter(conn))
+
+        self.assertEqual([mock.call('3\r\nabc\r\n'),
+                          mock.call('5\r\ndefgh\r\n'),
+                          mock.call('0\r\n\r\n')],
+                         conn.send.call_args_list)
+        self.assertFalse(conn.sock.sendall.called)
+
+
+class TestChunkSizer(unittest.TestCase):
+    """Tests for scality_glance_store.chunked.ChunkSizer"""
+
+    @mock.patch('time.time')
+    def test_next_size(self, mock_time):
+        sizer = chunked.ChunkSizer(4, 16)
+
+        mock_time.return_value = 0
+        self.assertEqual(4, sizer.next_size())
+
+        # Fast transfer: grow up to the maximum
+        for expected in [8, 16, 16]:
+            mock_time.return_value += 0.001
+            self.assertEqual(expected, sizer.next_size())
+
+        # Slow transfer: shrink down to the initial size
+        for expected in [8, 4, 4]:
+            mock_time.return_value += 1
+            self.assertEqual(expected, sizer.next_size())
+
+        # In between: keep the same size
+        mock_time.return_value += 0.01
+        self.assertEqual(4, sizer.next_size())
+
+
+class TestAdaptiveChunkreadable(unittest.TestCase):
+    """Tests for scality_glance_store.chunked.adaptive_chunkreadable"""
+
+    def test_read(self):
+        sizer = mock.Mock()
+        sizer.next_size.side_effect = [2, 4, 8, 16]
+        fp = StringIO.StringIO('0123456789')
+
+        self.assertEqual(['01', '2345', '6789'],
+                         list(chunked.adaptive_chunkreadable(fp, sizer)))
+
+    def test_not_readable(self):
+        chunks = iter(['a', 'b'])
+
+        self.assertIs(chunks,
+                      chunked.adaptive_chunkreadable(chunks, mock.Mock()))
+
+
+class TestCoalesce(unittest.TestCase):
+    """Tests for scality_glance_store.chunked.coalesce"""
+
+    def test_coalesce(self):
+        sizer = mock.Mock()
+        sizer.next_size.side_effect = [3, 5, 5, 5]
+
+        self.assertEqual(['abc', 'defgh', 'ijklmn', 'o'],
+                         list(chunked.coalesce(
+                             iter(['ab', 'c', 'def', 'gh', 'ijklmn', 'o']),
+                             sizer)))
@@ -0,0 +1,51 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.compression"""
+
+import os
+import unittest
+import zlib
+
+from scality_glance_store import compression
+
+
+class TestCompression(unittest.TestCase):
+    """Tests for scality_glance_store.compression"""
+
+    def compress(self, chunks):
+        compressor = compression.Compressor(1)
+        return ''.join([compressor.compress(chunk) for chunk in chunks] +
+                       [compressor.flush()])
+
+    def test_compress(self):
+        chunks = ['\0' * 1000, os.urandom(100), '\0' * 1000]
+        self.assertEqual(''.join(chunks),
+                         zlib.decompress(self.compress(chunks)))
+
+    def test_decompress(self):
+        data = '\0' * 100000 + os.urandom(1000)
+        compressed = zlib.compress(data)
+        chunks = [compressed[i:i + 10]
+                  for i in range(0, len(compressed), 10)]
+
+        decompressed = list(compression.decompress(iter(chunks), 4096))
+
+        self.assertEqual(data, ''.join(decompressed))
+        self.assertTrue(all(len(chunk) <= 4096 for chunk in decompressed))
+
+    def test_roundtrip_empty(self):
+        self.assertEqual('', ''.join(compression.decompress(
+            [self.compress([])], 4096)))
@@ -0,0 +1,119 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.concurrency"""
+
+import threading
+import unittest
+import weakref
+
+from scality_glance_store import concurrency
+
+
+class Part(object):
+    """Stands for the data of a part, which can be weakly referenced."""
+
+
+class TestWorker(unittest.TestCase):
+    """Tests for scality_glance_store.concurrency.Worker"""
+
+    def test_wait_returns_result(self):
+        worker = concurrency.spawn(lambda x, y: x + y, 1, y=2)
+
+        self.assertEqual(3, worker.wait())
+        self.assertFalse(worker.failed)
+
+    def test_wait_reraises_exception(self):
+        def fail():
+            raise ValueError()
+
+        worker = concurrency.spawn(fail)
+
+        self.assertRaises(ValueError, worker.wait)
+        self.assertTrue(worker.failed)
+
+    def test_arguments_released(self):
+        part = Part()
+        ref = weakref.ref(part)
+        worker = concurrency.spawn(lambda part: None, part)
+        del part
+
+        worker.join()
+        self.assertIsNone(ref())
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Tests for scality_glance_store.concurrency.WorkerPool"""
+
+    def test_waitall_returns_results_in_order(self):
+        pool = concurrency.WorkerPool(2)
+        for i in range(5):
+            pool.spawn(lambda i: i * i, i)
+
+        self.assertEqual([0, 1, 4, 9, 16], pool.waitall())
+
+    def test_size_is_honored(self):
+        pool = concurrency.WorkerPool(2)
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+        release = threading.Event()
+
+        def work():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            release.wait(0.05)
+            with lock:
+                running[0] -= 1
+
+        for _ in range(6):
+            pool.spawn(work)
+        pool.waitall()
+
+        self.assertEqual(2, max_running[0])
+
+    def test_spawn_after_failure_raises(self):
+        pool = concurrency.WorkerPool(1)
+
+        def fail():
+            raise ValueError()
+
+        pool.spawn(fail).join()
+
+        self.assertRaises(ValueError, pool.spawn, lambda: None)
+        self.assertRaises(ValueError, pool.waitall)
+
+    def test_finished_workers_released(self):
+        pool = concurrency.WorkerPool(2)
+        release = threading.Event()
+        refs = []
+        for _i in range(4):
+            part = Part()
+            refs.append(weakref.ref(part))
+            pool.spawn(lambda part: None, part)
+        del part
+        # Still running: holds its part until it's done
+        pool.spawn(lambda part: release.wait(5), Part())
+
+        # The parts of the finished workers are gone before waitall
+        for _i in range(100):
+            if not any(ref() for ref in refs):
+                break
+            release.wait(0.01)
+        self.assertEqual([None] * 4, [ref() for ref in refs])
+
+        release.set()
+        self.assertEqual([None] * 4 + [True], pool.waitall())
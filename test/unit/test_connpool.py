@@ -0,0 +1,119 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.connpool"""
+
+import mock
+import socket
+import unittest
+
+from scality_sproxyd_client import sproxyd_client
+
+from scality_glance_store import connpool
+
+
+class FakeConnection(object):
+    """An open connection, which nothing happens on."""
+
+    def __init__(self, *args, **kwargs):
+        self.sock, self._peer = socket.socketpair()
+
+    def close(self):
+        self.sock.close()
+        self._peer.close()
+        self.sock = None
+
+
+class TestConfigure(unittest.TestCase):
+    """Tests for scality_glance_store.connpool.configure"""
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client._pool_manager = sproxyd_client.urllib3.PoolManager(
+            2, maxsize=32)
+
+    def get_pool(self):
+        pool = self.client._pool_manager.connection_from_host(
+            'h0', 81, 'http')
+        pool.ConnectionCls = FakeConnection
+        return pool
+
+    def test_maxsize(self):
+        connpool.configure(self.client, 8)
+
+        self.assertEqual(8, self.get_pool().pool.maxsize)
+        self.assertNotIsInstance(self.get_pool(), connpool.IdleTimeoutMixin)
+
+    @mock.patch('time.time')
+    def test_idle_timeout(self, mock_time):
+        connpool.configure(self.client, 8, idle_timeout=5)
+        pool = self.get_pool()
+        self.assertIsInstance(pool, connpool.IdleTimeoutMixin)
+
+        mock_time.return_value = 100
+        conn = pool._get_conn()
+        pool._put_conn(conn)
+
+        # Reused while fresh
+        mock_time.return_value = 105
+        self.assertIs(conn, pool._get_conn())
+        self.assertIsNotNone(conn.sock)
+        pool._put_conn(conn)
+
+        # Closed once idle for too long
+        mock_time.return_value = 111
+        self.assertIs(conn, pool._get_conn())
+        self.assertIsNone(conn.sock)
+
+
+class TestReleasingClient(unittest.TestCase):
+    """Tests for scality_glance_store.connpool.ReleasingClientMixin"""
+
+    def setUp(self):
+        self.response = mock.Mock()
+        self.response.stream.return_value = iter(['a', 'b'])
+
+        def do_http(caller_name, handlers, method, *args, **kwargs):
+            result, _release = handlers[200](self.response)
+            return result
+
+        patcher = mock.patch.object(sproxyd_client.SproxydClient, '_do_http',
+                                    side_effect=do_http)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        client_class = connpool.releasing(sproxyd_client.SproxydClient)
+        self.assertIs(client_class,
+                      connpool.releasing(sproxyd_client.SproxydClient))
+        with mock.patch('eventlet.spawn', mock.Mock()):
+            self.client = client_class(['http://h0:81/proxy/'])
+
+    def test_read(self):
+        _, data_iterator = self.client.get_object('key')
+        self.assertEqual(['a', 'b'], list(data_iterator))
+        self.response.release_conn.assert_called_once_with()
+
+        # Closing after the end doesn't drop the connection
+        data_iterator.close()
+        self.assertFalse(self.response.close.called)
+
+    def test_closed_early(self):
+        _, data_iterator = self.client.get_object('key')
+        self.assertEqual('a', next(data_iterator))
+        data_iterator.close()
+        self.response.close.assert_called_once_with()
+        self.response.release_conn.assert_called_once_with()
+
+        data_iterator.close()
+        self.assertEqual(1, self.response.close.call_count)
@@ -0,0 +1,59 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.hashing"""
+
+import hashlib
+import unittest
+import zlib
+
+from scality_glance_store import hashing
+
+
+DATA = ['abc', 'defgh', '', 'ijklmnop']
+
+
+def digest(hasher):
+    for chunk in DATA:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class TestHashing(unittest.TestCase):
+    """Tests for scality_glance_store.hashing"""
+
+    def test_hashlib_algorithm(self):
+        self.assertEqual(hashlib.sha256(''.join(DATA)).hexdigest(),
+                         digest(hashing.new('sha256')))
+
+    def test_checksums(self):
+        self.assertEqual('%08x' % (zlib.adler32(''.join(DATA)) & 0xffffffff),
+                         digest(hashing.new('adler32')))
+        self.assertEqual('%08x' % (zlib.crc32(''.join(DATA)) & 0xffffffff),
+                         digest(hashing.new('crc32')))
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(ValueError, hashing.new, 'nope')
+
+    def test_multihash(self):
+        multihash = hashing.MultiHash('md5', 'sha512')
+        data = ''.join(DATA)
+
+        self.assertEqual(hashlib.md5(data).hexdigest(), digest(multihash))
+        self.assertEqual(hashlib.sha512(data).hexdigest(),
+                         multihash.hexdigest('sha512'))
+        self.assertEqual({'md5': hashlib.md5(data).hexdigest(),
+                          'sha512': hashlib.sha512(data).hexdigest()},
+                         multihash.hexdigests())
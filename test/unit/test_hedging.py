@@ -0,0 +1,168 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.hedging"""
+
+import mock
+import threading
+import unittest
+
+from scality_sproxyd_client import sproxyd_client
+
+from scality_glance_store import balancer
+from scality_glance_store import hedging
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Tests for scality_glance_store.hedging.TokenBucket"""
+
+    def test_ratio(self):
+        bucket = hedging.TokenBucket(0.25, burst=2)
+
+        allowed = 0
+        for _i in range(100):
+            bucket.add()
+            allowed += bucket.take()
+        # One more with the initial token
+        self.assertEqual(26, allowed)
+
+    def test_burst(self):
+        bucket = hedging.TokenBucket(0.5, burst=2)
+        for _i in range(100):
+            bucket.add()
+
+        self.assertEqual([True, True, False],
+                         [bucket.take() for _i in range(3)])
+
+
+class SlowThenFast(object):
+    """A request blocking on its first call until it's released."""
+
+    def __init__(self):
+        self.calls = 0
+        self.released = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls == 1:
+            self.released.wait(5)
+            return 'slow'
+        return 'fast'
+
+
+class TestHedger(unittest.TestCase):
+    """Tests for scality_glance_store.hedging.Hedger"""
+
+    def test_fast(self):
+        func = mock.Mock(return_value='result')
+        cancel = mock.Mock()
+
+        self.assertEqual('result',
+                         hedging.Hedger(1, max_ratio=1).call(func, cancel))
+        func.assert_called_once_with()
+        self.assertFalse(cancel.called)
+
+    def test_hedged(self):
+        func = SlowThenFast()
+        cancelled = threading.Event()
+        cancel = mock.Mock(side_effect=lambda result: cancelled.set())
+
+        self.assertEqual('fast',
+                         hedging.Hedger(0.01, max_ratio=1).call(func, cancel))
+
+        # The slow request is cancelled once it answers
+        func.released.set()
+        cancelled.wait(5)
+        cancel.assert_called_once_with('slow')
+
+    def test_primary_latency_recorded(self):
+        func = SlowThenFast()
+        cancelled = threading.Event()
+        hedger = hedging.Hedger(0.01, max_ratio=1)
+
+        self.assertEqual('fast', hedger.call(
+            func, lambda result: cancelled.set()))
+        self.assertEqual([], list(hedger._latencies))
+
+        # The slow request lost, but its latency is recorded
+        func.released.set()
+        cancelled.wait(5)
+        self.assertEqual(1, len(hedger._latencies))
+
+    def test_hedge_ratio(self):
+        func = SlowThenFast()
+        func.released.set()
+        hedger = hedging.Hedger(0.01, max_ratio=0)
+        # Only one token to begin with
+        hedger._bucket.take()
+
+        with mock.patch.object(hedging._Race, 'wait', return_value=False):
+            self.assertEqual('slow', hedger.call(func, mock.Mock()))
+        self.assertEqual(1, func.calls)
+
+    def test_failures(self):
+        errors = [IOError('first'), IOError('second')]
+
+        def fail():
+            raise errors.pop(0)
+
+        hedger = hedging.Hedger(0.01, max_ratio=1)
+        with mock.patch.object(hedging._Race, 'wait', return_value=False):
+            self.assertRaises(IOError, hedger.call, fail, mock.Mock())
+
+    def test_percentile_delay(self):
+        hedger = hedging.Hedger(1, percentile=90, window=10)
+        self.assertEqual(1, hedger.get_delay())
+
+        hedger._latencies.extend(i / 10.0 for i in range(10))
+        self.assertEqual(0.9, hedger.get_delay())
+
+
+ENDPOINTS = ['http://h0:81/proxy/', 'http://h1:81/proxy/',
+             'http://h2:81/proxy/']
+
+
+@mock.patch('eventlet.spawn', mock.Mock())
+class TestEndpointAvoidingClient(unittest.TestCase):
+    """Tests for scality_glance_store.hedging.EndpointAvoidingClientMixin"""
+
+    def check_avoiding(self, client):
+        used = set()
+        with client.avoiding(used):
+            first = client.get_next_endpoint()
+        self.assertEqual(set([first]), used)
+
+        for _i in range(10):
+            used = set([first])
+            with client.avoiding(used):
+                self.assertNotEqual(first, client.get_next_endpoint())
+
+        # No endpoint left to avoid the used ones
+        used = set(client._alive)
+        with client.avoiding(used):
+            self.assertIn(client.get_next_endpoint(), client._alive)
+
+    def test_round_robin(self):
+        client_class = hedging.endpoint_avoiding(sproxyd_client.SproxydClient)
+        self.assertIs(client_class, hedging.endpoint_avoiding(
+            sproxyd_client.SproxydClient))
+
+        self.check_avoiding(client_class(ENDPOINTS))
+
+    def test_balanced(self):
+        client = hedging.endpoint_avoiding(
+            balancer.BalancedSproxydClient)(ENDPOINTS)
+
+        self.check_avoiding(client)
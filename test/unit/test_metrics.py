@@ -0,0 +1,193 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.metrics"""
+
+import mock
+import unittest
+import urllib2
+import urlparse
+
+import scality_sproxyd_client.exceptions
+
+from scality_glance_store import metrics
+
+
+class TestPrometheusSink(unittest.TestCase):
+    """Tests for scality_glance_store.metrics.PrometheusSink"""
+
+    def test_render(self):
+        sink = metrics.PrometheusSink(buckets=(1, 10))
+        sink.increment(metrics.BYTES, 5, {'operation': 'get'})
+        sink.increment(metrics.BYTES, 3, {'operation': 'get'})
+        sink.add('gauge', 2, {'name': 'a "quoted"\\name'})
+        sink.add('gauge', -1, {'name': 'a "quoted"\\name'})
+        sink.observe('histogram', 0.5)
+        sink.observe('histogram', 5)
+        sink.observe('histogram', 50)
+
+        self.assertEqual(
+            '# TYPE gauge gauge\n'
+            'gauge{name="a \\"quoted\\"\\\\name"} 1.0\n'
+            '# TYPE histogram histogram\n'
+            'histogram_bucket{le="1.0"} 1.0\n'
+            'histogram_bucket{le="10.0"} 2.0\n'
+            'histogram_bucket{le="+Inf"} 3.0\n'
+            'histogram_sum 55.5\n'
+            'histogram_count 3.0\n'
+            '# HELP scality_bytes_total Bytes of images read or written.\n'
+            '# TYPE scality_bytes_total counter\n'
+            'scality_bytes_total{operation="get"} 8.0\n',
+            sink.render())
+
+    def test_serve(self):
+        sink = metrics.PrometheusSink()
+        sink.increment('counter')
+        server = sink.serve(0, '127.0.0.1')
+        self.addCleanup(server.shutdown)
+
+        response = urllib2.urlopen('http://127.0.0.1:%d/metrics' %
+                                   server.server_address[1])
+        self.assertEqual(metrics.PrometheusSink.CONTENT_TYPE,
+                         response.info()['Content-Type'])
+        self.assertEqual(sink.render(), response.read())
+
+
+class TestLoadSink(unittest.TestCase):
+    """Tests for scality_glance_store.metrics.load_sink"""
+
+    def test_load_sink(self):
+        self.assertIsInstance(metrics.load_sink('prometheus'),
+                              metrics.PrometheusSink)
+        self.assertIsInstance(
+            metrics.load_sink('scality_glance_store.metrics.Sink'),
+            metrics.Sink)
+        self.assertRaises(ImportError, metrics.load_sink,
+                          'scality_glance_store.metrics.Missing')
+
+
+class TestMetered(unittest.TestCase):
+    """Tests for scality_glance_store.metrics.metered"""
+
+    @mock.patch('time.time', return_value=110)
+    def test_metered(self, mock_time):
+        sink = mock.Mock()
+        chunks = metrics.metered(iter(['ab', 'cde']), sink, 'get', 100)
+
+        self.assertEqual('ab', next(chunks))
+        sink.observe.assert_called_once_with(metrics.FIRST_BYTE_SECONDS, 10,
+                                             {'operation': 'get'})
+        self.assertEqual(['cde'], list(chunks))
+
+        sink.increment.assert_called_once_with(metrics.BYTES, 5,
+                                               {'operation': 'get'})
+        sink.observe.assert_called_with(metrics.OPERATION_SECONDS, 10,
+                                        {'operation': 'get'})
+
+    def test_metered_error(self):
+        def failing():
+            yield 'ab'
+            raise IOError()
+
+        sink = mock.Mock()
+        chunks = metrics.metered(failing(), sink, 'get', 100)
+
+        self.assertRaises(IOError, list, chunks)
+        sink.increment.assert_any_call(metrics.OPERATION_ERRORS,
+                                       labels={'operation': 'get',
+                                               'error': 'IOError'})
+        sink.increment.assert_any_call(metrics.BYTES, 2,
+                                       {'operation': 'get'})
+
+    def test_timed_hasher(self):
+        sink = mock.Mock()
+        hasher = mock.Mock()
+
+        metrics.TimedHasher(hasher, sink, 'hashing').update('data')
+
+        hasher.update.assert_called_once_with('data')
+        self.assertEqual('hashing', sink.increment.call_args[0][0])
+
+
+class FakeClient(object):
+    """The bits of `SproxydClient` instrumented by the mixin."""
+
+    def __init__(self, endpoint, status):
+        self._endpoint = urlparse.urlparse(endpoint)
+        self._status = status
+
+    def get_next_endpoint(self):
+        return self._endpoint
+
+    def _do_http(self, caller_name, handlers, method, path):
+        self.get_next_endpoint()
+        if self._status is None:
+            raise scality_sproxyd_client.exceptions.SproxydException('')
+        if self._status not in handlers:
+            raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                '', http_status=self._status)
+        return handlers[self._status](None)
+
+
+class TestInstrumentedClient(unittest.TestCase):
+    """Tests for scality_glance_store.metrics.instrumented"""
+
+    def make_client(self, status):
+        self.sink = metrics.PrometheusSink()
+        client_class = metrics.instrumented(FakeClient)
+        self.assertIs(client_class, metrics.instrumented(FakeClient))
+        return client_class('http://h1:81/proxy/', status, sink=self.sink)
+
+    def get_value(self, name, **labels):
+        return self.sink._values[name][metrics._labels_key(labels)]
+
+    def test_response(self):
+        client = self.make_client(200)
+
+        self.assertEqual('result', client._do_http(
+            'head', {200: lambda response: 'result'}, 'HEAD', 'key'))
+
+        self.assertEqual(1, self.get_value(metrics.SPROXYD_RESPONSES,
+                                           method='HEAD', status=200))
+        self.assertEqual(0, self.get_value(metrics.SPROXYD_IN_FLIGHT,
+                                           endpoint='http://h1:81/proxy/'))
+
+    def test_unexpected_status(self):
+        client = self.make_client(503)
+
+        self.assertRaises(
+            scality_sproxyd_client.exceptions.SproxydHTTPException,
+            client._do_http, 'get', {}, 'GET', 'key')
+
+        self.assertEqual(1, self.get_value(metrics.SPROXYD_RESPONSES,
+                                           method='GET', status=503))
+
+    def test_no_response(self):
+        client = self.make_client(None)
+
+        self.assertRaises(scality_sproxyd_client.exceptions.SproxydException,
+                          client._do_http, 'get', {}, 'GET', 'key')
+
+        self.assertEqual(1, self.get_value(metrics.SPROXYD_RESPONSES,
+                                           method='GET', status='error'))
+        self.assertEqual(0, self.get_value(metrics.SPROXYD_IN_FLIGHT,
+                                           endpoint='http://h1:81/proxy/'))
+
+    def test_not_tracked_outside_requests(self):
+        client = self.make_client(200)
+
+        client.get_next_endpoint()
+
+        self.assertNotIn(metrics.SPROXYD_IN_FLIGHT, self.sink._values)
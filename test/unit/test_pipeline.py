@@ -0,0 +1,88 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.pipeline"""
+
+import hashlib
+import mock
+import unittest
+
+from scality_glance_store import pipeline
+
+
+def chunks_then_fail(chunks):
+    for chunk in chunks:
+        yield chunk
+    raise IOError()
+
+
+class TestHashingStage(unittest.TestCase):
+    """Tests for scality_glance_store.pipeline.hashing_stage"""
+
+    CHUNKS = [str(i) * 1000 for i in range(10)]
+
+    def assert_hashes(self, stage_chunks, checksum):
+        self.assertEqual(self.CHUNKS, stage_chunks)
+        self.assertEqual(hashlib.md5(''.join(self.CHUNKS)).hexdigest(),
+                         checksum.hexdigest())
+
+    def test_inline(self):
+        checksum = hashlib.md5()
+        stage = pipeline.hashing_stage(iter(self.CHUNKS), [checksum])
+        self.assertIsInstance(stage, pipeline.InlineHashing)
+
+        stage_chunks = list(stage)
+        stage.close()
+
+        self.assert_hashes(stage_chunks, checksum)
+
+    def test_pipelined(self):
+        checksum = hashlib.md5()
+        verifier = mock.Mock()
+        stage = pipeline.hashing_stage(iter(self.CHUNKS),
+                                       [checksum, verifier], depth=2)
+        self.assertIsInstance(stage, pipeline.PipelinedHashing)
+
+        stage_chunks = list(stage)
+        stage.close()
+
+        self.assert_hashes(stage_chunks, checksum)
+        self.assertEqual([mock.call(chunk) for chunk in self.CHUNKS],
+                         verifier.update.call_args_list)
+
+    def test_pipelined_with_exception_in_hasher(self):
+        verifier = mock.Mock()
+        verifier.update.side_effect = ValueError
+        stage = pipeline.hashing_stage(iter(self.CHUNKS), [verifier],
+                                       depth=2)
+
+        self.assertEqual(self.CHUNKS, list(stage))
+        self.assertRaises(ValueError, stage.close)
+
+    def test_pipelined_with_exception_in_reader(self):
+        stage = pipeline.hashing_stage(chunks_then_fail(self.CHUNKS),
+                                       [hashlib.md5()], depth=2)
+
+        self.assertRaises(IOError, list, stage)
+
+    def test_pipelined_abort(self):
+        stage = pipeline.hashing_stage(iter(self.CHUNKS), [hashlib.md5()],
+                                       depth=1)
+
+        self.assertEqual(self.CHUNKS[0], next(iter(stage)))
+        stage.abort()
+        # The reader is not left blocked on the queue of the consumer
+        stage._reader.join(5)
+        self.assertFalse(stage._reader.is_alive())
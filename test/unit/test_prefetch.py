@@ -0,0 +1,99 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.prefetch"""
+
+import time
+import unittest
+
+from scality_glance_store import prefetch
+
+
+class Source(object):
+    """An endless source of chunks, counting the chunks read."""
+
+    def __init__(self, chunk_size=10):
+        self.chunk_size = chunk_size
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            while True:
+                self.read += 1
+                yield str(self.read % 10) * self.chunk_size
+        finally:
+            self.closed = True
+
+    def wait_for(self, read):
+        deadline = time.time() + 5
+        while self.read < read and time.time() < deadline:
+            time.sleep(0.001)
+        # Give the reader a chance to go further than it should
+        time.sleep(0.01)
+
+
+class TestReadAhead(unittest.TestCase):
+    """Tests for scality_glance_store.prefetch.ReadAhead"""
+
+    def test_chunks(self):
+        chunks = [str(i) * 10 for i in range(10)]
+
+        self.assertEqual(chunks, list(prefetch.ReadAhead(iter(chunks), 3)))
+
+    def test_depth(self):
+        source = Source()
+        read_ahead = prefetch.ReadAhead(iter(source), 2)
+        self.addCleanup(read_ahead.close)
+
+        # Two chunks buffered, and the reader waiting for room for a third
+        source.wait_for(3)
+        self.assertEqual(3, source.read)
+
+        self.assertEqual('1' * 10, next(read_ahead))
+        source.wait_for(4)
+        self.assertEqual(4, source.read)
+
+    def test_max_bytes(self):
+        source = Source(chunk_size=100)
+        read_ahead = prefetch.ReadAhead(iter(source), 10, max_bytes=250)
+        self.addCleanup(read_ahead.close)
+
+        source.wait_for(4)
+        self.assertEqual(4, source.read)
+
+    def test_close(self):
+        source = Source()
+        read_ahead = prefetch.ReadAhead(iter(source), 2)
+        next(read_ahead)
+
+        read_ahead.close()
+
+        read_ahead._reader.join(5)
+        self.assertFalse(read_ahead._reader.is_alive())
+        self.assertTrue(source.closed)
+
+    def test_exception(self):
+        def chunks_then_fail():
+            yield 'a'
+            yield 'b'
+            raise IOError()
+
+        read_ahead = prefetch.ReadAhead(chunks_then_fail(), 5)
+
+        # Chunks read before the failure are handed over first
+        self.assertEqual('a', next(read_ahead))
+        self.assertEqual('b', next(read_ahead))
+        self.assertRaises(IOError, next, read_ahead)
@@ -0,0 +1,162 @@
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for scality_glance_store.singleflight"""
+
+import mock
+import unittest
+
+from scality_glance_store import singleflight
+
+
+CHUNKS = ['aaaa', 'bbbb', 'cccc', 'dddd']
+DATA = ''.join(CHUNKS)
+
+
+class TestSharedStreams(unittest.TestCase):
+    """Tests for scality_glance_store.singleflight.SharedStreams"""
+
+    def setUp(self):
+        self.opener = mock.Mock(return_value=(iter(CHUNKS), len(DATA)))
+        self.fallback = mock.Mock(side_effect=lambda offset: [DATA[offset:]])
+
+    def get(self, streams):
+        stream = streams.get('image', self.opener, self.fallback)
+        self.assertEqual(len(DATA), stream.open())
+        return stream.read()
+
+    def test_readers_share_one_upstream_stream(self):
+        streams = singleflight.SharedStreams(100)
+        reader0 = self.get(streams)
+        reader1 = self.get(streams)
+
+        self.assertEqual(CHUNKS[:2], [next(reader0), next(reader0)])
+        reader2 = self.get(streams)
+        self.assertEqual(CHUNKS, list(reader1))
+        self.assertEqual(CHUNKS, list(reader2))
+        self.assertEqual(CHUNKS[2:], list(reader0))
+
+        self.opener.assert_called_once_with()
+        self.assertFalse(self.fallback.called)
+
+    def test_lagging_reader_falls_back(self):
+        streams = singleflight.SharedStreams(8)
+        reader0 = self.get(streams)
+        reader1 = self.get(streams)
+
+        self.assertEqual(CHUNKS[0], next(reader1))
+        self.assertEqual(CHUNKS, list(reader0))
+        self.assertEqual(DATA[4:], ''.join(reader1))
+
+        self.fallback.assert_called_once_with(4)
+
+    def test_stream_not_joinable_once_started(self):
+        streams = singleflight.SharedStreams(4)
+        reader0 = self.get(streams)
+        next(reader0)
+        next(reader0)
+
+        self.opener.return_value = (iter(CHUNKS), len(DATA))
+        self.assertEqual(CHUNKS, list(self.get(streams)))
+        self.assertEqual(2, self.opener.call_count)
+
+    def test_stream_not_joinable_once_read(self):
+        streams = singleflight.SharedStreams(100)
+        self.assertEqual(CHUNKS, list(self.get(streams)))
+
+        self.opener.return_value = (iter(CHUNKS), len(DATA))
+        self.assertEqual(CHUNKS, list(self.get(streams)))
+        self.assertEqual(2, self.opener.call_count)
+
+    def test_open_failure(self):
+        streams = singleflight.SharedStreams(100)
+        self.opener.side_effect = IOError
+        stream = streams.get('image', self.opener, self.fallback)
+
+        self.assertRaises(IOError, stream.open)
+        self.assertRaises(IOError, stream.open)
+        self.opener.assert_called_once_with()
+
+        self.opener.side_effect = None
+        self.assertEqual(CHUNKS, list(self.get(streams)))
+
+    def test_upstream_failure(self):
+        def chunks():
+            yield CHUNKS[0]
+            raise IOError()
+
+        self.opener.return_value = (chunks(), len(DATA))
+        streams = singleflight.SharedStreams(100)
+        reader0 = self.get(streams)
+        reader1 = self.get(streams)
+
+        self.assertEqual(CHUNKS[0], next(reader0))
+        self.assertRaises(IOError, next, reader0)
+        self.assertEqual(CHUNKS[0], next(reader1))
+        self.assertRaises(IOError, next, reader1)
+
+    def test_late_reader_joins(self):
+        streams = singleflight.SharedStreams(100)
+        reader0 = self.get(streams)
+        self.assertEqual(CHUNKS[:2], [next(reader0), next(reader0)])
+
+        # The start of the stream is still buffered
+        reader1 = self.get(streams)
+        self.assertEqual(CHUNKS, list(reader1))
+        self.assertEqual(CHUNKS[2:], list(reader0))
+
+        self.opener.assert_called_once_with()
+        self.assertFalse(self.fallback.called)
+
+    def test_chunks_read_by_all_readers_are_dropped(self):
+        streams = singleflight.SharedStreams(8)
+        stream = streams.get('image', self.opener, self.fallback)
+        stream.open()
+        reader0 = stream.read()
+        reader1 = stream.read()
+
+        self.assertEqual(CHUNKS[:2], [next(reader0), next(reader0)])
+        self.assertEqual(CHUNKS[:2], [next(reader1), next(reader1)])
+        self.assertEqual(CHUNKS[:2], list(stream._buffer))
+
+        # Once the start of the stream is gone
+        self.assertEqual(CHUNKS[2], next(reader0))
+        self.assertEqual([CHUNKS[2]], list(stream._buffer))
+        self.assertFalse(stream.joinable())
+
+        reader1.close()
+        self.assertEqual(0, len(stream._buffer))
+
+    def test_abandoned_stream_is_closed(self):
+        closed = []
+
+        def upstream():
+            try:
+                for chunk in CHUNKS:
+                    yield chunk
+            finally:
+                closed.append(True)
+
+        self.opener.return_value = (upstream(), len(DATA))
+        streams = singleflight.SharedStreams(100)
+        reader = self.get(streams)
+
+        self.assertEqual(CHUNKS[0], next(reader))
+        reader.close()
+
+        self.assertEqual([True], closed)
+        self.opener.return_value = (iter(CHUNKS), len(DATA))
+        self.assertEqual(CHUNKS, list(self.get(streams)))
+        self.assertEqual(2, self.opener.call_count)
@@ -15,24 +15,137 @@
 
 """Tests for Scality Glance Store"""
 
+import base64
 import hashlib
+import httplib
+import json
 import logging
 import mock
+import os
+import pickle
+import shutil
+import socket
 import StringIO
+import tempfile
+import threading
+import time
 import unittest
 import uuid
+import zlib
 
 import glance_store.exceptions
 import glance_store.tests.base
+try:
+    from oslo_utils import units
+except ImportError:
+    from oslo.utils import units
 
 import scality_sproxyd_client.exceptions
+from scality_sproxyd_client import sproxyd_client
 
+from scality_glance_store import balancer
+from scality_glance_store import metrics
+from scality_glance_store import prefetch
+from scality_glance_store import resumable
 from scality_glance_store.store import StoreLocation
 from scality_glance_store.store import Store
 from . import utils
 
 logging.getLogger('stevedore.extension').level = logging.INFO
 
+MANIFEST_HEADERS = {
+    'X-Scal-Usermd': base64.b64encode(pickle.dumps({'layout': 'manifest'}))
+}
+
+
+def fake_get_object(objects):
+    """
+    Build a fake `SproxydClient.get_object` serving `objects`, a dict mapping
+    keys to (headers, data) tuples, and honoring Range headers.
+    """
+
+    def get_object(key, headers=None):
+        obj_headers, data = objects[key]
+        obj_headers = dict(obj_headers, **{'Content-Length': len(data)})
+        if headers:
+            start, stop = headers['Range'][len('bytes='):].split('-')
+            if int(start) >= len(data):
+                raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                    '', http_status=416)
+            stop = min(int(stop), len(data) - 1) if stop else len(data) - 1
+            obj_headers['Content-Range'] = 'bytes %s-%d/%d' % (
+                start, stop, len(data))
+            data = data[int(start):stop + 1]
+            obj_headers['Content-Length'] = len(data)
+
+        # Yield the data in small chunks
+        return obj_headers, iter([data[i:i + 3]
+                                  for i in range(0, len(data), 3)])
+
+    return get_object
+
+
+class FakeSproxyd(object):
+    """
+    In-memory stand-in for the object methods of `SproxydClient`, storing
+    objects as (user metadata, data) tuples in `objects`.
+    """
+
+    METHODS = ['head', 'get_object', 'put_object', 'get_meta', 'put_meta',
+               'del_object']
+
+    def __init__(self):
+        self.objects = {}
+
+    def patch(self, test):
+        for name in self.METHODS:
+            patcher = mock.patch('scality_sproxyd_client.sproxyd_client.'
+                                 'SproxydClient.%s' % name,
+                                 side_effect=getattr(self, name))
+            patcher.start()
+            test.addCleanup(patcher.stop)
+
+    def _check_exists(self, key):
+        if key not in self.objects:
+            raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                '', http_status=404)
+
+    def _get_headers(self, key):
+        usermd, data = self.objects[key]
+        headers = {'Content-Length': str(len(data))}
+        if usermd is not None:
+            headers['X-Scal-Usermd'] = base64.b64encode(pickle.dumps(usermd))
+        return headers
+
+    def head(self, key, headers=None):
+        self._check_exists(key)
+        return self._get_headers(key)
+
+    def get_object(self, key, headers=None):
+        self._check_exists(key)
+        objects = {key: (self._get_headers(key), self.objects[key][1])}
+        return fake_get_object(objects)(key, headers)
+
+    def put_object(self, key, body, headers=None):
+        headers = headers or {}
+        if headers.get('If-None-Match') == '*' and key in self.objects:
+            raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                '', http_status=412)
+        usermd = headers.get('X-Scal-Usermd')
+        if usermd:
+            usermd = pickle.loads(base64.b64decode(usermd))
+        self.objects[key] = (usermd, body)
+
+    def get_meta(self, key):
+        return self.objects[key][0] if key in self.objects else None
+
+    def put_meta(self, key, metadata):
+        self._check_exists(key)
+        self.objects[key] = (metadata, self.objects[key][1])
+
+    def del_object(self, key, headers=None):
+        self.objects.pop(key, None)
+
 
 class MockLocation(object):
     def __init__(self, image_id):
@@ -75,6 +188,11 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
         self.set_sproxyd_endpoints_in_conf(['http://h0:81/proxy/path/',
                                             'http://h1:82/proxy/path/'])
 
+        patcher = mock.patch('scality_glance_store.store._new_upload_id',
+                             return_value='u1')
+        self.mock_new_upload_id = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def set_sproxyd_endpoints_in_conf(self, endpoints):
         self.conf.set_override('scality_sproxyd_endpoints', endpoints,
                                group='glance_store')
@@ -96,6 +214,30 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
 
         self.assertEqual(endpoints, actual_endpoints)
 
+    def test_init_with_load_balancing(self):
+        self.conf.set_override('scality_sproxyd_load_balancing', True,
+                               group='glance_store')
+
+        store = Store(self.conf)
+
+        self.assertIsInstance(store._sproxyd_client,
+                              balancer.BalancedSproxydClient)
+
+    def test_init_hedging(self):
+        self.conf.set_override('scality_hedge_delay', 0.5,
+                               group='glance_store')
+        self.assertIsNotNone(Store(self.conf)._hedger)
+
+        # Requests would be hedged to the same endpoint
+        self.set_sproxyd_endpoints_in_conf(['http://h0:81/proxy/path/'])
+        self.assertIsNone(Store(self.conf)._hedger)
+
+    def test_init_with_unknown_hash_algorithm(self):
+        self.conf.set_override('scality_hash_algorithm', 'nope',
+                               group='glance_store')
+        self.assertRaises(glance_store.exceptions.BadStoreConfiguration,
+                          Store, self.conf)
+
     def test_get_schemes(self):
         store = Store(self.conf)
 
@@ -112,7 +254,7 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
 
         self.assertRaises(glance_store.exceptions.RemoteServiceUnavailable,
                           store.get, location)
-        mock_get_object.assert_called_once_with(image_id)
+        mock_get_object.assert_called_once_with(image_id, None)
 
     def test_get(self):
         store = Store(self.conf)
@@ -135,11 +277,566 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
                 mock_get_object):
             resp, content_length = store.get(location)
 
-        mock_get_object.assert_called_once_with(image_id)
+        mock_get_object.assert_called_once_with(image_id, None)
         self.assertEqual(len(data), content_length)
         self.assertEqual(data, resp.another())
         self.assertEqual('', resp.another())
 
+    def test_get_with_offset_and_chunk_size(self):
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        data = '*'*20
+        headers = {'Content-Length': len(data),
+                   'Content-Range': 'bytes 10-29/80'}
+
+        mock_get_object = mock.Mock()
+        mock_get_object.return_value = headers, iter([data])
+
+        with mock.patch(
+                'scality_sproxyd_client.sproxyd_client.'
+                'SproxydClient.get_object',
+                mock_get_object):
+            resp, content_length = store.get(location, offset=10,
+                                             chunk_size=20)
+
+        mock_get_object.assert_called_once_with(
+            image_id, {'Range': 'bytes=10-29'})
+        self.assertEqual(20, content_length)
+        self.assertEqual(data, ''.join(resp))
+
+    def test_get_with_offset_and_range_ignored(self):
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        data = ''.join(chr(ord('a') + i) for i in range(26))
+        headers = {'Content-Length': len(data)}
+
+        mock_get_object = mock.Mock()
+        mock_get_object.return_value = headers, iter([data[:8], data[8:]])
+
+        with mock.patch(
+                'scality_sproxyd_client.sproxyd_client.'
+                'SproxydClient.get_object',
+                mock_get_object):
+            resp, content_length = store.get(location, offset=10,
+                                             chunk_size=5)
+
+        mock_get_object.assert_called_once_with(
+            image_id, {'Range': 'bytes=10-14'})
+        self.assertEqual(5, content_length)
+        self.assertEqual(data[10:15], ''.join(resp))
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+                mock.Mock(return_value={}))
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.get_object',
+        side_effect=scality_sproxyd_client.exceptions.SproxydHTTPException(
+            '', http_status=416))
+    def test_get_with_offset_beyond_end(self, mock_get_object):
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        resp, content_length = store.get(location, offset=100)
+
+        mock_get_object.assert_called_once_with(image_id,
+                                                {'Range': 'bytes=100-'})
+        self.assertEqual(0, content_length)
+        self.assertEqual('', ''.join(resp))
+
+    def test_get_with_download_chunk_size(self):
+        self.conf.set_override('scality_download_chunk_size',
+                               4 * Store.CHUNKSIZE, group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        chunks = [str(i) * Store.CHUNKSIZE for i in range(6)]
+        headers = {'Content-Length': 6 * Store.CHUNKSIZE}
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        return_value=(headers, iter(chunks))):
+            resp, content_length = store.get(location)
+
+            self.assertEqual(['0123', '45'],
+                             [chunk[::Store.CHUNKSIZE] for chunk in resp])
+
+    def test_get_with_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.conf.set_override('scality_cache_dir', cache_dir,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+        data = 'x' * 100
+
+        get_object = fake_get_object({image_id: ({}, data)})
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        side_effect=get_object) as mock_get_object:
+            resp, content_length = store.get(location)
+            self.assertEqual(data, ''.join(resp))
+
+            # Now served from the cache
+            resp, content_length = store.get(location)
+            self.assertEqual(data, ''.join(resp))
+            resp, content_length = store.get(location, offset=90)
+            self.assertEqual(10, content_length)
+            self.assertEqual(data[90:], ''.join(resp))
+
+        mock_get_object.assert_called_once_with(image_id, None)
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head', return_value={}):
+            with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                            'SproxydClient.del_object'):
+                store.delete(location)
+        self.assertEqual([], os.listdir(cache_dir))
+
+    def test_get_coalesced(self):
+        self.conf.set_override('scality_coalesce_reads', True,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+        data = 'x' * 100
+
+        get_object = fake_get_object({image_id: ({}, data)})
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        side_effect=get_object) as mock_get_object:
+            resp0, content_length0 = store.get(location)
+            resp1, content_length1 = store.get(location)
+
+            self.assertEqual(100, content_length0)
+            self.assertEqual(100, content_length1)
+            self.assertEqual(data, ''.join(resp0))
+            self.assertEqual(data, ''.join(resp1))
+
+        mock_get_object.assert_called_once_with(image_id, None)
+
+    def test_get_read_ahead(self):
+        self.conf.set_override('scality_read_ahead_depth', 2,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        data = 'abcdefghij' * 10
+        sproxyd.objects['image'] = (None, data)
+        store = Store(self.conf)
+
+        iterator, size = store.get(MockLocation('image'))
+        self.assertIsInstance(iterator.wrapped, prefetch.ReadAhead)
+        self.assertEqual(len(data), size)
+        self.assertEqual(data, ''.join(iterator))
+
+        iterator, size = store.get(MockLocation('image'), 5, 10)
+        self.assertEqual(data[5:15], ''.join(iterator))
+
+    def _break_reads(self, sproxyd, break_after, breaks, error=True):
+        """
+        Make the first `breaks` reads of objects fail after `break_after`
+        bytes, or just end if not `error`, and return the mock of
+        `get_object`.
+        """
+        broken = []
+
+        def get_object(key, headers=None):
+            response_headers, data_iterator = sproxyd.get_object(key, headers)
+            if len(broken) >= breaks:
+                return response_headers, data_iterator
+            broken.append(key)
+
+            def breaking():
+                sent = 0
+                for chunk in data_iterator:
+                    if sent >= break_after:
+                        if not error:
+                            return
+                        raise sproxyd_client.urllib3.exceptions.ProtocolError(
+                            'Connection broken')
+                    sent += len(chunk)
+                    yield chunk
+            return response_headers, breaking()
+
+        patcher = mock.patch('scality_sproxyd_client.sproxyd_client.'
+                             'SproxydClient.get_object',
+                             side_effect=get_object)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _track_responses(self, sproxyd):
+        """
+        Make the data iterators returned by `get_object` record the chunks
+        read from them and whether they were closed, and return the list of
+        these iterators.
+        """
+        responses = []
+
+        class Response(object):
+            def __init__(self, key, chunks):
+                self.key = key
+                self.chunks = chunks
+                self.read = []
+                self.closed = False
+
+            def __iter__(self):
+                return self
+
+            def next(self):
+                chunk = next(self.chunks)
+                self.read.append(chunk)
+                return chunk
+
+            def close(self):
+                self.closed = True
+
+        def get_object(key, headers=None):
+            response_headers, data_iterator = sproxyd.get_object(key, headers)
+            responses.append(Response(key, data_iterator))
+            return response_headers, responses[-1]
+
+        patcher = mock.patch('scality_sproxyd_client.sproxyd_client.'
+                             'SproxydClient.get_object',
+                             side_effect=get_object)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return responses
+
+    def test_get_resumed(self):
+        self.conf.set_override('scality_read_retries', 2,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        data = 'abcdefghij' * 10
+        sproxyd.objects['image'] = (None, data)
+        store = Store(self.conf)
+        # The read is resumed twice
+        mock_get_object = self._break_reads(sproxyd, 30, 2)
+        iterator, size = store.get(MockLocation('image'))
+        self.assertEqual(data, ''.join(iterator))
+        self.assertEqual([mock.call('image', None),
+                          mock.call('image', {'Range': 'bytes=30-99'}),
+                          mock.call('image', {'Range': 'bytes=60-99'})],
+                         mock_get_object.call_args_list)
+
+        mock_get_object = self._break_reads(sproxyd, 30, 1)
+        iterator, size = store.get(MockLocation('image'), 10, 50)
+        self.assertEqual(data[10:60], ''.join(iterator))
+        self.assertEqual([mock.call('image', {'Range': 'bytes=10-59'}),
+                          mock.call('image', {'Range': 'bytes=40-59'})],
+                         mock_get_object.call_args_list)
+
+    def test_get_resumed_after_early_end(self):
+        self.conf.set_override('scality_read_retries', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        data = 'abcdefghij' * 10
+        sproxyd.objects['image'] = (None, data)
+        store = Store(self.conf)
+        mock_get_object = self._break_reads(sproxyd, 12, 1, error=False)
+
+        iterator, size = store.get(MockLocation('image'))
+        self.assertEqual(data, ''.join(iterator))
+        self.assertEqual([mock.call('image', None),
+                          mock.call('image', {'Range': 'bytes=12-99'})],
+                         mock_get_object.call_args_list)
+
+        # Without retries left, the early end is an error
+        self._break_reads(sproxyd, 12, 2, error=False)
+        iterator, size = store.get(MockLocation('image'))
+        self.assertRaises(httplib.IncompleteRead, ''.join, iterator)
+
+    def test_get_resumable_closed(self):
+        self.conf.set_override('scality_read_retries', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        sproxyd.objects['image'] = (None, 'abcdefghij')
+        responses = self._track_responses(sproxyd)
+        store = Store(self.conf)
+
+        iterator, size = store.get(MockLocation('image'))
+        self.assertEqual('abc', next(iterator.wrapped))
+        iterator.wrapped.close()
+
+        # The response isn't read to its end, its connection is dropped
+        self.assertEqual(['abc'], responses[0].read)
+        self.assertTrue(responses[0].closed)
+
+    def test_get_resumed_too_many_times(self):
+        self.conf.set_override('scality_read_retries', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        sproxyd.objects['image'] = (None, 'abcdefghij' * 10)
+        store = Store(self.conf)
+        self._break_reads(sproxyd, 30, 2)
+
+        iterator, size = store.get(MockLocation('image'))
+        self.assertRaises(sproxyd_client.urllib3.exceptions.ProtocolError,
+                          ''.join, iterator)
+
+    def test_get_not_resumed(self):
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        sproxyd.objects['image'] = (None, 'abcdefghij' * 10)
+        store = Store(self.conf)
+        self._break_reads(sproxyd, 30, 1)
+
+        iterator, size = store.get(MockLocation('image'))
+        self.assertRaises(sproxyd_client.urllib3.exceptions.ProtocolError,
+                          ''.join, iterator)
+
+    def test_get_hedged(self):
+        self.conf.set_override('scality_hedge_delay', 0.5,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        sproxyd.objects['image'] = (None, 'abcdef')
+        store = Store(self.conf)
+
+        with mock.patch.object(store._hedger, 'call',
+                               wraps=store._hedger.call) as mock_call:
+            iterator, size = store.get(MockLocation('image'), 1, 3)
+            self.assertEqual('bcd', ''.join(iterator))
+        self.assertEqual(1, mock_call.call_count)
+
+    def test_get_compressed(self):
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        data = 'abcdefghij' * 1000
+        sproxyd.objects['image'] = ({'codec': 'zlib', 'size': len(data)},
+                                    zlib.compress(data))
+        store = Store(self.conf)
+
+        for offset, chunk_size in [(0, None), (5, 100), (9990, 1000),
+                                   (20000, None)]:
+            iterator, size = store.get(MockLocation('image'), offset,
+                                       chunk_size)
+            expected = data[offset:offset + (chunk_size or len(data))]
+            self.assertEqual(len(expected), size)
+            self.assertEqual(expected, ''.join(iterator))
+
+    def test_get_compressed_with_offset(self):
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        data = 'abcdefghij' * 1000
+        sproxyd.objects['image'] = ({'codec': 'zlib', 'size': len(data)},
+                                    zlib.compress(data))
+        responses = self._track_responses(sproxyd)
+        store = Store(self.conf)
+
+        iterator, size = store.get(MockLocation('image'), 10)
+        self.assertEqual(data[10:], ''.join(iterator))
+
+        # The ranged response is closed unread, the object is only
+        # transferred once
+        self.assertEqual(2, len(responses))
+        self.assertEqual([], responses[0].read)
+        self.assertTrue(responses[0].closed)
+        self.assertEqual(zlib.compress(data), ''.join(responses[1].read))
+
+    def test_get_compressed_incomplete(self):
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        # The upload failed before the size was recorded
+        sproxyd.objects['image'] = ({'codec': 'zlib'}, zlib.compress('data'))
+        store = Store(self.conf)
+
+        for offset in (0, 10):
+            self.assertRaises(glance_store.exceptions.BackendException,
+                              store.get, MockLocation('image'), offset)
+        self.assertRaises(glance_store.exceptions.BackendException,
+                          store.get_size, MockLocation('image'))
+        self.assertFalse(store.verify(MockLocation('image')))
+
+    def test_get_multipart(self):
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        manifest = {'size': 10, 'part_size': 4,
+                    'parts': [['p0', 4], ['p1', 4], ['p2', 2]]}
+        get_object = fake_get_object({
+            image_id: (MANIFEST_HEADERS, json.dumps(manifest)),
+            'p0': ({}, '0123'),
+            'p1': ({}, '4567'),
+            'p2': ({}, '89'),
+        })
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        side_effect=get_object) as mock_get_object:
+            resp, content_length = store.get(location)
+            self.assertEqual(10, content_length)
+            self.assertEqual('0123456789', ''.join(resp))
+
+            mock_get_object.reset_mock()
+            resp, content_length = store.get(location, offset=3,
+                                             chunk_size=6)
+            self.assertEqual(6, content_length)
+            self.assertEqual('345678', ''.join(resp))
+
+        mock_get_object.assert_has_calls([
+            mock.call(image_id, {'Range': 'bytes=3-8'}),
+            mock.call(image_id, None),
+            mock.call('p0', {'Range': 'bytes=3-3'}),
+            mock.call('p1', None),
+            mock.call('p2', {'Range': 'bytes=0-0'})])
+
+    def test_get_segmented(self):
+        self.conf.set_override('scality_download_segment_size', 1,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        segment_size = 1024 * 1024
+        data = 'a' * segment_size + 'b' * segment_size + 'c' * 10
+        get_object = fake_get_object({image_id: ({}, data)})
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        side_effect=get_object) as mock_get_object:
+            resp, content_length = store.get(location)
+            self.assertEqual(len(data), content_length)
+            self.assertEqual(data, ''.join(resp))
+
+            mock_get_object.assert_has_calls([
+                mock.call(image_id, {'Range': 'bytes=0-1048575'}),
+                mock.call(image_id, {'Range': 'bytes=1048576-2097151'}),
+                mock.call(image_id, {'Range': 'bytes=2097152-2097161'})],
+                any_order=True)
+
+            resp, content_length = store.get(location, offset=5,
+                                             chunk_size=segment_size)
+            self.assertEqual(segment_size, content_length)
+            self.assertEqual(data[5:5 + segment_size], ''.join(resp))
+
+    def test_get_multipart_segmented(self):
+        self.conf.set_override('scality_download_segment_size', 1,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        part_size = 1024 * 1024 + 3
+        manifest = {'size': 2 * part_size, 'part_size': part_size,
+                    'parts': [['p0', part_size], ['p1', part_size]]}
+        get_object = fake_get_object({
+            image_id: (MANIFEST_HEADERS, json.dumps(manifest)),
+            'p0': ({}, 'a' * part_size),
+            'p1': ({}, 'b' * part_size),
+        })
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        side_effect=get_object) as mock_get_object:
+            resp, content_length = store.get(location)
+            self.assertEqual(2 * part_size, content_length)
+            self.assertEqual('a' * part_size + 'b' * part_size,
+                             ''.join(resp))
+
+        mock_get_object.assert_has_calls([
+            mock.call('p0', {'Range': 'bytes=0-1048575'}),
+            mock.call('p0', {'Range': 'bytes=1048576-1048578'}),
+            mock.call('p1', {'Range': 'bytes=0-1048575'}),
+            mock.call('p1', {'Range': 'bytes=1048576-1048578'})],
+            any_order=True)
+        # The first ranged response holds the whole manifest
+        self.assertEqual(1, [call[0][0] for call in
+                             mock_get_object.call_args_list].count(image_id))
+
+    def test_iter_segments_closed(self):
+        store = Store(self.conf)
+        events = []
+
+        def get_segment(key, start, stop, cancelled):
+            events.append(cancelled)
+            return [key]
+
+        with mock.patch.object(store, '_get_segment',
+                               side_effect=get_segment):
+            chunks = store._iter_segments([('s0', 0, 1), ('s1', 1, 2),
+                                           ('s2', 2, 3)])
+            self.assertEqual('s0', next(chunks))
+            self.assertFalse(events[0].is_set())
+            chunks.close()
+
+        self.assertTrue(events[0].is_set())
+
+    def test_get_segment_cancelled(self):
+        store = Store(self.conf)
+        cancelled = threading.Event()
+        data_iterator = mock.MagicMock()
+        data_iterator.__iter__.return_value = iter(['a', 'b'])
+
+        def get_object(key, headers=None):
+            cancelled.set()
+            return {}, data_iterator
+
+        with mock.patch.object(store, '_get_object', side_effect=get_object):
+            self.assertIsNone(store._get_segment('key', 0, 2, cancelled))
+            data_iterator.close.assert_called_once_with()
+            # Segments not started yet are not requested at all
+            self.assertIsNone(store._get_segment('key', 0, 2, cancelled))
+            self.assertEqual(1, store._get_object.call_count)
+
+    def test_get_size(self):
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        manifest = {'size': 5, 'part_size': 3,
+                    'parts': [['p0', 3], ['p1', 2]]}
+        sproxyd.objects.update({
+            'plain': (None, 'abc'),
+            'compressed': ({'codec': 'zlib', 'size': 100},
+                           zlib.compress('a' * 100)),
+            'manifest': ({'layout': 'manifest'}, json.dumps(manifest)),
+            'reference': ({'layout': 'reference', 'target': 'blob',
+                           'size': 7}, ''),
+        })
+        store = Store(self.conf)
+
+        for image_id, size in [('plain', 3), ('compressed', 100),
+                               ('manifest', 5), ('reference', 7)]:
+            self.assertEqual(size, store.get_size(MockLocation(image_id)))
+        self.assertRaises(glance_store.exceptions.NotFound, store.get_size,
+                          MockLocation('missing'))
+
+    def test_get_size_cached(self):
+        self.conf.set_override('scality_size_cache_ttl', 60,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        sproxyd.objects['image'] = (None, 'abc')
+        store = Store(self.conf)
+
+        self.assertEqual(3, store.get_size(MockLocation('image')))
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head') as mock_head:
+            self.assertEqual(3, store.get_size(MockLocation('image')))
+        self.assertFalse(mock_head.called)
+
+        # Deleting the image invalidates its size
+        store.delete(MockLocation('image'))
+        self.assertRaises(glance_store.exceptions.NotFound, store.get_size,
+                          MockLocation('image'))
+
     @mock.patch(
         'scality_sproxyd_client.sproxyd_client.SproxydClient.head',
         side_effect=scality_sproxyd_client.exceptions.SproxydHTTPException(
@@ -170,7 +867,7 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
         mock_head.assert_called_once_with(image_id)
 
     @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
-                mock.Mock())
+                mock.Mock(return_value={}))
     @mock.patch(
         'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
     def test_delete(self, mock_del_object):
@@ -182,6 +879,190 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
         store.delete(location)
         mock_del_object.assert_called_once_with(image_id)
 
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head')
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    def test_delete_conditional(self, mock_del_object, mock_head):
+        self.conf.set_override('scality_conditional_delete', True,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        store.delete(MockLocation(image_id))
+
+        mock_del_object.assert_called_once_with(
+            image_id, headers={'If-Match': '*'})
+        self.assertFalse(mock_head.called)
+
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object',
+        side_effect=scality_sproxyd_client.exceptions.SproxydHTTPException(
+            '', http_status=412))
+    def test_delete_conditional_not_found(self, mock_del_object):
+        self.conf.set_override('scality_conditional_delete', True,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        self.assertRaises(glance_store.exceptions.NotFound, store.delete,
+                          MockLocation(str(uuid.uuid4())))
+
+    def test_conditional_delete_disabled_with_multipart(self):
+        self.conf.set_override('scality_conditional_delete', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        self.assertFalse(store._conditional_delete)
+
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+        side_effect=scality_sproxyd_client.exceptions.SproxydHTTPException(
+            '', http_status=404))
+    def test_delete_not_found_cached(self, mock_head):
+        self.conf.set_override('scality_not_found_cache_ttl', 60,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+        for _ in range(2):
+            self.assertRaises(glance_store.exceptions.NotFound, store.delete,
+                              location)
+        mock_head.assert_called_once_with(image_id)
+
+        # Adding the image invalidates the cache
+        with mock.patch.object(store, '_add_multipart'):
+            store._upload_part_size = 1
+            store.add(image_id, StringIO.StringIO(''), 0)
+        self.assertRaises(glance_store.exceptions.NotFound, store.delete,
+                          location)
+        self.assertEqual(2, mock_head.call_count)
+
+    def test_delete_many(self):
+        store = Store(self.conf)
+
+        error = scality_sproxyd_client.exceptions.SproxydHTTPException(
+            '', http_status=500)
+        heads = {
+            'deleted': {},
+            'missing': scality_sproxyd_client.exceptions.SproxydHTTPException(
+                '', http_status=404),
+            'failing': error,
+        }
+
+        def fake_head(image_id):
+            if isinstance(heads[image_id], Exception):
+                raise heads[image_id]
+            return heads[image_id]
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head', side_effect=fake_head):
+            with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                            'SproxydClient.del_object') as mock_del_object:
+                results = store.delete_many(
+                    MockLocation(image_id)
+                    for image_id in ['failing', 'missing', 'deleted'])
+
+        self.assertEqual([('failing', 'error', error),
+                          ('missing', 'not found', None),
+                          ('deleted', 'deleted', None)], results)
+        mock_del_object.assert_called_once_with('deleted')
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+                mock.Mock(return_value=MANIFEST_HEADERS))
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    def test_delete_multipart(self, mock_del_object):
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        location = MockLocation(image_id)
+
+        manifest = {'size': 3, 'part_size': 2,
+                    'parts': [['p0', 2], ['p1', 1]]}
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.get_object',
+                        return_value=({}, iter([json.dumps(manifest)]))):
+            store.delete(location)
+
+        self.assertEqual([mock.call('p0'), mock.call('p1'),
+                          mock.call(image_id)],
+                         mock_del_object.call_args_list)
+
+    def test_verify(self):
+        md5 = hashlib.md5('abc').hexdigest()
+        usermd = base64.b64encode(pickle.dumps({'md5': md5, 'size': 3}))
+        heads = {
+            'intact': {'Content-Length': '3', 'X-Scal-Usermd': usermd},
+            'truncated': {'Content-Length': '2', 'X-Scal-Usermd': usermd},
+            'legacy': {'Content-Length': '3'},
+        }
+        store = Store(self.conf)
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head', side_effect=heads.get):
+            self.assertTrue(store.verify(MockLocation('intact'), md5))
+            self.assertTrue(store.verify(MockLocation('legacy'), md5))
+            self.assertFalse(store.verify(MockLocation('intact'), '0' * 32))
+            self.assertFalse(store.verify(MockLocation('truncated')))
+
+    def test_verify_multipart(self):
+        manifest = {'size': 3, 'part_size': 2,
+                    'parts': [['p0', 2], ['p1', 1]]}
+        heads = {
+            'image': MANIFEST_HEADERS,
+            'p0': {'Content-Length': '2'},
+            'p1': {'Content-Length': '1'},
+        }
+
+        def fake_head(key):
+            if key not in heads:
+                raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                    '', http_status=404)
+            return heads[key]
+
+        store = Store(self.conf)
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head', side_effect=fake_head):
+            with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                            'SproxydClient.get_object',
+                            side_effect=lambda *args: (
+                                {}, iter([json.dumps(manifest)]))):
+                self.assertTrue(store.verify(MockLocation('image')))
+
+                del heads['p1']
+                self.assertFalse(store.verify(MockLocation('image')))
+
+    def test_verify_compressed(self):
+        usermd = base64.b64encode(pickle.dumps(
+            {'codec': 'zlib', 'size': 100, 'compressed_size': 10}))
+        legacy_usermd = base64.b64encode(pickle.dumps(
+            {'codec': 'zlib', 'size': 100}))
+        heads = {
+            'intact': {'Content-Length': '10', 'X-Scal-Usermd': usermd},
+            'truncated': {'Content-Length': '9', 'X-Scal-Usermd': usermd},
+            'legacy': {'Content-Length': '9', 'X-Scal-Usermd': legacy_usermd},
+        }
+        store = Store(self.conf)
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.head', side_effect=heads.get):
+            self.assertTrue(store.verify(MockLocation('intact')))
+            self.assertFalse(store.verify(MockLocation('truncated')))
+            # The size of the compressed data wasn't recorded
+            self.assertTrue(store.verify(MockLocation('legacy')))
+
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+        side_effect=scality_sproxyd_client.exceptions.SproxydHTTPException(
+            '', http_status=404))
+    def test_verify_not_found(self, mock_head):
+        store = Store(self.conf)
+        self.assertRaises(glance_store.exceptions.NotFound, store.verify,
+                          MockLocation('missing'))
+
     @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
                 'get_http_conn_for_put', side_effect=scality_sproxyd_client.
                 exceptions.SproxydException())
@@ -224,6 +1105,25 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
 
         mock_del_object.assert_called_once_with(image_id)
 
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put',
+                return_value=(mock.Mock(), mock.Mock()))
+    @mock.patch('glance_store.common.utils.chunkreadable',
+                side_effect=Exception)
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    def test_add_with_upload_chunk_size(self, mock_del_object,
+                                        mock_chunkreadable,
+                                        mock_get_http_conn_for_put):
+        self.conf.set_override('scality_upload_chunk_size', 1024,
+                               group='glance_store')
+        store = Store(self.conf)
+
+        image_id = str(uuid.uuid4())
+        self.assertRaises(Exception, store.add, image_id, None, None)
+
+        mock_chunkreadable.assert_called_once_with(None, 1024)
+
     @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
                 'get_http_conn_for_put', return_value=(mock.Mock(),
                                                        mock.Mock()))
@@ -262,6 +1162,154 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
         self.assertEqual(hashlib.md5(image_file.getvalue()).hexdigest(),
                          img_checksum)
 
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_hash_algorithm(self, mock_get_http_conn_for_put):
+        self.conf.set_override('scality_hash_algorithm', 'sha256',
+                               group='glance_store')
+        conn, _ = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+        file_contents = 'abcdef'
+
+        store = Store(self.conf)
+        _, _, checksum, metadata = store.add(
+            str(uuid.uuid4()), StringIO.StringIO(file_contents), 0)
+
+        self.assertEqual(hashlib.md5(file_contents).hexdigest(), checksum)
+        self.assertEqual({'hash_algo': 'sha256',
+                          'hash_value': hashlib.sha256(
+                              file_contents).hexdigest()},
+                         metadata)
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_md5_hash_algorithm(self, mock_get_http_conn_for_put):
+        self.conf.set_override('scality_hash_algorithm', 'MD5',
+                               group='glance_store')
+        conn, _ = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+        file_contents = 'abcdef'
+
+        store = Store(self.conf)
+        _, _, checksum, metadata = store.add(
+            str(uuid.uuid4()), StringIO.StringIO(file_contents), 0)
+
+        md5 = hashlib.md5(file_contents).hexdigest()
+        self.assertEqual(md5, checksum)
+        self.assertEqual({'hash_algo': 'md5', 'hash_value': md5}, metadata)
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'put_meta')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_verification(self, mock_get_http_conn_for_put,
+                                   mock_put_meta):
+        self.conf.set_override('scality_verify_uploads', True,
+                               group='glance_store')
+        file_contents = 'abcdef'
+        md5 = hashlib.md5(file_contents).hexdigest()
+        conn, _ = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+        conn.getresponse.return_value.getheader.side_effect = \
+            lambda name, default=None: '"%s"' % md5 if name == 'ETag' else None
+
+        image_id = str(uuid.uuid4())
+        store = Store(self.conf)
+        store.add(image_id, StringIO.StringIO(file_contents), 0)
+
+        mock_put_meta.assert_called_once_with(image_id,
+                                              {'md5': md5, 'size': 6})
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'del_object')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'put_meta')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_etag_mismatch(self, mock_get_http_conn_for_put,
+                                    mock_put_meta, mock_del_object):
+        self.conf.set_override('scality_verify_uploads', True,
+                               group='glance_store')
+        conn, _ = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+        conn.getresponse.return_value.getheader.side_effect = \
+            lambda name, default=None: '0' * 32 if name == 'ETag' else None
+
+        image_id = str(uuid.uuid4())
+        store = Store(self.conf)
+        self.assertRaises(glance_store.exceptions.BackendException,
+                          store.add, image_id, StringIO.StringIO('abc'), 0)
+
+        mock_del_object.assert_called_once_with(image_id)
+        self.assertFalse(mock_put_meta.called)
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_pipeline(self, mock_get_http_conn_for_put):
+        self.conf.set_override('scality_upload_pipeline_depth', 2,
+                               group='glance_store')
+        conn, release_conn = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+
+        image_id = str(uuid.uuid4())
+        file_contents = 'x' * (3 * Store.CHUNKSIZE + 10)
+        image_file = StringIO.StringIO(file_contents)
+        verifier = mock.Mock()
+
+        store = Store(self.conf)
+        _, img_size, img_checksum, _ = store.add(image_id, image_file, None,
+                                                 verifier=verifier)
+
+        self.assertEqual(len(file_contents), img_size)
+        self.assertEqual(hashlib.md5(file_contents).hexdigest(),
+                         img_checksum)
+        self.assertEqual(file_contents, ''.join(
+            call[0][0] for call in verifier.update.call_args_list))
+        conn.send.assert_called_with('0\r\n\r\n')
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'put_meta')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_with_compression(self, mock_get_http_conn_for_put,
+                                  mock_put_meta):
+        self.conf.set_override('scality_compression', True,
+                               group='glance_store')
+        conn, _ = mock_get_http_conn_for_put.return_value
+        conn.getresponse.return_value = mock.Mock(status=200)
+        data = '\0' * 100000
+
+        image_id = str(uuid.uuid4())
+        store = Store(self.conf)
+        _, size, checksum, _ = store.add(image_id, StringIO.StringIO(data), 0)
+
+        self.assertEqual(len(data), size)
+        self.assertEqual(hashlib.md5(data).hexdigest(), checksum)
+        headers = mock_get_http_conn_for_put.call_args[0][1]
+        self.assertEqual({'codec': 'zlib'}, pickle.loads(
+            base64.b64decode(headers['X-Scal-Usermd'])))
+
+        # Decode the chunked transfer encoding
+        sent = ''.join(call[0][0] for call in conn.send.call_args_list)
+        body = []
+        while sent:
+            size_line, sent = sent.split('\r\n', 1)
+            chunk_size = int(size_line, 16)
+            body.append(sent[:chunk_size])
+            sent = sent[chunk_size + 2:]
+        compressed = ''.join(body)
+        self.assertTrue(len(compressed) < len(data) // 10)
+        self.assertEqual(data, zlib.decompress(compressed))
+        mock_put_meta.assert_called_once_with(
+            image_id, {'codec': 'zlib', 'size': len(data),
+                       'compressed_size': len(compressed)})
+
     @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
                 'get_http_conn_for_put', return_value=(mock.Mock(),
                                                        mock.Mock()))
@@ -296,6 +1344,520 @@ class TestStore(glance_store.tests.base.StoreBaseTest):
                           store.add, image_id, image_file, None)
         mock_del_object.assert_called_once_with(image_id)
 
+    def make_image_file(self, contents, offset=0):
+        image_file = tempfile.TemporaryFile()
+        self.addCleanup(image_file.close)
+        image_file.write(contents)
+        image_file.seek(offset)
+        return image_file
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    def test_add_file(self, mock_get_http_conn_for_put):
+        self.conf.set_override('scality_file_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_chunk_size', 4,
+                               group='glance_store')
+        conn, release_conn = mock_get_http_conn_for_put.return_value
+        conn.sock = mock.Mock(spec=['settimeout', 'sendall'])
+        # Buffers over the file aren't valid once the upload is over
+        sent = []
+        conn.sock.sendall.side_effect = lambda data: sent.append(str(data))
+        conn.getresponse.return_value = mock.Mock(status=200)
+
+        image_id = str(uuid.uuid4())
+        file_contents = "headerchunk00000remainder"
+        image_file = self.make_image_file(file_contents, offset=6)
+        verifier = mock.Mock()
+
+        store = Store(self.conf)
+        _, img_size, img_checksum, _ = store.add(
+            image_id, image_file, len(file_contents) - 6, verifier=verifier)
+
+        mock_get_http_conn_for_put.assert_called_once_with(
+            image_id, {'Content-Length': '19', 'If-None-Match': '*'})
+        self.assertEqual(['chun', 'k000', '00re', 'main', 'der'], sent)
+        self.assertFalse(conn.send.called)
+
+        release_conn.assert_called_once_with()
+        self.assertEqual(19, img_size)
+        self.assertEqual(hashlib.md5(file_contents[6:]).hexdigest(),
+                         img_checksum)
+        self.assertEqual(file_contents[6:], ''.join(
+            call[0][0] for call in verifier.update.call_args_list))
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put', return_value=(mock.Mock(),
+                                                       mock.Mock()))
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    def test_add_file_with_exception_in_send(self, mock_del_object,
+                                             mock_get_http_conn_for_put):
+        self.conf.set_override('scality_file_uploads', True,
+                               group='glance_store')
+        conn, release_conn = mock_get_http_conn_for_put.return_value
+        conn.sock = mock.Mock(spec=['settimeout', 'sendall'])
+        conn.sock.sendall.side_effect = socket.error()
+        image_file = self.make_image_file("data")
+        hashed = []
+
+        def hash_file(mapping, offset, size, hashers, chunk_size, cancelled):
+            cancelled.wait(5)
+            hashed.append(cancelled.is_set())
+
+        store = Store(self.conf)
+        with mock.patch('scality_glance_store.store._hash_file',
+                        side_effect=hash_file):
+            self.assertRaises(socket.error, store.add, 'image', image_file,
+                              4)
+
+        # The hashing worker was cancelled, and waited for
+        self.assertEqual([True], hashed)
+        conn.close.assert_called_once_with()
+        self.assertFalse(release_conn.called)
+        mock_del_object.assert_called_once_with('image')
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'get_http_conn_for_put')
+    def test_add_file_truncated(self, mock_get_http_conn_for_put):
+        image_file = self.make_image_file("data")
+
+        store = Store(self.conf)
+        # The file was truncated since its size was checked
+        self.assertRaises(IOError, store._add_file, 'image', image_file, 8,
+                          hashlib.md5(), None)
+
+        self.assertFalse(mock_get_http_conn_for_put.called)
+
+    def test_can_upload_file(self):
+        self.conf.set_override('scality_file_uploads', True,
+                               group='glance_store')
+        store = Store(self.conf)
+        image_file = self.make_image_file("data", offset=1)
+
+        self.assertTrue(store._can_upload_file(image_file, 3))
+        # The size of the image is unknown, or larger than the file
+        self.assertFalse(store._can_upload_file(image_file, 0))
+        self.assertFalse(store._can_upload_file(image_file, 4))
+        # Not a regular file
+        self.assertFalse(store._can_upload_file(StringIO.StringIO("data"),
+                                                4))
+        read_end, write_end = os.pipe()
+        self.addCleanup(os.close, write_end)
+        with os.fdopen(read_end) as pipe:
+            self.assertFalse(store._can_upload_file(pipe, 4))
+
+        store._compression = True
+        self.assertFalse(store._can_upload_file(image_file, 3))
+
+    def test_can_upload_file_disabled(self):
+        store = Store(self.conf)
+
+        self.assertFalse(store._can_upload_file(self.make_image_file("data"),
+                                                4))
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'put_object')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+                side_effect=scality_sproxyd_client.exceptions.
+                SproxydHTTPException('', http_status=404))
+    def test_add_multipart(self, mock_head, mock_put_object):
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+
+        image_id = str(uuid.uuid4())
+        part_size = 1024 * 1024
+        file_contents = 'a' * part_size + 'b' * part_size + 'c' * 10
+        image_file = StringIO.StringIO(file_contents)
+
+        store = Store(self.conf)
+        img_uri, img_size, img_checksum, _ = store.add(image_id, image_file,
+                                                       None)
+
+        self.assertEqual('scality://%s' % image_id, img_uri)
+        self.assertEqual(len(file_contents), img_size)
+        self.assertEqual(hashlib.md5(file_contents).hexdigest(),
+                         img_checksum)
+
+        keys = ['%s.u1.part%05d' % (image_id, i) for i in range(3)]
+        part_calls = [
+            mock.call(keys[0], 'a' * part_size, {'If-None-Match': '*'}),
+            mock.call(keys[1], 'b' * part_size, {'If-None-Match': '*'}),
+            mock.call(keys[2], 'c' * 10, {'If-None-Match': '*'})]
+        mock_put_object.assert_has_calls(part_calls, any_order=True)
+
+        # The manifest is written last, under the image id
+        key, body, headers = mock_put_object.call_args[0]
+        self.assertEqual(image_id, key)
+        self.assertEqual('*', headers['If-None-Match'])
+        self.assertEqual({'layout': 'manifest', 'md5': img_checksum,
+                          'size': len(file_contents)},
+                         pickle.loads(base64.b64decode(
+                             headers['X-Scal-Usermd'])))
+        manifest = json.loads(body)
+        self.assertEqual(len(file_contents), manifest['size'])
+        self.assertEqual([[keys[0], part_size], [keys[1], part_size],
+                          [keys[2], 10]], manifest['parts'])
+
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+                mock.Mock())
+    def test_add_multipart_duplicate(self):
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+
+        image_id = str(uuid.uuid4())
+        store = Store(self.conf)
+
+        self.assertRaises(glance_store.exceptions.Duplicate, store.add,
+                          image_id, StringIO.StringIO('data'), None)
+
+    def test_add_multipart_other_uploads(self):
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        # Left over by a crashed upload of the same image
+        sproxyd.objects['image.u0.part00000'] = (None, 'old')
+
+        self.mock_new_upload_id.return_value = 'u1'
+        store.add('image', StringIO.StringIO('data'), 0)
+        self.assertEqual(set(['image', 'image.u0.part00000',
+                              'image.u1.part00000']),
+                         set(sproxyd.objects))
+
+        # A concurrent upload which lost the race for the manifest only
+        # deletes its own parts
+        self.mock_new_upload_id.return_value = 'u2'
+        with mock.patch.object(store, '_check_absent'):
+            self.assertRaises(glance_store.exceptions.Duplicate, store.add,
+                              'image', StringIO.StringIO('data'), 0)
+        self.assertEqual(set(['image', 'image.u0.part00000',
+                              'image.u1.part00000']),
+                         set(sproxyd.objects))
+        self.assertEqual('data', ''.join(store.get(MockLocation('image'))[0]))
+
+    @mock.patch(
+        'scality_sproxyd_client.sproxyd_client.SproxydClient.del_object')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.'
+                'put_object')
+    @mock.patch('scality_sproxyd_client.sproxyd_client.SproxydClient.head',
+                side_effect=scality_sproxyd_client.exceptions.
+                SproxydHTTPException('', http_status=404))
+    def test_add_multipart_with_exception_in_put(self, mock_head,
+                                                 mock_put_object,
+                                                 mock_del_object):
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+
+        image_id = str(uuid.uuid4())
+        part_size = 1024 * 1024
+        image_file = StringIO.StringIO('a' * part_size + 'b')
+
+        def put_object(key, data, headers):
+            if key.endswith('1'):
+                raise scality_sproxyd_client.exceptions.SproxydException()
+        mock_put_object.side_effect = put_object
+
+        store = Store(self.conf)
+        self.assertRaises(scality_sproxyd_client.exceptions.SproxydException,
+                          store.add, image_id, image_file, None)
+
+        keys = ['%s.u1.part%05d' % (image_id, i) for i in range(2)]
+        mock_del_object.assert_has_calls([mock.call(keys[0]),
+                                          mock.call(keys[1])])
+
+    def test_add_sparse(self):
+        self.conf.set_override('scality_sparse_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        # Only the long runs of zeros are holes, zeros are detected by chunk
+        chunk = 64 * units.Ki
+        data = ('a' * chunk + '\0' * 3 * units.Mi + 'b' * chunk +
+                '\0' * chunk + 'c' * chunk + '\0' * 2 * units.Mi)
+        md5 = hashlib.md5(data).hexdigest()
+
+        self.assertEqual(('scality://image', len(data), md5, {}),
+                         store.add('image', StringIO.StringIO(data), 0))
+
+        manifest = json.loads(sproxyd.objects['image'][1])
+        self.assertEqual([['image.u1.part00000', chunk],
+                          [None, 3 * units.Mi],
+                          ['image.u1.part00001', 3 * chunk],
+                          [None, 2 * units.Mi]],
+                         manifest['parts'])
+        self.assertEqual(set(['image', 'image.u1.part00000',
+                              'image.u1.part00001']),
+                         set(sproxyd.objects))
+
+        # Holes are read as zeros, with or without segmented downloads
+        self.conf.set_override('scality_download_segment_size', 1,
+                               group='glance_store')
+        for reader in [store, Store(self.conf)]:
+            for offset, chunk_size in [(0, None), (512, units.Mi),
+                                       (3 * units.Mi, 2 * chunk)]:
+                iterator, size = reader.get(MockLocation('image'), offset,
+                                            chunk_size)
+                expected = data[offset:offset + (chunk_size or len(data))]
+                self.assertEqual(len(expected), size)
+                self.assertEqual(expected, ''.join(iterator))
+        self.assertTrue(store.verify(MockLocation('image'), md5))
+
+        store.delete(MockLocation('image'))
+        self.assertEqual({}, sproxyd.objects)
+
+    def test_sparse_uploads_require_multipart(self):
+        self.conf.set_override('scality_sparse_uploads', True,
+                               group='glance_store')
+
+        self.assertFalse(Store(self.conf)._sparse_uploads)
+
+    def _add_failing_once(self, store, image_id, data, failing_key):
+        """Upload `data`, failing the first PUT of `failing_key`."""
+        put_object = scality_sproxyd_client.sproxyd_client.SproxydClient.\
+            put_object.side_effect
+        failed = []
+
+        def fail_once(key, body, headers=None):
+            if key == failing_key and not failed:
+                failed.append(key)
+                raise scality_sproxyd_client.exceptions.SproxydHTTPException(
+                    '', http_status=503)
+            put_object(key, body, headers)
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.put_object', side_effect=fail_once):
+            self.assertRaises(
+                scality_sproxyd_client.exceptions.SproxydHTTPException,
+                store.add, image_id, StringIO.StringIO(data), 0)
+
+    def test_add_resumable(self):
+        self.conf.set_override('scality_resumable_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_concurrency', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        data = ''.join(str(i) * units.Mi for i in range(3)) + 'end'
+        md5 = hashlib.md5(data).hexdigest()
+
+        self._add_failing_once(store, 'image', data, 'image.u1.part00002')
+        self.assertEqual(set(['image.u1.part00000', 'image.u1.part00001',
+                              'image.checkpoint']),
+                         set(sproxyd.objects))
+
+        with mock.patch('scality_sproxyd_client.sproxyd_client.'
+                        'SproxydClient.put_object',
+                        side_effect=sproxyd.put_object) as mock_put:
+            self.assertEqual(('scality://image', len(data), md5, {}),
+                             store.add('image', StringIO.StringIO(data), 0))
+
+        # Only the parts which weren't committed were sent again
+        put_keys = [put_call[0][0] for put_call in mock_put.call_args_list]
+        self.assertEqual(['image.u1.part00002', 'image.checkpoint',
+                          'image.u1.part00003', 'image.checkpoint', 'image'],
+                         put_keys)
+        self.assertNotIn('image.checkpoint', sproxyd.objects)
+        self.assertEqual(data, ''.join(store.get(MockLocation('image'))[0]))
+
+    def test_add_resumable_changed_data(self):
+        self.conf.set_override('scality_resumable_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_concurrency', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+
+        self._add_failing_once(store, 'image', 'a' * 3 * units.Mi,
+                               'image.u1.part00002')
+        data = 'a' * units.Mi + 'b' * units.Mi
+        store.add('image', StringIO.StringIO(data), 0)
+
+        # The second part was uploaded again, the third one is gone
+        self.assertEqual(set(['image', 'image.u1.part00000',
+                              'image.u1.part00001']),
+                         set(sproxyd.objects))
+        self.assertEqual(data, ''.join(store.get(MockLocation('image'))[0]))
+
+    def test_add_resumable_expired_checkpoint(self):
+        self.conf.set_override('scality_resumable_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        self.conf.set_override('scality_checkpoint_ttl', 60,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        data = 'a' * 2 * units.Mi
+
+        with mock.patch('time.time', return_value=1000):
+            self._add_failing_once(store, 'image', data, 'image.u1.part00001')
+        self.assertIn('image.checkpoint', sproxyd.objects)
+
+        # Collected by the next upload once expired
+        with mock.patch('time.time', return_value=1061):
+            store.add('other', StringIO.StringIO('data'), 0)
+        self.assertEqual(set(['other', 'other.u1.part00000']),
+                         set(sproxyd.objects))
+
+    def test_add_resumable_corrupt_checkpoint(self):
+        self.conf.set_override('scality_resumable_uploads', True,
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        data = 'a' * 2 * units.Mi
+
+        self._add_failing_once(store, 'image', data, 'image.u1.part00001')
+        usermd, body = sproxyd.objects['image.checkpoint']
+        sproxyd.objects['image.checkpoint'] = (usermd, body[:-10])
+
+        _, size, checksum, _ = store.add('image', StringIO.StringIO(data),
+                                         len(data))
+
+        self.assertEqual(len(data), size)
+        self.assertEqual(hashlib.md5(data).hexdigest(), checksum)
+        self.assertNotIn('image.checkpoint', sproxyd.objects)
+
+    def test_checkpoint_commits_coalesced(self):
+        client = mock.Mock()
+        putting = threading.Event()
+        release = threading.Event()
+
+        def put_object(key, body):
+            if not putting.is_set():
+                putting.set()
+                release.wait(10)
+
+        client.put_object.side_effect = put_object
+        checkpoint = resumable.Checkpoint(client, 'image', units.Mi, 'u1')
+        threads = [threading.Thread(target=checkpoint.commit,
+                                    args=(index, 'p%d' % index, 'data'))
+                   for index in range(3)]
+
+        threads[0].start()
+        putting.wait(10)
+        # Parts are committed while the checkpoint is being written
+        for thread in threads[1:]:
+            thread.start()
+        for _attempt in range(1000):
+            if checkpoint.get_committed_keys() == set(['p0', 'p1', 'p2']):
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(10)
+
+        # The commits which waited are covered by a single write
+        self.assertEqual(2, client.put_object.call_count)
+        state = json.loads(client.put_object.call_args[0][1])
+        self.assertEqual(['0', '1', '2'], sorted(state['parts']))
+
+    def test_dedupe(self):
+        self.conf.set_override('scality_dedupe', True, group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        data = 'some image data'
+        md5 = hashlib.md5(data).hexdigest()
+        index_key = 'dedupe-sha256-%s' % hashlib.sha256(data).hexdigest()
+
+        for image_id in ['image1', 'image2']:
+            self.assertEqual(('scality://%s' % image_id, len(data), md5, {}),
+                             store.add(image_id, StringIO.StringIO(data), 0))
+
+        # The content of the second image was dropped
+        self.assertEqual(set(['image1', 'image2', index_key, 'image1.blob',
+                              'image1.blob.u1.part00000']),
+                         set(sproxyd.objects))
+        self.assertEqual(2, sproxyd.objects[index_key][0]['refcount'])
+
+        for offset, chunk_size in [(0, None), (5, 5)]:
+            iterator, size = store.get(MockLocation('image2'), offset,
+                                       chunk_size)
+            self.assertEqual(data[offset:offset + (chunk_size or len(data))],
+                             ''.join(iterator))
+        self.assertTrue(store.verify(MockLocation('image2'), md5))
+
+        store.delete(MockLocation('image1'))
+        self.assertEqual(1, sproxyd.objects[index_key][0]['refcount'])
+        self.assertEqual(data, ''.join(store.get(MockLocation('image2'))[0]))
+
+        store.delete(MockLocation('image2'))
+        self.assertEqual({}, sproxyd.objects)
+
+    def test_dedupe_duplicate(self):
+        self.conf.set_override('scality_dedupe', True, group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+
+        store.add('image', StringIO.StringIO('abc'), 0)
+        self.assertRaises(glance_store.exceptions.Duplicate, store.add,
+                          'image', StringIO.StringIO('abc'), 0)
+
+    def test_metrics(self):
+        self.conf.set_override('scality_metrics_sink', 'prometheus',
+                               group='glance_store')
+        self.conf.set_override('scality_upload_part_size', 1,
+                               group='glance_store')
+        sproxyd = FakeSproxyd()
+        sproxyd.patch(self)
+        store = Store(self.conf)
+        sink = store._metrics
+        self.assertIsInstance(store._sproxyd_client,
+                              metrics.InstrumentedClientMixin)
+
+        def get_value(name, **labels):
+            return sink._values[name][metrics._labels_key(labels)]
+
+        store.add('image', StringIO.StringIO('abcdef'), 0)
+        self.assertEqual(6, get_value(metrics.BYTES, operation='add'))
+        self.assertTrue(get_value(metrics.UPLOAD_HASH_SECONDS) >= 0)
+        self.assertTrue(get_value(metrics.UPLOAD_SEND_SECONDS) >= 0)
+
+        iterator, _size = store.get(MockLocation('image'), 1, 3)
+        self.assertEqual('bcd', ''.join(iterator))
+        self.assertEqual(3, get_value(metrics.BYTES, operation='get'))
+        self.assertEqual(1, get_value(metrics.FIRST_BYTE_SECONDS,
+                                      operation='get')[-1])
+
+        store.delete(MockLocation('image'))
+        self.assertRaises(glance_store.exceptions.NotFound, store.delete,
+                          MockLocation('image'))
+        self.assertEqual(1, get_value(metrics.OPERATION_ERRORS,
+                                      operation='delete', error='NotFound'))
+
+        # Histograms end with the count of values
+        for operation, count in [('add', 1), ('get', 1), ('delete', 2)]:
+            self.assertEqual(count, get_value(metrics.OPERATION_SECONDS,
+                                              operation=operation)[-1])
+
+    def test_metrics_unknown_sink(self):
+        self.conf.set_override('scality_metrics_sink', 'missing.Sink',
+                               group='glance_store')
+
+        self.assertRaises(glance_store.exceptions.BadStoreConfiguration,
+                          Store, self.conf)
+
 
 def test_store_location_parse_uri_with_bad_uri():
 
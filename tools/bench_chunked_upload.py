@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark of the chunked PUT hot loop of `Store.add`.
+
+Sends the same payload over a local socket, framing each chunk the legacy
+way (one formatted string per chunk) then with `ChunkedWriter`, and reports
+the CPU time spent by the sending process per GB. The receiving end runs in
+a child process, so its CPU time isn't accounted for.
+
+Usage: bench_chunked_upload.py [size in MB] [chunk size in KB]
+"""
+
+import os
+import resource
+import socket
+import sys
+
+from scality_glance_store import chunked
+
+
+class Connection(object):
+    def __init__(self, sock):
+        self.sock = sock
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+
+def drain(sock):
+    while sock.recv(1024 * 1024):
+        pass
+
+
+def legacy(conn, chunks):
+    for chunk in chunks:
+        conn.send('%x\r\n%s\r\n' % (len(chunk), chunk))
+    conn.send('0\r\n\r\n')
+
+
+def writer(conn, chunks):
+    chunked_writer = chunked.ChunkedWriter(conn)
+    for chunk in chunks:
+        chunked_writer.write(chunk)
+    chunked_writer.close()
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(send, size, chunk_size):
+    sock, peer = socket.socketpair()
+    pid = os.fork()
+    if pid == 0:
+        sock.close()
+        drain(peer)
+        os._exit(0)
+    peer.close()
+
+    # `utils.chunkreadable` yields a new string for every chunk
+    chunk = os.urandom(chunk_size)
+    chunks = (chunk[:] for _ in xrange(size // chunk_size))
+
+    start = cpu_time()
+    send(Connection(sock), chunks)
+    elapsed = cpu_time() - start
+
+    sock.close()
+    os.waitpid(pid, 0)
+    return elapsed
+
+
+def main():
+    size = int(sys.argv[1] if len(sys.argv) > 1 else 1024) * 1024 * 1024
+    chunk_size = int(sys.argv[2] if len(sys.argv) > 2 else 64) * 1024
+
+    for name, send in [('legacy', legacy), ('ChunkedWriter', writer)]:
+        elapsed = run(send, size, chunk_size)
+        print('%-14s %.3f CPU seconds per GB' %
+              (name, elapsed * 1024 * 1024 * 1024 / size))
+
+
+if __name__ == '__main__':
+    main()
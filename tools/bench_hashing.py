@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# Copyright (c) 2015 Scality
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Micro-benchmark of the hash algorithms `Store.add` can compute.
+
+Hashes the same payload, chunk by chunk, with each algorithm alone then
+along MD5 through `MultiHash`, and reports the CPU time spent per GB.
+
+Usage: bench_hashing.py [size in MB] [chunk size in KB]
+"""
+
+import os
+import resource
+import sys
+
+from scality_glance_store import hashing
+
+
+ALGORITHMS = ['md5', 'sha1', 'sha256', 'sha512', 'adler32', 'crc32']
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(hasher, size, chunk_size):
+    chunk = os.urandom(chunk_size)
+
+    start = cpu_time()
+    for _ in xrange(size // chunk_size):
+        hasher.update(chunk)
+    hasher.hexdigest()
+    return cpu_time() - start
+
+
+def main():
+    size = int(sys.argv[1] if len(sys.argv) > 1 else 1024) * 1024 * 1024
+    chunk_size = int(sys.argv[2] if len(sys.argv) > 2 else 64) * 1024
+
+    hashers = [(name, lambda name=name: hashing.new(name))
+               for name in ALGORITHMS]
+    hashers.extend(('md5+%s' % name,
+                    lambda name=name: hashing.MultiHash('md5', name))
+                   for name in ALGORITHMS[1:])
+
+    for name, new in hashers:
+        elapsed = run(new(), size, chunk_size)
+        print('%-14s %.3f CPU seconds per GB' %
+              (name, elapsed * 1024 * 1024 * 1024 / size))
+
+
+if __name__ == '__main__':
+    main()